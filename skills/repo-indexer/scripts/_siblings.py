@@ -0,0 +1,45 @@
+"""Load the sibling scripts, whose hyphenated file names cannot be imported by name."""
+
+from __future__ import annotations
+
+import functools
+import importlib.util
+import sys
+from pathlib import Path
+from types import ModuleType
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+
+
+@functools.cache
+def load_sibling(name: str) -> ModuleType:
+    """Load ``<name>.py`` from this directory once, as module ``name`` with "-" → "_".
+
+    The module is registered in ``sys.modules`` before it runs, as a normal
+    import would be, so its classes and functions pickle by reference.
+    """
+    module_name = name.replace("-", "_")
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    spec = importlib.util.spec_from_file_location(module_name, SCRIPTS_DIR / f"{name}.py")
+    if spec is None or spec.loader is None:
+        raise ImportError(f"Could not load {name}.py from {SCRIPTS_DIR}")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[module_name]
+        raise
+    return module
+
+
+def call_sibling(name: str, func: str, *args):
+    """Call ``func(*args)`` from sibling ``name``.
+
+    Process pools pickle a task's function by module name, which a worker
+    started with spawn or forkserver can only import if it lives in an
+    importable module; submitting this function instead works under every
+    start method.
+    """
+    return getattr(load_sibling(name), func)(*args)
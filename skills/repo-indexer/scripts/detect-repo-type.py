@@ -1,13 +1,31 @@
 #!/usr/bin/env python3
 """Detect repository architecture type."""
 
+from __future__ import annotations
+
+import argparse
+import fnmatch
+import hashlib
 import json
 import os
+import re
+import struct
 import sys
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
 from pathlib import Path
+from typing import NamedTuple
+
+from _siblings import call_sibling
 
 # Directories to skip during filesystem traversal
 _SKIP_DIRS = {".git", "node_modules", "vendor", "venv", ".venv", "__pycache__"}
+# Per-directory ignore files honoured by traversals, in gitignore syntax.
+IGNORE_FILES = (".gitignore", ".repoindexerignore")
 
 # Scoring constants
 # Directory markers score lower than config files — a bare "packages/" dir is weak evidence.
@@ -19,166 +37,1388 @@ MIN_SERVICES_FOR_MICROSERVICES = 3
 MAX_DOCKERFILE_DEPTH = 4
 # Abort traversal after visiting this many directories (breadth guard for huge trees).
 MAX_DIRS_VISITED = 1000
+# Threads used to list directories in parallel during the Dockerfile walk.
+MAX_WALK_WORKERS = 8
 
+MONOREPO_DIR_MARKERS = ["packages/", "apps/", "libs/", "modules/", "services/"]
+# Workspace config files score +3 each (stronger signal than a bare directory).
+WORKSPACE_FILES = [
+    "pnpm-workspace.yaml",
+    "lerna.json",
+    "nx.json",
+    "turbo.json",
+    "go.work",
+]
+COMPOSE_FILES = [
+    "docker-compose.yml",
+    "docker-compose.yaml",
+    "compose.yml",
+    "compose.yaml",
+]
+# Stop reading a compose file after this many bytes (generated files can be huge).
+MAX_COMPOSE_BYTES = 4_000_000
+# Longest line read in one go; only the head of a longer line is parsed.
+_MAX_COMPOSE_LINE = 64 * 1024
+# Guard against extends cycles across files.
+_MAX_EXTENDS_DEPTH = 8
+_OTHER_EXT = {".yml": ".yaml", ".yaml": ".yml"}
+_YAML_KEY = re.compile(r"([\w.-]+):(?:\s+(.*))?$")
+_PORT_KEYS = {"target", "published", "host_ip", "protocol", "mode", "name", "app_protocol"}
+LIB_MARKERS = [
+    "setup.py",
+    "pyproject.toml",
+    "Cargo.toml",
+    "go.mod",
+    "setup.cfg",
+]
 
-def _find_dockerfiles(root: Path, max_depth: int = MAX_DOCKERFILE_DEPTH) -> list[str]:
-    """Find Dockerfiles up to max_depth levels deep, skipping common noise dirs.
+# Detection stages, cheapest first; later stages may be skipped once the answer is settled.
+STAGES = ("markers", "workspace", "compose", "deep")
+# Content predicates only read this much of a file.
+_MAX_PREDICATE_BYTES = 256 * 1024
+
+# Detection results are cached here, relative to the repository root.
+CACHE_PATH = Path(".claude") / "cache" / "detect-repo-type.json"
+# Bump whenever scoring changes so stale cache entries are never served.
+CACHE_VERSION = 6
+# Files modified this recently may still change within the same mtime tick,
+# so a result derived from them is not cached (same idea as git's racy-index check).
+_RACY_WINDOW_NS = 2_000_000_000
+
+
+class DetectionProfile:
+    """Wall time and I/O counters per detection stage, for ``--profile``.
+
+    ``stats`` counts filesystem metadata calls issued (directory listings,
+    ``stat`` and ``open``), ``dirs`` the directories listed and ``bytes`` the
+    file content read. Counters are updated under a lock because the tree
+    walk runs on several threads.
+    """
+
+    def __init__(self):
+        self.stages: dict[str, dict] = {}
+        self._current: dict | None = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Attribute all I/O and time inside the block to stage ``name``."""
+        counters = self.stages.setdefault(name, {"wall_ms": 0.0, "stats": 0, "dirs": 0, "bytes": 0})
+        previous, self._current = self._current, counters
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            counters["wall_ms"] = round(counters["wall_ms"] + (time.perf_counter() - start) * 1000, 3)
+            self._current = previous
+
+    def record(self, stats: int = 0, dirs: int = 0, nbytes: int = 0) -> None:
+        with self._lock:
+            if self._current is not None:
+                self._current["stats"] += stats
+                self._current["dirs"] += dirs
+                self._current["bytes"] += nbytes
+
+    def as_dict(self) -> dict:
+        total = {key: 0 for key in ("wall_ms", "stats", "dirs", "bytes")}
+        for counters in self.stages.values():
+            for key in total:
+                total[key] += counters[key]
+        total["wall_ms"] = round(total["wall_ms"], 3)
+        return {"stages": self.stages, "total": total}
+
+
+# Profile of the detect_repo_type call in progress, if profiling was requested.
+_active_profile: DetectionProfile | None = None
+
+
+def _record_io(stats: int = 0, dirs: int = 0, nbytes: int = 0) -> None:
+    """Count I/O against the active profile (no-op when not profiling)."""
+    if _active_profile is not None:
+        _active_profile.record(stats, dirs, nbytes)
+
+
+class _InputLog:
+    """Paths a detection listed or read, for validating a cached result against them later."""
+
+    def __init__(self):
+        self.paths: set[str] = set()
+        self._lock = threading.Lock()
+
+    def add(self, path) -> None:
+        with self._lock:
+            self.paths.add(os.fspath(path))
+
+
+# Inputs of the detect_repo_type call in progress, if its result may be cached.
+_active_inputs: _InputLog | None = None
+
+
+def _record_input(path) -> None:
+    """Note that detection depends on ``path`` (no-op when not caching)."""
+    if _active_inputs is not None:
+        _active_inputs.add(path)
+
+
+@contextmanager
+def _profile_stage(name: str):
+    if _active_profile is None:
+        yield
+    else:
+        with _active_profile.stage(name):
+            yield
 
-    Symlinks are not followed (followlinks=False) to prevent path traversal
-    outside the repository root. Traversal aborts after MAX_DIRS_VISITED
-    directories to avoid excessive I/O on very wide trees.
-    """
-    found = []
-    dirs_visited = 0
-    root_resolved = root.resolve()
-    root_str = str(root_resolved)
-    for dirpath, dirnames, filenames in os.walk(root_str, followlinks=False):
-        dirs_visited += 1
-        if dirs_visited > MAX_DIRS_VISITED:
-            return found
-        # Calculate current depth relative to root
-        depth = dirpath[len(root_str):].count(os.sep)
-        if depth >= max_depth:
-            dirnames.clear()
+
+class RepoSnapshot:
+    """In-memory view of the repository root built from a single ``os.scandir``.
+
+    Every root-level marker check queries this snapshot instead of issuing its
+    own ``stat`` call, which matters on network filesystems where each metadata
+    lookup is a round trip. ``dirs`` follows symlinks (matching ``Path.is_dir``)
+    while ``walk_dirs`` does not, so traversal never leaves the repository.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.files: set[str] = set()
+        self.dirs: set[str] = set()
+        self.walk_dirs: list[str] = []
+        _record_io(stats=1, dirs=1)
+        _record_input(root)
+        try:
+            with os.scandir(root) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir():
+                            self.dirs.add(entry.name)
+                            if not entry.is_symlink():
+                                self.walk_dirs.append(entry.name)
+                        elif entry.is_file():
+                            self.files.add(entry.name)
+                    except OSError:
+                        continue  # Dangling or unreadable entry — treat as absent
+        except OSError:
+            pass  # Missing or unreadable root behaves like an empty directory
+        self.walk_dirs.sort()
+
+    def is_dir(self, name: str) -> bool:
+        """Return True if ``name`` (trailing slash allowed) is a root-level directory."""
+        return name.rstrip("/") in self.dirs
+
+    def exists(self, name: str) -> bool:
+        """Return True if ``name`` is a root-level file or directory."""
+        return name in self.files or name in self.dirs
+
+
+class _VisitBudget:
+    """Directory-visit allowance shared by every walker thread.
+
+    An optional ``deadline`` (a ``time.monotonic()`` value) exhausts the
+    budget early once it has passed.
+    """
+
+    def __init__(self, limit: int, deadline: float | None = None):
+        self._remaining = limit
+        self._deadline = deadline
+        self._lock = threading.Lock()
+        self.exhausted = False
+
+    def claim(self) -> bool:
+        """Take one visit from the budget; return False once it is used up."""
+        with self._lock:
+            if self._remaining <= 0 or (self._deadline is not None and time.monotonic() > self._deadline):
+                self.exhausted = True
+                return False
+            self._remaining -= 1
+            return True
+
+
+# POSIX bracket classes ("[[:alpha:]]") as regex class members
+_POSIX_CLASSES = {
+    "alnum": "0-9A-Za-z", "alpha": "A-Za-z", "blank": " \\t", "cntrl": "\\x00-\\x1f\\x7f",
+    "digit": "0-9", "graph": "!-~", "lower": "a-z", "print": " -~", "space": "\\s", "upper": "A-Z",
+    "xdigit": "0-9A-Fa-f", "punct": re.escape("!\"#$%&'()*+,-./:;<=>?@[\\]^_`{|}~"),
+}
+
+
+def _bracket_end(pattern: str, i: int) -> int:
+    """Return the index of the ``]`` closing the bracket expression at ``pattern[i]``, or -1.
+
+    As in git, a ``]`` right after ``[`` (or ``[!``) is a member, and
+    ``[:class:]`` runs are skipped whole.
+    """
+    j, n = i + 1, len(pattern)
+    if pattern[j:j + 1] in ("!", "^"):
+        j += 1
+    if pattern[j:j + 1] == "]":
+        j += 1
+    while j < n and pattern[j] != "]":
+        if pattern.startswith("[:", j) and pattern.find(":]", j + 2) != -1:
+            j = pattern.find(":]", j + 2) + 2
             continue
-        # Prune directories we never want to descend into
-        dirnames[:] = [d for d in dirnames if d not in _SKIP_DIRS]
-        if "Dockerfile" in filenames:
-            found.append(os.path.join(dirpath, "Dockerfile"))
-    return found
+        j += 2 if pattern[j] == "\\" else 1
+    return j if j < n else -1
 
 
-def detect_repo_type(root: str = ".") -> dict:
-    """Analyse repo structure and return the detected architecture type with confidence."""
-    path = Path(root)
+def _bracket_to_regex(body: str) -> str:
+    """Translate the inside of a bracket expression into a regex character class.
 
-    indicators = {"monorepo": 0, "microservices": 0, "single_app": 0, "library": 0}
+    Members are escaped, ``-`` between two members stays a range and
+    ``[:class:]`` maps through _POSIX_CLASSES; an unknown class or a reversed
+    range raises ``re.error`` (see _compile_ignore_line).
+    """
+    out = ["["]
+    i = 0
+    if body[:1] in ("!", "^"):
+        out.append("^/")  # a negated class never matches a path separator
+        i = 1
+    start = i
+    while i < len(body):
+        c = body[i]
+        if body.startswith("[:", i) and body.find(":]", i + 2) != -1:
+            end = body.find(":]", i + 2)
+            name = body[i + 2:end]
+            if name not in _POSIX_CLASSES:
+                raise re.error(f"unknown character class [:{name}:]")
+            out.append(_POSIX_CLASSES[name])
+            i = end + 2
+            continue
+        if c == "\\" and i + 1 < len(body):
+            out.append(re.escape(body[i + 1]))
+            i += 2
+            continue
+        ranged = c == "-" and start < i < len(body) - 1 and body[i - 1] != "-" and body[i + 1] != "-"
+        out.append("-" if ranged else re.escape(c))
+        i += 1
+    return "".join(out) + "]"
 
-    evidence = []
 
-    # Check for monorepo indicators
-    monorepo_markers = ["packages/", "apps/", "libs/", "modules/", "services/"]
-    # Workspace config files score +3 each (stronger signal than a bare directory).
-    workspaces_files = [
-        "pnpm-workspace.yaml",
-        "lerna.json",
-        "nx.json",
-        "turbo.json",
-        "go.work",
+def _glob_to_regex(pattern: str) -> str:
+    """Translate one gitignore glob (without anchoring) into a regex fragment."""
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif c == "*":
+            out.append("[^/]*")
+            i += 1
+        elif c == "?":
+            out.append("[^/]")
+            i += 1
+        elif c == "[" and _bracket_end(pattern, i) != -1:
+            close = _bracket_end(pattern, i)
+            out.append(_bracket_to_regex(pattern[i + 1:close]))
+            i = close + 1
+        elif c == "\\" and i + 1 < n:
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            # Includes a "[" with no closing "]" ("[]", "[!]"), which matches itself
+            out.append(re.escape(c))
+            i += 1
+    return "".join(out)
+
+
+def _compile_ignore_line(line: str, base: str) -> tuple[re.Pattern, bool, bool] | None:
+    """Compile one ignore-file line relative to ``base`` into ``(regex, negate, dir_only)``.
+
+    Returns None for blank lines, comments and malformed patterns.
+    """
+    line = line.rstrip("\n").rstrip("\r")
+    if not line or line.startswith("#"):
+        return None
+    # Trailing spaces are insignificant unless escaped.
+    while line.endswith(" ") and not line.endswith("\\ "):
+        line = line[:-1]
+    negate = line.startswith("!")
+    if negate:
+        line = line[1:]
+    elif line.startswith("\\!") or line.startswith("\\#"):
+        line = line[1:]
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+    # A slash anywhere but the end anchors the pattern to the ignore file's directory.
+    anchored = "/" in line
+    line = line.lstrip("/")
+    prefix = re.escape(base + "/") if base else ""
+    try:
+        body = _glob_to_regex(line)
+        regex = f"{prefix}{body}" if anchored else f"{prefix}(?:.*/)?{body}"
+        return re.compile(regex + r"\Z"), negate, dir_only
+    except re.error:
+        # Like git, a malformed pattern ("[z-a]", "[[:nope:]]") just never matches
+        return None
+
+
+class IgnoreMatcher:
+    """Compiled gitignore rules used to prune directories before descending.
+
+    Rules come from ``.git/info/exclude`` and every ``.gitignore`` or
+    ``.repoindexerignore`` on the way down, in that precedence order; as in
+    git, the last matching rule wins and ``!`` re-includes. Matchers are
+    immutable: entering a directory with its own ignore file produces a child
+    via :meth:`extend`, so walker threads can share them freely.
+    """
+
+    def __init__(self, rules: tuple[tuple[re.Pattern, bool, bool], ...] = ()):
+        self._rules = rules
+        self._has_negation = any(neg for _, neg, _ in rules)
+        # Without negations the verdict is just "does anything match", which a
+        # single alternation answers in one regex call.
+        self._any = self._combine(r for r in rules)
+        self._files_only = self._combine(r for r in rules if not r[2])
+
+    @staticmethod
+    def _combine(rules) -> re.Pattern | None:
+        patterns = [regex.pattern for regex, _, _ in rules]
+        return re.compile("|".join(f"(?:{p})" for p in patterns)) if patterns else None
+
+    def extend(self, base: str, lines) -> IgnoreMatcher:
+        """Return a matcher with ``lines`` (an ignore file in directory ``base``) appended."""
+        compiled = tuple(r for r in (_compile_ignore_line(ln, base) for ln in lines) if r)
+        return IgnoreMatcher(self._rules + compiled) if compiled else self
+
+    def is_ignored(self, rel: str, is_dir: bool) -> bool:
+        """Return True if root-relative ``rel`` (``/``-separated) is ignored."""
+        if not self._rules:
+            return False
+        if not self._has_negation:
+            combined = self._any if is_dir else self._files_only
+            return bool(combined and combined.match(rel))
+        for regex, negate, dir_only in reversed(self._rules):
+            if dir_only and not is_dir:
+                continue
+            if regex.match(rel):
+                return not negate
+        return False
+
+    @classmethod
+    def for_root(cls, root: Path, snapshot: RepoSnapshot) -> IgnoreMatcher:
+        """Load the repository-wide rules plus any ignore files at the root."""
+        matcher = cls()
+        sources = []
+        if snapshot.exists(".git"):
+            git_dir = _git_dir(root)
+            if git_dir is not None:
+                sources.append(git_dir / "info" / "exclude")
+        sources.extend(root / name for name in IGNORE_FILES if name in snapshot.files)
+        for source in sources:
+            matcher = matcher.extend("", _read_ignore_file(source))
+        return matcher
+
+
+def _read_ignore_file(path: Path | str) -> list[str]:
+    """Return the lines of an ignore file, or an empty list if it cannot be read."""
+    _record_io(stats=1)
+    _record_input(path)
+    try:
+        with open(path, "rb") as fh:
+            data = fh.read()
+    except OSError:
+        return []
+    _record_io(nbytes=len(data))
+    return data.decode("utf-8", "replace").splitlines()
+
+
+class Signal(NamedTuple):
+    """One declarative detection rule.
+
+    ``pattern`` is a root-relative glob in gitignore syntax. A pattern without
+    a ``/`` (other than a trailing one, which means "directory") is looked up
+    in the root snapshot; a pattern starting with ``**/`` is matched against
+    every file seen by the tree traversal. ``predicate`` optionally inspects a
+    matching file's content. The signal fires once ``min_count`` paths match
+    and adds ``weight`` (times the match count when ``per_match``) to
+    ``category``. ``evidence`` is formatted with ``{path}`` and ``{count}``;
+    an empty template scores silently.
+    """
+
+    pattern: str
+    category: str
+    weight: int
+    evidence: str = ""
+    predicate: Callable[[Path], bool] | None = None
+    min_count: int = 1
+    per_match: bool = False
+
+
+def _read_head(path: Path, limit: int = _MAX_PREDICATE_BYTES) -> str | None:
+    """Return up to ``limit`` bytes of ``path`` as text, warning on read errors."""
+    _record_io(stats=1)
+    _record_input(path)
+    try:
+        with open(path, "rb") as fh:
+            data = fh.read(limit)
+            _record_io(nbytes=len(data))
+            return data.decode("utf-8", "replace")
+    except OSError as exc:
+        print(f"WARNING: Could not read {path}: {exc}", file=sys.stderr)
+        return None
+
+
+def _has_workspaces_field(path: Path) -> bool:
+    """package.json declares ``workspaces`` — an explicit monorepo."""
+    _record_io(stats=1)
+    _record_input(path)
+    try:
+        raw = path.read_bytes()
+        _record_io(nbytes=len(raw))
+        data = json.loads(raw.decode("utf-8", "replace"))
+    except json.JSONDecodeError as exc:
+        print(f"WARNING: Could not parse {path} as JSON: {exc}", file=sys.stderr)
+        return False
+    except OSError as exc:
+        print(f"WARNING: Could not read {path}: {exc}", file=sys.stderr)
+        return False
+    return isinstance(data, dict) and "workspaces" in data
+
+
+def _content_matches(regex: str) -> Callable[[Path], bool]:
+    """Build a predicate that searches the head of a file for ``regex``."""
+    compiled = re.compile(regex, re.MULTILINE)
+
+    def predicate(path: Path) -> bool:
+        text = _read_head(path)
+        return text is not None and compiled.search(text) is not None
+
+    return predicate
+
+
+SIGNALS: list[Signal] = [
+    # Directory markers score +2 (weaker: could exist in any project type).
+    *(Signal(m, "monorepo", _MONOREPO_DIR_SCORE, "Found {path}") for m in MONOREPO_DIR_MARKERS),
+    # Workspace config files are authoritative signals, hence the higher weight.
+    *(Signal(f, "monorepo", _MONOREPO_CONFIG_SCORE, "Found {path}") for f in WORKSPACE_FILES),
+    Signal("package.json", "monorepo", _MONOREPO_CONFIG_SCORE, "package.json has workspaces", _has_workspaces_field),
+    Signal("WORKSPACE", "monorepo", _MONOREPO_CONFIG_SCORE, "Found {path}"),
+    Signal("WORKSPACE.bazel", "monorepo", _MONOREPO_CONFIG_SCORE, "Found {path}"),
+    Signal("MODULE.bazel", "monorepo", _MONOREPO_CONFIG_SCORE, "Found {path}"),
+    # Every Gradle build has a settings file; only include(...) makes it multi-project.
+    *(
+        Signal(f, "monorepo", _MONOREPO_CONFIG_SCORE, "{path} includes subprojects", _content_matches(r"^\s*include\b"))
+        for f in ("settings.gradle", "settings.gradle.kts")
+    ),
+    Signal("pom.xml", "monorepo", _MONOREPO_CONFIG_SCORE, "pom.xml declares <modules>", _content_matches(r"<modules>")),
+    Signal(
+        "Cargo.toml", "monorepo", _MONOREPO_CONFIG_SCORE, "Cargo.toml declares [workspace]",
+        _content_matches(r"^\s*\[workspace\]"),
+    ),
+    *(Signal(m, "library", 1) for m in LIB_MARKERS),
+    # Deep signals, matched during the single tree traversal.
+    Signal(
+        "**/Dockerfile", "microservices", 1, "{count} Dockerfiles found",
+        min_count=MIN_SERVICES_FOR_MICROSERVICES, per_match=True,
+    ),
+    Signal("**/project.json", "monorepo", _MONOREPO_CONFIG_SCORE, "{count} Nx project.json files", min_count=2),
+]
+
+
+class SignalSet:
+    """A signal table compiled for evaluation in one pass.
+
+    Root signals become plain name lookups against the snapshot. All deep
+    patterns are folded into a single regex (one named group per distinct
+    pattern) plus a basename table for literal patterns, so classifying a
+    path during traversal costs one dict probe and at most one regex match,
+    however many signals are registered. When two deep patterns overlap, the
+    one registered first claims the path.
+    """
+
+    def __init__(self, signals: list[Signal]):
+        self.signals = list(signals)
+        self.root: list[int] = []
+        self._by_name: dict[str, list[int]] = {}
+        groups: dict[str, list[int]] = {}
+        for i, sig in enumerate(self.signals):
+            if not sig.pattern.startswith("**/"):
+                self.root.append(i)
+                continue
+            tail = sig.pattern[3:]
+            if "/" in tail or any(c in tail for c in "*?[\\"):
+                groups.setdefault(sig.pattern, []).append(i)
+            else:
+                self._by_name.setdefault(tail, []).append(i)
+        self._group_signals = {f"g{n}": ids for n, ids in enumerate(groups.values())}
+        self._regex = None
+        if groups:
+            self._regex = re.compile(
+                "|".join(
+                    f"(?P<g{n}>{_glob_to_regex(pattern)}\\Z)" for n, pattern in enumerate(groups)
+                )
+            )
+
+    def match(self, rel: str, name: str) -> list[int]:
+        """Return the indexes of deep signals matching file ``rel`` (basename ``name``)."""
+        hits = self._by_name.get(name)
+        if hits is not None:
+            return hits
+        if self._regex is not None:
+            m = self._regex.match(rel)
+            if m:
+                return self._group_signals[m.lastgroup]
+        return []
+
+    def root_names(self) -> list[str]:
+        """Literal root-level names referenced by the table (for cache keys)."""
+        return [self.signals[i].pattern.rstrip("/") for i in self.root]
+
+    def match_root(self, snapshot: RepoSnapshot) -> dict[int, list[str]]:
+        """Resolve root signals against ``snapshot`` without touching the disk."""
+        hits: dict[int, list[str]] = {}
+        for i in self.root:
+            pattern = self.signals[i].pattern
+            is_dir_pattern = pattern.endswith("/")
+            name = pattern.rstrip("/")
+            if any(c in name for c in "*?["):
+                pool = snapshot.dirs if is_dir_pattern else snapshot.files | snapshot.dirs
+                names = sorted(n for n in pool if fnmatch.fnmatchcase(n, name))
+            elif snapshot.is_dir(name) if is_dir_pattern else snapshot.exists(name):
+                names = [name]
+            else:
+                continue
+            if names:
+                hits[i] = [n + "/" if is_dir_pattern else n for n in names]
+        return hits
+
+
+def _scan_dir(
+    dirpath: str, rel: str, ignore: IgnoreMatcher, budget: _VisitBudget, signals: SignalSet
+) -> tuple[list[tuple[int, str]], list[tuple[str, str, IgnoreMatcher]]]:
+    """List one directory, returning deep-signal hits and the subdirs worth walking.
+
+    Subdirectories excluded by ``_SKIP_DIRS`` or the ignore rules in effect
+    (including this directory's own ignore files) are pruned here, before
+    they cost a visit.
+    """
+    if not budget.claim():
+        return [], []
+    _record_io(stats=1, dirs=1)
+    _record_input(dirpath)
+    try:
+        with os.scandir(dirpath) as it:
+            entries = list(it)
+    except OSError:
+        return [], []
+    for entry in entries:
+        if entry.name in IGNORE_FILES:
+            ignore = ignore.extend(rel, _read_ignore_file(entry.path))
+    hits = []
+    subdirs = []
+    for entry in entries:
+        child_rel = f"{rel}/{entry.name}"
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name not in _SKIP_DIRS and not ignore.is_ignored(child_rel, True):
+                    subdirs.append((entry.path, child_rel, ignore))
+                continue
+            matched = signals.match(child_rel, entry.name)
+            if matched and entry.is_file() and not ignore.is_ignored(child_rel, False):
+                hits.extend((i, child_rel) for i in matched)
+        except OSError:
+            continue
+    subdirs.sort()
+    return hits, subdirs
+
+
+def _walk_signals(
+    root: Path,
+    signals: SignalSet,
+    max_depth: int = MAX_DOCKERFILE_DEPTH,
+    snapshot: RepoSnapshot | None = None,
+    workers: int = MAX_WALK_WORKERS,
+    ignore: IgnoreMatcher | None = None,
+    deadline: float | None = None,
+) -> tuple[dict[int, list[str]], bool]:
+    """Walk the tree once, collecting root-relative paths for every deep signal.
+
+    Returns ``(hits, truncated)`` where ``hits`` maps signal index to matching
+    paths and ``truncated`` is True when the walk stopped because
+    MAX_DIRS_VISITED directories were used up (or ``deadline``, a
+    ``time.monotonic()`` value, passed), so the matches are partial.
+
+    The root level is read from ``snapshot`` (built on demand if not given).
+    Each further level is listed in parallel on a thread pool, with all threads
+    drawing on one shared visit budget. Going level by level means every
+    top-level service directory is seen before the budget is spent on deep
+    subtrees. Directories matched by ``_SKIP_DIRS`` or by gitignore rules
+    (``ignore``, loaded from the root when not given) are never entered.
+    Symlinked directories are never descended into, which prevents path
+    traversal outside the repository root.
+    """
+    root_path = root.resolve()
+    root_str = str(root_path)
+    if snapshot is None:
+        snapshot = RepoSnapshot(root_path)
+    if ignore is None:
+        ignore = IgnoreMatcher.for_root(root_path, snapshot)
+    hits: dict[int, list[str]] = {}
+    budget = _VisitBudget(MAX_DIRS_VISITED, deadline)
+    if max_depth <= 0 or not budget.claim():
+        return hits, budget.exhausted
+    for name in sorted(snapshot.files):
+        if not ignore.is_ignored(name, False):
+            for i in signals.match(name, name):
+                hits.setdefault(i, []).append(name)
+    level = [
+        (os.path.join(root_str, d), d, ignore)
+        for d in snapshot.walk_dirs
+        if d not in _SKIP_DIRS and not ignore.is_ignored(d, True)
     ]
+    depth = 1
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        while level and depth < max_depth:
+            next_level = []
+            scans = pool.map(lambda item: _scan_dir(*item, budget, signals), level)
+            for dir_hits, subdirs in scans:
+                for i, rel in dir_hits:
+                    hits.setdefault(i, []).append(rel)
+                next_level.extend(subdirs)
+            if budget.exhausted:
+                break
+            level = next_level
+            depth += 1
+    return hits, budget.exhausted
+
+
+def _find_dockerfiles(
+    root: Path,
+    max_depth: int = MAX_DOCKERFILE_DEPTH,
+    snapshot: RepoSnapshot | None = None,
+    workers: int = MAX_WALK_WORKERS,
+    ignore: IgnoreMatcher | None = None,
+) -> tuple[list[str], bool]:
+    """Find Dockerfiles up to max_depth levels deep, skipping common noise dirs.
+
+    Returns ``(paths, truncated)`` with absolute paths; see ``_walk_signals``
+    for the traversal rules.
+    """
+    hits, truncated = _walk_signals(
+        root, _DOCKERFILE_ONLY, max_depth, snapshot=snapshot, workers=workers, ignore=ignore
+    )
+    root_str = str(root.resolve())
+    return [os.path.join(root_str, *rel.split("/")) for rel in hits.get(0, [])], truncated
 
-    for marker in monorepo_markers:
-        # Directory markers score +2 (weaker: could exist in any project type).
-        if (path / marker).is_dir():
-            indicators["monorepo"] += _MONOREPO_DIR_SCORE
-            evidence.append(f"Found {marker}")
-
-    for wf in workspaces_files:
-        # Workspace config files are authoritative signals, hence the higher weight.
-        if (path / wf).exists():
-            indicators["monorepo"] += _MONOREPO_CONFIG_SCORE
-            evidence.append(f"Found {wf}")
-
-    # Check package.json for workspaces field
-    pkg_json = path / "package.json"
-    if pkg_json.exists():
+
+_DEFAULT_SIGNALS = SignalSet(SIGNALS)
+_DOCKERFILE_ONLY = SignalSet([s for s in SIGNALS if s.pattern == "**/Dockerfile"])
+
+
+def _strip_yaml_scalar(value: str) -> str:
+    """Drop surrounding quotes from a plain YAML scalar."""
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"":
+        return value[1:-1]
+    return value
+
+
+def _flow_list(value: str) -> list[str]:
+    """Split a one-line YAML flow sequence such as ``["80:80", 443]``."""
+    inner = value.strip()[1:-1] if value.strip().startswith("[") else value
+    return [_strip_yaml_scalar(v) for v in inner.split(",") if v.strip()]
+
+
+def _parse_compose_file(path: Path) -> tuple[dict[str, dict], list[str], bool]:
+    """Stream one compose file and return ``(services, includes, truncated)``.
+
+    Reads line by line with at most MAX_COMPOSE_BYTES consumed, so memory use
+    does not grow with the file. Only the subset of YAML that compose files
+    use for the fields we report is understood: block mappings, ``- item``
+    sequences and one-line flow sequences. Raises OSError if the file cannot
+    be opened.
+    """
+    services: dict[str, dict] = {}
+    includes: list[str] = []
+    truncated = False
+    bytes_read = 0
+    services_indent = service_name_indent = prop_indent = None
+    in_include = False
+    include_key = include_item_indent = None
+    current = prop = port_item = None
+
+    def finish_port_item():
+        nonlocal port_item
+        if current is not None and port_item:
+            target = port_item.get("target", "")
+            published = port_item.get("published")
+            current["ports"].append(f"{published}:{target}" if published else target)
+        port_item = None
+
+    _record_io(stats=1)
+    _record_input(path)
+    with open(path, "rb") as fh:
+        while True:
+            raw = fh.readline(_MAX_COMPOSE_LINE)
+            if not raw:
+                break
+            bytes_read += len(raw)
+            # Only the head of an over-long line is parsed; the rest is skipped up
+            # to its newline rather than read as lines of its own
+            tail = raw
+            while len(tail) == _MAX_COMPOSE_LINE and not tail.endswith(b"\n") and bytes_read <= MAX_COMPOSE_BYTES:
+                tail = fh.readline(_MAX_COMPOSE_LINE)
+                bytes_read += len(tail)
+            if bytes_read > MAX_COMPOSE_BYTES:
+                truncated = True
+                break
+            line = raw.decode("utf-8", "replace").rstrip("\r\n")
+            stripped = line.lstrip()
+            if not stripped or stripped.startswith("#"):
+                continue
+            # Get line indent (number of leading spaces)
+            indent = len(line) - len(stripped)
+            comment_pos = line.find("#")
+            effective = (line if comment_pos == -1 else line[:comment_pos]).strip()
+            if not effective:
+                continue
+            if indent == 0:
+                in_include = effective == "include:"
+                include_key = include_item_indent = None
+                if in_include:
+                    continue
+            elif in_include:
+                # Entries are "- file.yml", "- path: file.yml" or a mapping whose
+                # path: holds a scalar, flow list or block list.
+                is_item = effective.startswith("- ")
+                if is_item and include_item_indent is None:
+                    include_item_indent = indent
+                body = effective[2:].strip() if is_item else effective
+                key_match = _YAML_KEY.match(body)
+                if key_match:
+                    include_key, value = key_match.group(1), key_match.group(2)
+                    if include_key == "path" and value:
+                        includes.extend(_flow_list(value) if value.startswith("[") else [_strip_yaml_scalar(value)])
+                elif is_item and (indent == include_item_indent or include_key == "path"):
+                    includes.append(_strip_yaml_scalar(body))
+                continue
+            if effective == "services:":
+                finish_port_item()
+                services_indent = indent
+                service_name_indent = prop_indent = None
+                current = prop = None
+                continue
+            if services_indent is None:
+                continue
+            # Exit services block when indentation returns to or above its level
+            if indent <= services_indent:
+                finish_port_item()
+                services_indent = service_name_indent = prop_indent = None
+                current = prop = None
+                continue
+            if service_name_indent is None:
+                service_name_indent = indent
+            # Service name at the expected indent (e.g., "  svc1:")
+            if indent == service_name_indent:
+                finish_port_item()
+                prop = prop_indent = None
+                current = None
+                if effective.endswith(":"):
+                    name = _strip_yaml_scalar(effective[:-1])
+                    current = services.setdefault(
+                        name, {"name": name, "build": None, "image": None, "ports": [], "extends": None}
+                    )
+                continue
+            if current is None:
+                continue
+            if prop_indent is None:
+                prop_indent = indent
+            key, _, value = effective.partition(":")
+            key, value = key.strip(), value.strip()
+            # Sequences may sit at the same indent as their key ("ports:\n- 80:80").
+            compact_item = prop == "ports" and indent == prop_indent and effective.startswith("- ")
+            if indent == prop_indent and not compact_item:
+                finish_port_item()
+                prop = key
+                if key == "build":
+                    current["build"] = _strip_yaml_scalar(value) if value else "."
+                elif key == "image":
+                    current["image"] = _strip_yaml_scalar(value)
+                elif key == "ports" and value:
+                    current["ports"].extend(_flow_list(value))
+                elif key == "extends" and value:
+                    current["extends"] = {"service": _strip_yaml_scalar(value), "file": None}
+                elif key == "extends":
+                    current["extends"] = {"service": None, "file": None}
+                continue
+            # Nested lines below a property
+            if prop == "build" and key == "context":
+                current["build"] = _strip_yaml_scalar(value)
+            elif prop == "ports":
+                if effective.startswith("- "):
+                    finish_port_item()
+                    item = effective[2:].strip()
+                    item_key, sep, item_value = item.partition(":")
+                    if sep and item_key.strip() in _PORT_KEYS and not item_value.startswith(":"):
+                        port_item = {item_key.strip(): _strip_yaml_scalar(item_value)}
+                    else:
+                        current["ports"].append(_strip_yaml_scalar(item))
+                elif port_item is not None and key in _PORT_KEYS:
+                    port_item[key] = _strip_yaml_scalar(value)
+            elif prop == "extends" and key in ("service", "file") and current["extends"] is not None:
+                current["extends"][key] = _strip_yaml_scalar(value)
+        finish_port_item()
+    _record_io(nbytes=bytes_read)
+    return services, includes, truncated
+
+
+def analyze_compose(root: Path, snapshot: RepoSnapshot | None = None) -> dict | None:
+    """Analyse the first readable compose file in ``root`` together with its extras.
+
+    The override file next to it (``docker-compose.override.yml`` and friends)
+    is merged in, ``include:`` references are followed and ``extends`` with a
+    ``file:`` is resolved across files; references that resolve outside
+    ``root`` are skipped. Returns None when no compose file can
+    be read, otherwise::
+
+        {"file": name, "files": [...], "truncated": bool,
+         "services": [{"name", "build", "image", "ports", "file"}, ...]}
+
+    where ``build`` is the build context and ``file`` the defining file.
+    """
+    if snapshot is None:
+        snapshot = RepoSnapshot(root)
+    for compose_name in COMPOSE_FILES:
+        if not snapshot.exists(compose_name):
+            continue
+        compose_path = root / compose_name
         try:
-            data = json.loads(pkg_json.read_text(encoding="utf-8", errors="replace"))
-            if "workspaces" in data:
-                # Explicit workspaces declaration is a strong monorepo signal.
-                indicators["monorepo"] += _MONOREPO_CONFIG_SCORE
-                evidence.append("package.json has workspaces")
-        except json.JSONDecodeError as exc:
-            print(
-                f"WARNING: Could not parse {pkg_json} as JSON: {exc}", file=sys.stderr
-            )
+            services, includes, truncated = _parse_compose_file(compose_path)
         except OSError as exc:
-            print(f"WARNING: Could not read {pkg_json}: {exc}", file=sys.stderr)
-
-    # Check for microservices indicators — try all common compose file names
-    compose_files = [
-        "docker-compose.yml",
-        "docker-compose.yaml",
-        "compose.yml",
-        "compose.yaml",
-    ]
-    for compose_name in compose_files:
-        compose_path = path / compose_name
-        if compose_path.exists():
-            try:
-                content = compose_path.read_text(encoding="utf-8", errors="replace")
-                # Count services by tracking a services: block and service names.
-                # A service is counted if it has any configuration (build, image,
-                # extends, command, ports, etc.) - not just build/image.
-                service_count = 0
-                services_indent = None
-                service_name_indent = None
-                for line in content.splitlines():
-                    stripped = line.lstrip()
-                    if not stripped or stripped.startswith("#"):
-                        continue
-                    # Get line indent (number of leading spaces)
-                    indent = len(line) - len(stripped)
-                    comment_pos = line.find("#")
-                    effective = line if comment_pos == -1 else line[:comment_pos]
-                    if effective.strip() == "services:":
-                        services_indent = indent
-                        service_name_indent = None
-                        continue
-                    if services_indent is None:
-                        continue
-                    # Exit services block when indentation returns to or above its level
-                    if indent <= services_indent:
-                        services_indent = None
-                        service_name_indent = None
-                        continue
-                    if service_name_indent is None:
-                        service_name_indent = indent
-                    # Service name at the expected indent (e.g., "  svc1:")
-                    if indent == service_name_indent and effective.strip().endswith(
-                        ":"
-                    ):
-                        service_count += 1
+            print(f"WARNING: Could not read {compose_name}: {exc}", file=sys.stderr)
+            continue  # Try next variant
+        for svc in services.values():
+            svc["file"] = compose_name
+        files = [compose_name]
+        root_resolved = root.resolve()
+        parsed = {compose_path.resolve(): (services, includes, truncated)}
+
+        def load(file_path: Path):
+            key = file_path.resolve()
+            if key not in parsed and not key.is_relative_to(root_resolved):
+                # Absolute or ../ references must not read files outside the repository
+                print(f"WARNING: Skipping {file_path}: outside the repository", file=sys.stderr)
+                parsed[key] = None
+            if key not in parsed:
+                try:
+                    parsed[key] = _parse_compose_file(file_path)
+                except OSError as exc:
+                    print(f"WARNING: Could not read {file_path}: {exc}", file=sys.stderr)
+                    parsed[key] = None
+                    return None
+                rel = os.path.relpath(file_path, root).replace(os.sep, "/")
+                files.append(rel)
+                for svc in parsed[key][0].values():
+                    svc["file"] = rel
+            return parsed[key]
+
+        # Override files replace scalars and append ports, as `docker compose` does.
+        stem, ext = os.path.splitext(compose_name)
+        for override_name in (f"{stem}.override{ext}", f"{stem}.override{_OTHER_EXT[ext]}"):
+            if snapshot.exists(override_name):
+                loaded = load(root / override_name)
+                if loaded is None:
+                    continue
+                truncated = truncated or loaded[2]
+                for name, svc in loaded[0].items():
+                    base = services.get(name)
+                    if base is None:
+                        services[name] = svc
                         continue
-                if service_count >= MIN_SERVICES_FOR_MICROSERVICES:
-                    indicators["microservices"] += service_count
-                    evidence.append(f"{compose_name} with {service_count} services")
-            except OSError as exc:
-                print(f"WARNING: Could not read {compose_name}: {exc}", file=sys.stderr)
-                continue  # Try next variant
-            break  # Only count the first compose file successfully read
-
-    # Check for multiple Dockerfiles (depth-limited to avoid traversing huge trees)
-    dockerfiles = _find_dockerfiles(path)
-    if len(dockerfiles) > 2:
-        indicators["microservices"] += len(dockerfiles)
-        evidence.append(f"{len(dockerfiles)} Dockerfiles found")
+                    for field in ("build", "image", "extends"):
+                        if svc[field] is not None:
+                            base[field] = svc[field]
+                    base["ports"].extend(p for p in svc["ports"] if p not in base["ports"])
+                break
 
-    # Check for library indicators
-    lib_markers = [
-        "setup.py",
-        "pyproject.toml",
-        "Cargo.toml",
-        "go.mod",
-        "setup.cfg",
-    ]
-    has_monorepo_signal = indicators["monorepo"] > 0
-    src_only = (path / "src").is_dir() and not (path / "apps").is_dir()
+        # include: entries are relative to the including file; follow them transitively.
+        pending = [(compose_path.parent / inc) for inc in includes]
+        while pending:
+            inc_path = pending.pop(0)
+            if inc_path.resolve() in parsed:
+                continue
+            loaded = load(inc_path)
+            if loaded is None:
+                continue
+            truncated = truncated or loaded[2]
+            for name, svc in loaded[0].items():
+                services.setdefault(name, svc)
+            pending.extend(inc_path.parent / inc for inc in loaded[1])
+
+        # extends: inherit build/image and prepend ports from the base service.
+        def resolve(svc: dict, depth: int = 0) -> dict:
+            ext = svc.pop("extends", None)
+            if not ext or not ext.get("service") or depth > _MAX_EXTENDS_DEPTH:
+                return svc
+            if ext.get("file"):
+                defining = root / svc.get("file", compose_name)
+                loaded = load(defining.parent / ext["file"])
+                pool = loaded[0] if loaded else {}
+            else:
+                pool = services
+            base = pool.get(ext["service"])
+            if base is None or base is svc:
+                return svc
+            base = resolve(base, depth + 1)
+            svc["build"] = svc["build"] if svc["build"] is not None else base["build"]
+            svc["image"] = svc["image"] if svc["image"] is not None else base["image"]
+            svc["ports"] = base["ports"] + [p for p in svc["ports"] if p not in base["ports"]]
+            return svc
+
+        result = [resolve(svc) for svc in list(services.values())]
+        for svc in result:
+            svc.pop("extends", None)
+        return {"file": compose_name, "files": files, "services": result, "truncated": truncated}
+    return None
+
+
+def _git_dir(root: Path) -> Path | None:
+    """Return the git directory for ``root``, following ``.git`` files used by worktrees."""
+    dot_git = root / ".git"
+    _record_io(stats=1)
+    if dot_git.is_dir():
+        return dot_git
+    try:
+        content = dot_git.read_text(encoding="utf-8", errors="replace").strip()
+    except OSError:
+        return None
+    if not content.startswith("gitdir:"):
+        return None
+    git_dir = Path(content[len("gitdir:"):].strip())
+    if not git_dir.is_absolute():
+        git_dir = root / git_dir
+    return git_dir if git_dir.is_dir() else None
+
+
+def _git_head(git_dir: Path) -> str | None:
+    """Resolve HEAD to a commit id by reading refs directly (no git subprocess)."""
+    _record_io(stats=1)
+    try:
+        head = (git_dir / "HEAD").read_text(encoding="utf-8", errors="replace").strip()
+    except OSError:
+        return None
+    if not head.startswith("ref:"):
+        return head or None
+    ref = head[len("ref:"):].strip()
+    # Linked worktrees keep shared refs in the common directory.
+    ref_dirs = [git_dir]
+    try:
+        common = (git_dir / "commondir").read_text(encoding="utf-8").strip()
+        ref_dirs.append((git_dir / common).resolve())
+    except OSError:
+        pass
+    for ref_dir in ref_dirs:
+        try:
+            return (ref_dir / ref).read_text(encoding="utf-8", errors="replace").strip()
+        except OSError:
+            pass
+        try:
+            with open(ref_dir / "packed-refs", encoding="utf-8", errors="replace") as fh:
+                for line in fh:
+                    parts = line.split()
+                    if len(parts) == 2 and parts[1] == ref:
+                        return parts[0]
+        except OSError:
+            pass
+    return None
+
+
+def _read_git_index(git_dir: Path) -> list[str] | None:
+    """Return the tracked paths recorded in ``git_dir/index``, or None if unusable.
+
+    Parses index versions 2–4 in pure Python (see gitformat-index(5)); only the
+    flags and path of each entry are decoded. Unmerged entries appear once and
+    sparse-directory entries are skipped. Returns None when the index is
+    missing, malformed or not the whole story (a split index, or any other
+    extension git marks as required) so callers can fall back to a
+    filesystem walk.
+    """
+    _record_io(stats=1)
+    _record_input(git_dir / "index")
+    try:
+        data = (git_dir / "index").read_bytes()
+    except OSError:
+        return None
+    _record_io(nbytes=len(data))
+    if len(data) < 12 or data[:4] != b"DIRC":
+        return None
+    version, count = struct.unpack_from(">II", data, 4)
+    if version not in (2, 3, 4):
+        return None
+    paths = []
+    pos = 12
+    prev = b""
+    try:
+        for _ in range(count):
+            (flags,) = struct.unpack_from(">H", data, pos + 60)
+            header = 62
+            if version >= 3 and flags & 0x4000:
+                header += 2  # Extended flags word
+            if version == 4:
+                # Path is prefix-compressed against the previous entry.
+                pos += header
+                strip = data[pos] & 0x7F
+                while data[pos] & 0x80:
+                    pos += 1
+                    strip = ((strip + 1) << 7) | (data[pos] & 0x7F)
+                pos += 1
+                end = data.index(b"\0", pos)
+                name = prev[: len(prev) - strip] + data[pos:end]
+                pos = end + 1
+            else:
+                start = pos + header
+                name_len = flags & 0x0FFF
+                end = start + name_len if name_len < 0x0FFF else data.index(b"\0", start)
+                name = data[start:end]
+                # Entries are NUL-padded to a multiple of eight bytes.
+                pos += (header + (end - start) + 8) & ~7
+            if name != prev and not name.endswith(b"/"):
+                paths.append(name.decode("utf-8", "surrogateescape"))
+            prev = name
+    except (struct.error, IndexError, ValueError):
+        return None
+    if not _optional_index_extensions(data, pos):
+        return None
+    return paths
 
-    for marker in lib_markers:
-        if (path / marker).exists():
-            indicators["library"] += 1
 
-    if src_only and not has_monorepo_signal:
-        indicators["library"] += 2
+def _optional_index_extensions(data: bytes, pos: int) -> bool:
+    """Return True if ``data[pos:]`` is only optional extensions plus the trailing checksum.
 
+    Extensions are ``<4-byte signature><4-byte size><payload>``; a signature
+    starting with A-Z is optional (safe to ignore), anything else — notably
+    ``link`` of a split index, whose other entries live in sharedindex.* —
+    changes what the entries mean. The checksum is SHA-1 or SHA-256 sized.
+    """
+    for hash_len in (20, 32):
+        at = pos
+        signatures = []
+        while len(data) - at >= hash_len + 8:
+            signatures.append(data[at:at + 4])
+            (size,) = struct.unpack_from(">I", data, at + 4)
+            at += 8 + size
+        if len(data) - at == hash_len:
+            return all(b"A" <= sig[:1] <= b"Z" for sig in signatures)
+    return False
+
+
+def _match_tracked(tracked: list[str], signals: SignalSet) -> dict[int, list[str]]:
+    """Run deep signals over a tracked-path list, honouring _SKIP_DIRS."""
+    hits: dict[int, list[str]] = {}
+    for rel in tracked:
+        name = rel.rpartition("/")[2]
+        matched = signals.match(rel, name)
+        if not matched or any(part in _SKIP_DIRS for part in rel.split("/")[:-1]):
+            continue
+        for i in matched:
+            hits.setdefault(i, []).append(rel)
+    return hits
+
+
+def _cache_key(path: Path) -> str:
+    """Build the key a cache entry for ``path`` must carry: the cache version and, in git, HEAD.
+
+    The key only settles which entry applies; whether the working tree still
+    matches it is checked against the entry's input stamps (see
+    _input_stamps).
+    """
+    git_dir = _git_dir(path)
+    head = _git_head(git_dir) if git_dir is not None else None
+    material = {"version": CACHE_VERSION, "head": head}
+    return hashlib.sha256(json.dumps(material, sort_keys=True).encode()).hexdigest()
+
+
+def _input_stamps(path: Path, inputs) -> tuple[dict[str, list | None], int]:
+    """Stat each of ``inputs`` (relative to ``path``) and return ``{rel: [mtime_ns, size] | None}``.
+
+    Directories are stamped by their own mtime, which changes whenever an
+    entry is added, removed or renamed in them; files read are stamped by
+    mtime and size; a path that did not exist is None, so creating it later
+    is noticed too. Also returns the newest mtime seen.
+    """
+    stamps: dict[str, list | None] = {}
+    newest = 0
+    for rel in sorted(inputs):
+        _record_io(stats=1)
+        try:
+            st = os.stat(path / rel)
+        except OSError:
+            stamps[rel] = None
+            continue
+        stamps[rel] = [st.st_mtime_ns, st.st_size]
+        newest = max(newest, st.st_mtime_ns)
+    return stamps, newest
+
+
+def _load_cached_result(path: Path, key: str) -> dict | None:
+    """Return the cached detection result for ``key``, or None on a miss or if any input changed."""
+    try:
+        entry = json.loads((path / CACHE_PATH).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if not isinstance(entry, dict) or entry.get("key") != key:
+        return None
+    inputs, result = entry.get("inputs"), entry.get("result")
+    if not isinstance(inputs, dict) or not isinstance(result, dict):
+        return None
+    return result if _input_stamps(path, inputs)[0] == inputs else None
+
+
+def _store_cached_result(path: Path, key: str, inputs: set[str], result: dict) -> None:
+    """Persist ``result`` with the stamps of its ``inputs``, unless one changed too recently to trust."""
+    cache_file = path / CACHE_PATH
+    own_dir = CACHE_PATH.parts[0]  # .claude/ changes as the cache is written, so is never an input
+    try:
+        # Create the directory first: adding .claude/ changes the root mtime,
+        # and the stamps must reflect the tree as the next lookup will see it.
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        rels = {os.path.relpath(p, path).replace(os.sep, "/") for p in inputs}
+        stamps, newest = _input_stamps(path, {r for r in rels if r.split("/", 1)[0] != own_dir})
+        if time.time_ns() - newest < _RACY_WINDOW_NS:
+            return
+        tmp = cache_file.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"key": key, "inputs": stamps, "result": result}), encoding="utf-8")
+        os.replace(tmp, cache_file)
+    except OSError as exc:
+        print(f"WARNING: Could not write cache {cache_file}: {exc}", file=sys.stderr)
+
+
+def detect_repo_type(
+    root: str = ".",
+    use_cache: bool = False,
+    deadline_ms: float | None = None,
+    min_confidence: float | None = None,
+    profile: bool = False,
+) -> dict:
+    """Analyse repo structure and return the detected architecture type with confidence.
+
+    Signals are checked cheapest first (see STAGES). Detection stops before
+    the next stage once the leader can no longer be overtaken, once its
+    confidence reaches ``min_confidence``, or once ``deadline_ms`` has
+    elapsed (the tree walk is also cut short at the deadline). The result's
+    ``stages`` lists the stages that ran and ``stop_reason`` says why the
+    rest were skipped (None when all ran).
+
+    With ``use_cache=True`` the result is read from and written to
+    ``.claude/cache/detect-repo-type.json`` under the root. The entry is keyed
+    on the git HEAD and records the stamps of every directory the detection
+    listed and every file it read (markers, ignore files, compose files and
+    their includes, the git index); a hit, which re-stats those instead of
+    re-reading and re-walking them, needs all of them unchanged. Only
+    complete results are stored.
+
+    With ``profile=True`` the result gains a ``profile`` entry holding wall
+    time, metadata calls, directories listed and bytes read for each stage
+    (see DetectionProfile). Profiling is per process: do not profile
+    concurrent calls from several threads.
+    """
+    global _active_profile, _active_inputs
+    _active_profile = DetectionProfile() if profile else None
+    _active_inputs = _InputLog() if use_cache else None
+    try:
+        path = Path(root)
+        with _profile_stage("snapshot"):
+            snapshot = RepoSnapshot(path)
+        if use_cache:
+            with _profile_stage("cache"):
+                key = _cache_key(path)
+                cached = _load_cached_result(path, key)
+            if cached is not None:
+                if profile:
+                    cached = dict(cached, profile=_active_profile.as_dict())
+                return cached
+        result = _detect(path, snapshot, deadline_ms=deadline_ms, min_confidence=min_confidence)
+        if use_cache and result["stop_reason"] is None:
+            with _profile_stage("cache"):
+                _store_cached_result(path, key, _active_inputs.paths, result)
+        if profile:
+            result["profile"] = _active_profile.as_dict()
+        return result
+    finally:
+        _active_profile = _active_inputs = None
+
+
+def _apply_signals(
+    path: Path,
+    signals: SignalSet,
+    hits: dict[int, list[str]],
+    indicators: dict[str, int],
+    evidence: list[str],
+    indexes: list[int],
+) -> None:
+    """Score the signals in ``indexes`` (table order) from their collected matches."""
+    for i in indexes:
+        sig = signals.signals[i]
+        matches = hits.get(i, [])
+        if sig.predicate is not None:
+            matches = [m for m in matches if sig.predicate(path / m.rstrip("/"))]
+        count = len(matches)
+        if count < sig.min_count:
+            continue
+        indicators[sig.category] += sig.weight * count if sig.per_match else sig.weight
+        if sig.evidence:
+            evidence.append(sig.evidence.format(path=matches[0], count=count))
+
+
+def _library_boost(snapshot: RepoSnapshot, monorepo_score: int) -> int:
+    """Extra library score from layout, which only applies without monorepo signals."""
+    if monorepo_score > 0:
+        return 0
+    boost = 0
+    if snapshot.is_dir("src") and not snapshot.is_dir("apps"):
+        boost += 2
     # Python packaging files without monorepo signal indicate a standalone library
     # even when there is no src/ directory (e.g. flat-layout Python packages).
-    has_python_pkg = any(
-        (path / m).exists() for m in ["pyproject.toml", "setup.py", "setup.cfg"]
-    )
-    if has_python_pkg and not has_monorepo_signal:
-        indicators["library"] += 2
+    if any(snapshot.exists(m) for m in ["pyproject.toml", "setup.py", "setup.cfg"]):
+        boost += 2
+    return boost
+
+
+def _max_gain(signals: SignalSet, indexes: list[int], hits: dict[int, list[str]] | None) -> dict:
+    """Upper bound on what ``indexes`` can still add per category (None = unbounded).
+
+    With ``hits`` given, only signals that already have candidate matches can
+    fire, each for at most its weight times its candidates. Without them a
+    per_match signal is unbounded.
+    """
+    gain: dict[str, int | None] = {}
+    for i in indexes:
+        sig = signals.signals[i]
+        if hits is not None:
+            if i not in hits:
+                continue
+            bound = sig.weight * len(hits[i]) if sig.per_match else sig.weight
+        else:
+            bound = None if sig.per_match else sig.weight
+        current = gain.get(sig.category, 0)
+        gain[sig.category] = None if current is None or bound is None else current + bound
+    return gain
+
+
+def _stop_reason(
+    indicators: dict[str, int],
+    snapshot: RepoSnapshot,
+    remaining: list[dict],
+    deadline: float | None,
+    min_confidence: float | None,
+) -> str | None:
+    """Decide whether the remaining stages can be skipped, and say why."""
+    if deadline is not None and time.monotonic() > deadline:
+        return "deadline"
+    gain: dict[str, int | None] = {}
+    for stage_gain in remaining:
+        for category, bound in stage_gain.items():
+            current = gain.get(category, 0)
+            gain[category] = None if current is None or bound is None else current + bound
+    boost = _library_boost(snapshot, indicators["monorepo"])
+    scores = dict(indicators, library=indicators["library"] + boost)
+    leader = max(scores, key=lambda k: scores[k])
+    if scores[leader] < 2:
+        return None
+    if min_confidence is not None and scores[leader] / sum(scores.values()) >= min_confidence:
+        return "min_confidence"
+    # A library lead built on layout boosts collapses if a monorepo signal still turns up.
+    floor = indicators["library"] if leader == "library" and gain.get("monorepo", 0) != 0 else scores[leader]
+    for category, score in scores.items():
+        if category == leader:
+            continue
+        bound = gain.get(category, 0)
+        if bound is None or score + bound >= floor:
+            return None
+    return "decisive"
+
+
+def _detect(
+    path: Path,
+    snapshot: RepoSnapshot,
+    signals: SignalSet | None = None,
+    deadline_ms: float | None = None,
+    min_confidence: float | None = None,
+) -> dict:
+    """Score signals stage by stage in ``path`` and pick the winning repository type."""
+    if signals is None:
+        signals = _DEFAULT_SIGNALS
+    deadline = None if deadline_ms is None else time.monotonic() + deadline_ms / 1000
+    indicators = {"monorepo": 0, "microservices": 0, "single_app": 0, "library": 0}
+
+    evidence = []
+
+    root_hits = signals.match_root(snapshot)
+    markers = [i for i in signals.root if signals.signals[i].predicate is None]
+    workspace = [i for i in signals.root if signals.signals[i].predicate is not None]
+    root_set = set(signals.root)
+    deep = [i for i in range(len(signals.signals)) if i not in root_set]
+    has_compose = any(snapshot.exists(n) for n in COMPOSE_FILES)
+    # In a git checkout the index lists every tracked path, so the deep signals'
+    # real matches are known up front: no walk (and no depth or breadth cutoff)
+    # is needed, and the deep stage has a true upper bound.
+    tracked_hits = None
+    if snapshot.exists(".git"):
+        git_dir = _git_dir(path)
+        if git_dir is not None:
+            with _profile_stage("deep"):
+                tracked = _read_git_index(git_dir)
+                if tracked is not None:
+                    tracked_hits = _match_tracked(tracked, signals)
+    # Upper bounds on what each stage can add, used to stop once the leader is safe.
+    stage_gains = {
+        "markers": _max_gain(signals, markers, root_hits),
+        "workspace": _max_gain(signals, workspace, root_hits),
+        "compose": {"microservices": None} if has_compose else {},
+        "deep": _max_gain(signals, deep, tracked_hits),
+    }
+
+    truncated = False
+    stages = []
+    stop_reason = None
+    for n, stage in enumerate(STAGES):
+        if n > 0:
+            remaining = [stage_gains[s] for s in STAGES[n:]]
+            stop_reason = _stop_reason(indicators, snapshot, remaining, deadline, min_confidence)
+            if stop_reason:
+                break
+        with _profile_stage(stage):
+            if stage == "markers":
+                # Root-level markers come straight from the snapshot.
+                _apply_signals(path, signals, root_hits, indicators, evidence, markers)
+            elif stage == "workspace":
+                # Workspace configs whose content must be read (package.json, Cargo.toml, ...).
+                _apply_signals(path, signals, root_hits, indicators, evidence, workspace)
+            elif stage == "compose":
+                # First readable compose file plus its override and include: files
+                compose = analyze_compose(path, snapshot)
+                if compose is not None:
+                    service_count = len(compose["services"])
+                    if service_count >= MIN_SERVICES_FOR_MICROSERVICES:
+                        indicators["microservices"] += service_count
+                        evidence.append(f"{compose['file']} with {service_count} services")
+            else:
+                # Deep signals (Dockerfiles, Nx projects, ...) in one traversal
+                if tracked_hits is not None:
+                    deep_hits = tracked_hits
+                else:
+                    deep_hits, truncated = _walk_signals(path, signals, snapshot=snapshot, deadline=deadline)
+                _apply_signals(path, signals, deep_hits, indicators, evidence, deep)
+        if truncated:
+            if deadline is not None and time.monotonic() > deadline:
+                stop_reason = "deadline"
+                evidence.append("Tree scan stopped at the deadline; counts are partial")
+            else:
+                evidence.append(
+                    f"Tree scan stopped after {MAX_DIRS_VISITED} directories; counts are partial"
+                )
+        stages.append(stage)
+    if len(stages) < len(STAGES):
+        evidence.append(f"Stopped after {stages[-1]} stage ({stop_reason})")
+
+    # Check for library indicators
+    indicators["library"] += _library_boost(snapshot, indicators["monorepo"])
 
     # Determine winner
     repo_type = max(indicators, key=lambda k: indicators[k])
@@ -196,15 +1436,151 @@ def detect_repo_type(root: str = ".") -> dict:
         "confidence": round(confidence, 2),
         "evidence": evidence,
         "scores": indicators,
+        "truncated": truncated,
+        "stages": stages,
+        "stop_reason": stop_reason,
     }
 
 
+def _detect_one(root: str, use_cache: bool) -> dict:
+    """Classify one repository for fleet mode, turning any failure into an error record."""
+    start = time.perf_counter()
+    try:
+        record = {"root": root, **detect_repo_type(root, use_cache=use_cache)}
+    except Exception as exc:  # One bad repo must not abort the batch
+        record = {"root": root, "error": f"{type(exc).__name__}: {exc}"}
+    record["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return record
+
+
+def _error_record(root: str, exc: BaseException | str, start: float) -> dict:
+    error = exc if isinstance(exc, str) else f"{type(exc).__name__}: {exc}"
+    return {"root": root, "error": error, "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)}
+
+
+def detect_many(roots, workers: int | None = None, use_cache: bool = False, mp_context=None):
+    """Classify many repositories on a process pool, yielding records as they finish.
+
+    Each record is the ``detect_repo_type`` result plus ``root`` and
+    ``elapsed_ms``; a repository that raises yields ``{"root", "error",
+    "elapsed_ms"}`` instead, as does one whose task fails in the pool itself
+    (e.g. cannot be sent to the worker). ``workers`` defaults to the CPU
+    count; with ``workers <= 1`` everything runs in-process, in order.
+    ``mp_context`` is passed to the pool; tasks go through
+    ``_siblings.call_sibling`` so they pickle under any start method. If a
+    worker process dies outright, the repositories it left unfinished are
+    retried one per fresh process so the crash is pinned to the repository
+    that caused it.
+    """
+    roots = [str(r) for r in roots]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(roots) <= 1:
+        for root in roots:
+            yield _detect_one(root, use_cache)
+        return
+    retry = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=min(workers, len(roots)), mp_context=mp_context) as pool:
+        futures = {
+            pool.submit(call_sibling, "detect-repo-type", "_detect_one", root, use_cache): root for root in roots
+        }
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except BrokenProcessPool:
+                retry.append(futures[future])
+            except Exception as exc:  # One task failing in the pool must not sink the batch
+                yield _error_record(futures[future], exc, start)
+    for root in sorted(retry, key=roots.index):
+        start = time.perf_counter()
+        try:
+            with ProcessPoolExecutor(max_workers=1, mp_context=mp_context) as pool:
+                yield pool.submit(call_sibling, "detect-repo-type", "_detect_one", root, use_cache).result()
+                continue
+        except BrokenProcessPool:
+            error = "worker process terminated abruptly"
+        except Exception as exc:
+            error = exc
+        yield _error_record(root, error, start)
+
+
+def _fleet_roots(fleet_dir: Path) -> list[Path]:
+    """Return the repository checkouts directly under ``fleet_dir`` (hidden dirs skipped)."""
+    with os.scandir(fleet_dir) as it:
+        return sorted(
+            Path(e.path) for e in it if e.is_dir() and not e.name.startswith(".")
+        )
+
+
 if __name__ == "__main__":
-    root = Path(sys.argv[1] if len(sys.argv) > 1 else ".").resolve()
+    parser = argparse.ArgumentParser(description="Detect repository architecture type.")
+    parser.add_argument("root", nargs="?", default=".", help="repository root (default: .)")
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="reuse and update .claude/cache/detect-repo-type.json in the repository (off by default, "
+        "so a first run never writes into the tree)",
+    )
+    parser.add_argument(
+        "--deadline-ms",
+        type=float,
+        default=None,
+        help="skip remaining detection stages once this many milliseconds have passed",
+    )
+    parser.add_argument(
+        "--min-confidence",
+        type=float,
+        default=None,
+        help="skip remaining detection stages once the leader reaches this confidence",
+    )
+    parser.add_argument("--json", action="store_true", help="print the full result as JSON")
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="report wall time, metadata calls, directories listed and bytes read per stage",
+    )
+    parser.add_argument(
+        "--fleet",
+        metavar="DIR",
+        help="classify every repository directly under DIR, streaming JSONL records",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="worker processes for --fleet (default: CPU count)",
+    )
+    args = parser.parse_args()
+    if args.fleet:
+        fleet_dir = Path(args.fleet).resolve()
+        if not fleet_dir.is_dir():
+            print(f"ERROR: '{fleet_dir}' is not a valid directory", file=sys.stderr)
+            sys.exit(1)
+        failed = 0
+        for record in detect_many(_fleet_roots(fleet_dir), workers=args.workers, use_cache=args.cache):
+            failed += "error" in record
+            print(json.dumps(record), flush=True)
+        sys.exit(1 if failed else 0)
+    root = Path(args.root).resolve()
     if not root.is_dir():
         print(f"ERROR: '{root}' is not a valid directory", file=sys.stderr)
         sys.exit(1)
-    result = detect_repo_type(str(root))
+    result = detect_repo_type(
+        str(root),
+        use_cache=args.cache,
+        deadline_ms=args.deadline_ms,
+        min_confidence=args.min_confidence,
+        profile=args.profile,
+    )
+    if args.json:
+        print(json.dumps(result, indent=2))
+        sys.exit(0)
     print(f"TYPE: {result['type']} (confidence: {result['confidence']})")
     for e in result["evidence"]:
         print(f"  - {e}")
+    if args.profile:
+        print("PROFILE:")
+        rows = {**result["profile"]["stages"], "total": result["profile"]["total"]}
+        for name, c in rows.items():
+            print(f"  {name}: {c['wall_ms']:.2f} ms, {c['stats']} stats, {c['dirs']} dirs, {c['bytes']} bytes")
@@ -1,12 +1,34 @@
 #!/usr/bin/env python3
 """Estimate token count and enforce budgets for .claude/ files."""
 
+from __future__ import annotations
+
+import argparse
+import codecs
+import ctypes
+import ctypes.util
+import functools
+import hashlib
+import json
+import mmap
+import os
+import re
+import select
+import struct
 import sys
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+from _siblings import load_sibling
+
 # Aggregate budget for all L2 memory files combined
 L2_TOTAL_BUDGET = 10_000
 
+# Keys are paths relative to .claude/memory/ (or "CLAUDE.md"), so
+# "architecture.md" does not also cap "services/architecture.md"
 BUDGETS = {
     "CLAUDE.md": 500,
     "architecture.md": 5000,
@@ -17,114 +39,1462 @@ BUDGETS = {
 # Default budget applied to any memory file not listed above
 MEMORY_DEFAULT_BUDGET = 5000
 
-# Skip files larger than this to avoid reading multi-GB files into memory
+# Memory files are read on a thread pool of at most this many workers
+MAX_READ_WORKERS = 8
+
+# Markdown structure recognised by scan_sections (ATX headings and fences)
+_HEADING = re.compile(r"^ {0,3}(#{1,6})(?:[ \t]+(.*?))??(?:[ \t]+#+)?[ \t]*$")
+_FENCE = re.compile(r"^ {0,3}(`{3,}|~{3,})[ \t]*([^`\s]*)")
+
+# Sections listed per file by the --sections CLI flag
+_SECTIONS_SHOWN = 5
+
+# --fix: user-owned text starts at a <!-- USER ... --> marker and runs to
+# <!-- /USER --> or the end of the file; it is never moved
+_USER_START = re.compile(r"^\s*<!--\s*USER\b")
+_USER_END = re.compile(r"^\s*<!--\s*/\s*USER\s*-->")
+
+# --fix: CLAUDE.md sections that never move, and those that move only after
+# everything else (matched on the lower-cased heading text)
+_PINNED_SECTIONS = {"context loading"}
+_CORE_SECTIONS = {"stack", "commands", "quick start", "packages", "services"}
+
+# --fix: L2 file for a moved section, by the first keyword found as a whole
+# word (optionally plural or -ing) in its heading, so "Terminal UI" is not
+# a glossary term; anything unmatched goes to architecture.md
+_L2_KEYWORDS = [
+    ("glossary.md", ("glossary", "term", "acronym", "definition", "vocabulary", "jargon")),
+    ("conventions.md", (
+        "convention", "style", "naming", "pattern", "lint", "format", "formatting", "git", "commit",
+        "branch", "test", "guideline", "rule", "workflow",
+    )),
+]
+_L2_ROUTES = [
+    (target, re.compile(r"\b(?:" + "|".join(keywords) + r")(?:s|es|ing)?\b"))
+    for target, keywords in _L2_KEYWORDS
+]
+_L2_DEFAULT = "architecture.md"
+_L2_TITLES = {"architecture.md": "Architecture", "conventions.md": "Conventions", "glossary.md": "Glossary"}
+
+# --census: languages by file extension; anything else is sniffed for NUL
+# bytes and counted as "Other" if it looks like text
+LANGUAGES = {
+    ".py": "Python", ".pyi": "Python", ".js": "JavaScript", ".mjs": "JavaScript", ".cjs": "JavaScript",
+    ".jsx": "JavaScript", ".ts": "TypeScript", ".tsx": "TypeScript", ".go": "Go", ".rs": "Rust",
+    ".java": "Java", ".kt": "Kotlin", ".kts": "Kotlin", ".scala": "Scala", ".rb": "Ruby", ".php": "PHP",
+    ".c": "C", ".h": "C", ".cc": "C++", ".cpp": "C++", ".cxx": "C++", ".hpp": "C++", ".cs": "C#",
+    ".swift": "Swift", ".m": "Objective-C", ".sh": "Shell", ".bash": "Shell", ".zsh": "Shell",
+    ".sql": "SQL", ".html": "HTML", ".htm": "HTML", ".css": "CSS", ".scss": "CSS", ".vue": "Vue",
+    ".svelte": "Svelte", ".md": "Markdown", ".mdx": "Markdown", ".rst": "reStructuredText", ".txt": "Text",
+    ".json": "JSON", ".yml": "YAML", ".yaml": "YAML", ".toml": "TOML", ".ini": "INI", ".cfg": "INI",
+    ".xml": "XML", ".proto": "Protobuf", ".graphql": "GraphQL", ".tf": "Terraform", ".lua": "Lua",
+    ".ex": "Elixir", ".exs": "Elixir", ".erl": "Erlang", ".hs": "Haskell", ".dart": "Dart", ".r": "R",
+}
+_BINARY_EXTENSIONS = {
+    ".png", ".jpg", ".jpeg", ".gif", ".bmp", ".ico", ".webp", ".pdf", ".zip", ".gz", ".tgz", ".bz2",
+    ".xz", ".7z", ".tar", ".jar", ".war", ".whl", ".so", ".dylib", ".dll", ".exe", ".o", ".a", ".lib",
+    ".class", ".pyc", ".pyo", ".woff", ".woff2", ".ttf", ".otf", ".eot", ".mp3", ".mp4", ".mov", ".wav",
+    ".avi", ".bin", ".dat", ".db", ".sqlite", ".parquet", ".npy", ".pkl",
+}
+# Bytes read from an unrecognised file to decide whether it is binary
+_SNIFF_BYTES = 1024
+# Files per language whose real token/byte ratio is measured
+CENSUS_SAMPLES_PER_LANGUAGE = 5
+# Only this much of each sample file is read
+_MAX_SAMPLE_BYTES = 256 * 1024
+# Default depth of the per-directory rollup
+CENSUS_DEPTH = 3
+
+# --watch: seconds between stat sweeps when inotify is unavailable, and the
+# quiet period that ends a burst of writes
+WATCH_POLL_INTERVAL = 0.5
+WATCH_DEBOUNCE = 0.2
+
+# Files larger than this are counted by streaming through mmap instead of
+# being read whole
 _MAX_FILE_BYTES = 1_000_000  # 1 MB
 
+# Bytes decoded per step when streaming a large file
+_STREAM_CHUNK_BYTES = 1 << 20
+
+# Token manifest: one {size, mtime_ns, sha256, tokens} record per file,
+# keyed by repo-relative path and stamped with the engine (and, for "bpe",
+# the merges file's stat), so switching engines never reuses a count.
+MANIFEST_PATH = Path(".claude") / "cache" / "tokens.json"
+# Covers what the engine stamp does not: the record layout and any change
+# to how an engine counts, such as new CLASS_WEIGHTS.
+MANIFEST_VERSION = 2
+# A file written less than this long ago gets no mtime in its record, so the
+# next run re-hashes it rather than trusting a stat that may not have moved.
+_RACY_WINDOW_NS = 2_000_000_000
+
+
+# Byte-level BPE merges used by the "bpe" engine: GPT-2's published
+# vocab.bpe (MIT, see bpe-merges.LICENSE), so counts match GPT-2 exactly.
+# Any GPT-2 style merges file can be dropped in its place.
+BPE_MERGES_PATH = Path(__file__).resolve().parent / "bpe-merges.txt"
 
-def estimate_tokens(text: str) -> int:
-    """Convert UTF-8 byte length to an approximate token count (4 bytes/token)."""
+# GPT-2 pre-tokenizer: contractions, letter runs, digit runs, punctuation runs
+# (each with one optional leading space) and whitespace. ``re`` has no \p{L},
+# so letters are spelled [^\W\d_].
+_PRETOKEN = re.compile(r"""'(?:[sdmt]|ll|ve|re)| ?[^\W\d_]+| ?\d+| ?(?:[^\s\w]|_)+|\s+(?!\S)|\s+""")
+
+# Per-word BPE results kept in memory; cleared wholesale when full
+_MAX_WORD_CACHE = 100_000
+
+# Token counts per (engine, content sha256); repeated validation of an
+# unchanged file costs one hash instead of a full encode
+_COUNT_CACHE: dict[tuple[str, str], int] = {}
+_MAX_COUNT_CACHE = 4096
+
+
+def _byte_to_unicode() -> dict[int, str]:
+    """GPT-2's reversible byte -> printable character table used in merges files."""
+    keep = [*range(ord("!"), ord("~") + 1), *range(ord("¡"), ord("¬") + 1), *range(ord("®"), ord("ÿ") + 1)]
+    table = {b: chr(b) for b in keep}
+    shifted = 0
+    for b in range(256):
+        if b not in table:
+            table[b] = chr(256 + shifted)
+            shifted += 1
+    return table
+
+
+class BPETokenizer:
+    """Pure-Python byte-level BPE that counts tokens from a merges file.
+
+    Only counts are needed, so no vocabulary or token ids are loaded: a word
+    is split into byte symbols and the lowest-ranked adjacent pair is merged
+    until no pair has a rank. Results are memoised per pre-tokenized word.
+    """
+
+    def __init__(self, merges_path: Path):
+        self.ranks: dict[tuple[str, str], int] = {}
+        with open(merges_path, encoding="utf-8") as fh:
+            for line in fh:
+                if line.startswith("#version"):
+                    continue
+                pair = line.rstrip("\n").split(" ")
+                if len(pair) == 2 and tuple(pair) not in self.ranks:
+                    self.ranks[(pair[0], pair[1])] = len(self.ranks)
+        self._byte_chars = _byte_to_unicode()
+        self._words: dict[str, int] = {}
+
+    def encode_word(self, word: str) -> list[str]:
+        """Return the BPE symbols for one pre-tokenized word."""
+        parts = [self._byte_chars[b] for b in word.encode("utf-8")]
+        ranks = self.ranks
+        while len(parts) > 1:
+            best = None
+            best_rank = len(ranks)
+            for i in range(len(parts) - 1):
+                rank = ranks.get((parts[i], parts[i + 1]))
+                if rank is not None and rank < best_rank:
+                    best, best_rank = i, rank
+            if best is None:
+                break
+            first, second = parts[best], parts[best + 1]
+            merged = []
+            i = 0
+            while i < len(parts):
+                if i < len(parts) - 1 and parts[i] == first and parts[i + 1] == second:
+                    merged.append(first + second)
+                    i += 2
+                else:
+                    merged.append(parts[i])
+                    i += 1
+            parts = merged
+        return parts
+
+    def count(self, text: str) -> int:
+        """Return the number of BPE tokens in ``text``."""
+        words = self._words
+        total = 0
+        for word in _PRETOKEN.findall(text):
+            n = words.get(word)
+            if n is None:
+                if len(words) >= _MAX_WORD_CACHE:
+                    words.clear()
+                n = words[word] = len(self.encode_word(word))
+            total += n
+        return total
+
+
+@functools.cache
+def load_bpe(merges_path: Path | None = None) -> BPETokenizer | None:
+    """Load (once) the BPE tokenizer, or None with a warning if the file is unusable."""
+    path = merges_path or BPE_MERGES_PATH
+    try:
+        return BPETokenizer(path)
+    except (OSError, UnicodeDecodeError) as exc:
+        print(f"WARNING: could not load BPE merges {path}: {exc}; using 4 bytes/token", file=sys.stderr)
+        return None
+
+
+def _bytes_engine(text: str) -> int:
     return len(text.encode("utf-8")) // 4
 
 
-def check_file(filepath: Path) -> dict:
-    """Check a memory file's token count against its budget."""
+def _bpe_engine(text: str) -> int:
+    tokenizer = load_bpe(BPE_MERGES_PATH)
+    if tokenizer is None:
+        return _bytes_engine(text)
+    return tokenizer.count(text)
+
+
+# Byte classes for the "classes" engine: every byte maps to one class code
+# with bytes.translate, and features are counted with bytes.count at C speed.
+_CLASS_CODES = bytearray(b"." * 256)  # punctuation and control bytes
+for _b in b"abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ":
+    _CLASS_CODES[_b] = ord("a")
+for _b in b"0123456789":
+    _CLASS_CODES[_b] = ord("0")
+for _b in b" \t\r\f\v":
+    _CLASS_CODES[_b] = ord(" ")
+_CLASS_CODES[ord("\n")] = ord("n")
+for _b in range(0x80, 0xC0):
+    _CLASS_CODES[_b] = ord("c")  # UTF-8 continuation byte
+for _b in range(0xC0, 0xE0):
+    _CLASS_CODES[_b] = ord("2")  # lead byte of a 2-byte character
+for _b in range(0xE0, 0x100):
+    _CLASS_CODES[_b] = ord("3")  # lead byte of a 3- or 4-byte character
+_CLASS_TABLE = bytes(_CLASS_CODES)
+del _CLASS_CODES, _b
+
+
+def _run_table(codes: bytes) -> bytes:
+    """Translation table from class codes to b"1" (in ``codes``) or b"0"."""
+    return bytes(ord("1") if i in codes else ord("0") for i in range(256))
+
+
+# Features are byte counts per class plus the number of runs of a class
+# (letters runs ~ words, punctuation runs ~ operators)
+_RUN_TABLES = {
+    "letter_runs": _run_table(b"a"),
+    "digit_runs": _run_table(b"0"),
+    "space_runs": _run_table(b" "),
+    "punct_runs": _run_table(b"."),
+}
+CLASS_FEATURES = (
+    "bytes", "letters", "letter_runs", "digits", "digit_runs", "space_runs",
+    "newlines", "punct", "punct_runs", "multibyte2", "multibyte3",
+)
+
+# Fenced code blocks in markdown are scored with their own weights
+_FENCE_BYTES = re.compile(rb"^ {0,3}(?:`{3,}|~{3,})[^\n]*$", re.MULTILINE)
+
+# Weights per feature for prose and for fenced code, fitted by
+# fit_class_weights() against the "bpe" engine (GPT-2's counts) on the
+# frozen CALIBRATION_CORPUS; bump MANIFEST_VERSION whenever they change.
+CLASS_WEIGHTS = {
+    "prose": {
+        "bytes": 0.5952, "letters": -0.4494, "letter_runs": 0.3741, "digits": -0.1802,
+        "digit_runs": -0.2362, "space_runs": -0.3096, "newlines": 0.2452, "punct": -0.0192,
+        "punct_runs": 0.1999, "multibyte2": 0.3139, "multibyte3": -0.0576,
+    },
+    "code": {
+        "bytes": 0.9703, "letters": -0.7945, "letter_runs": 0.1112, "digits": 0.0294,
+        "digit_runs": 0.0379, "space_runs": -0.7027, "newlines": -0.078, "punct": -0.3177,
+        "punct_runs": 0.2558, "multibyte2": -0.0007, "multibyte3": -0.0638,
+    },
+}
+
+# Files of the frozen reference corpus that CLASS_WEIGHTS are fitted on:
+# snapshots of the skill's docs and scripts (stored as .txt so they are not
+# mistaken for source) plus multilingual prose. The corpus is not shipped
+# with the skill; in a checkout it is tests/data/calibration.
+CALIBRATION_CORPUS = (
+    "SKILL.md",
+    "templates.md",
+    "multilingual.md",
+    "detect-repo-type.py.txt",
+    "estimate-tokens.py.txt",
+    "generate-memory-update.py.txt",
+)
+
+
+def byte_class_histogram(data: bytes) -> dict[str, int]:
+    """Return the CLASS_FEATURES counts for ``data`` without a Python-level byte loop."""
+    mapped = data.translate(_CLASS_TABLE)
+    hist = {
+        "bytes": len(data),
+        "letters": mapped.count(b"a"),
+        "digits": mapped.count(b"0"),
+        "newlines": mapped.count(b"n"),
+        "punct": mapped.count(b"."),
+        "multibyte2": mapped.count(b"2"),
+        "multibyte3": mapped.count(b"3"),
+    }
+    for name, table in _RUN_TABLES.items():
+        mask = mapped.translate(table)
+        hist[name] = mask.count(b"01") + mask.startswith(b"1")
+    return hist
+
+
+def _split_fenced(data: bytes, inside: int = 0) -> tuple[list[bytes], list[bytes], int]:
+    """Split markdown bytes into (prose parts, fenced code parts, inside) at fence lines.
+
+    ``inside`` is 1 if ``data`` starts (or, in the result, ends) within a
+    fenced block, so a file can be split piece by piece.
+    """
+    prose, code = [], []
+    regions = (prose, code)
+    start = 0
+    for m in _FENCE_BYTES.finditer(data):
+        regions[inside].append(data[start:m.start()])
+        # The fence lines themselves count as prose
+        prose.append(m.group())
+        start = m.end()
+        inside ^= 1
+    regions[inside].append(data[start:])
+    return prose, code, inside
+
+
+def _score(hist: dict[str, int], weights: dict[str, float]) -> float:
+    return sum(weights[f] * hist[f] for f in CLASS_FEATURES)
+
+
+def _classes_score(text: str, inside: int = 0) -> tuple[float, int]:
+    """Return the unrounded "classes" score of ``text`` and the fence state it ends in."""
+    prose, code, inside = _split_fenced(text.encode("utf-8", errors="surrogatepass"), inside)
+    total = _score(byte_class_histogram(b"".join(prose)), CLASS_WEIGHTS["prose"])
+    if code:
+        total += _score(byte_class_histogram(b"".join(code)), CLASS_WEIGHTS["code"])
+    return total, inside
+
+
+def _classes_engine(text: str) -> int:
+    return max(0, round(_classes_score(text)[0]))
+
+
+def _solve(matrix: list[list[float]], rhs: list[float]) -> list[float]:
+    """Solve a small dense linear system by Gaussian elimination with partial pivoting."""
+    n = len(rhs)
+    a = [row[:] + [rhs[i]] for i, row in enumerate(matrix)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(a[r][col]))
+        a[col], a[pivot] = a[pivot], a[col]
+        for r in range(col + 1, n):
+            factor = a[r][col] / a[col][col]
+            for c in range(col, n + 1):
+                a[r][c] -= factor * a[col][c]
+    x = [0.0] * n
+    for r in range(n - 1, -1, -1):
+        x[r] = (a[r][n] - sum(a[r][c] * x[c] for c in range(r + 1, n))) / a[r][r]
+    return x
+
+
+def fit_class_weights(
+    samples: list[tuple[str, bytes]],
+    reference: str = "bpe",
+    ridge: float = 1e-3,
+) -> dict[str, float]:
+    """Fit feature weights so the weighted histogram matches ``reference`` counts.
+
+    ``samples`` are ``(text, region bytes)`` pairs: the text is counted with
+    the reference engine and the bytes supply the features. Least squares
+    with a ridge penalty pulling every weight toward the bytes/4 rule, so
+    features the corpus barely exercises stay near that fallback.
+    """
+    prior = [0.25 if f == "bytes" else 0.0 for f in CLASS_FEATURES]
+    rows = [[float(byte_class_histogram(data)[f]) for f in CLASS_FEATURES] for _, data in samples]
+    targets = [float(estimate_tokens(text, reference)) for text, _ in samples]
+    n = len(CLASS_FEATURES)
+    gram = [[sum(row[i] * row[j] for row in rows) for j in range(n)] for i in range(n)]
+    lam = ridge * sum(gram[i][i] for i in range(n)) / n
+    rhs = [sum(row[i] * y for row, y in zip(rows, targets)) + lam * prior[i] for i in range(n)]
+    for i in range(n):
+        gram[i][i] += lam
+    return dict(zip(CLASS_FEATURES, (round(w, 4) for w in _solve(gram, rhs))))
+
+
+def calibration_samples(corpus_dir: Path, chunk_bytes: int = 1024) -> dict[str, list]:
+    """Cut the CALIBRATION_CORPUS files in ``corpus_dir`` into samples.
+
+    Samples are ~``chunk_bytes`` and line-aligned. Markdown prose and fenced
+    code go to "prose" and "code"; the script snapshots are code throughout.
+    """
+    samples: dict[str, list] = {"prose": [], "code": []}
+    for rel in CALIBRATION_CORPUS:
+        data = (corpus_dir / rel).read_bytes()
+        if rel.endswith(".md"):
+            prose, code, _ = _split_fenced(data)
+            parts = [("prose", p) for p in prose] + [("code", c) for c in code]
+        else:
+            parts = [("code", data)]
+        for region, part in parts:
+            chunk = b""
+            for line in part.splitlines(keepends=True):
+                chunk += line
+                if len(chunk) >= chunk_bytes:
+                    samples[region].append((chunk.decode("utf-8", errors="replace"), chunk))
+                    chunk = b""
+            if chunk.strip():
+                samples[region].append((chunk.decode("utf-8", errors="replace"), chunk))
+    return samples
+
+
+# Tokenizer engines by name. "bytes" is the fast default; callers may register
+# their own ``text -> token count`` function here.
+ENGINES: dict[str, Callable[[str], int]] = {
+    "bytes": _bytes_engine,
+    "bpe": _bpe_engine,
+    "classes": _classes_engine,
+}
+
+# Engines too cheap to be worth hashing the content for
+_UNCACHED_ENGINES = {"bytes"}
+
+
+def estimate_tokens(text: str, engine: str = "bytes") -> int:
+    """Return the token count of ``text`` under ``engine`` (see ENGINES).
+
+    The default "bytes" engine converts UTF-8 byte length to an approximate
+    count (4 bytes/token). Other engines cache counts by content hash.
+    """
+    try:
+        count = ENGINES[engine]
+    except KeyError:
+        raise ValueError(f"unknown tokenizer engine: {engine!r}") from None
+    if engine in _UNCACHED_ENGINES:
+        return count(text)
+    key = (engine, hashlib.sha256(text.encode("utf-8", errors="surrogatepass")).hexdigest())
+    tokens = _COUNT_CACHE.get(key)
+    if tokens is None:
+        if len(_COUNT_CACHE) >= _MAX_COUNT_CACHE:
+            _COUNT_CACHE.clear()
+        tokens = _COUNT_CACHE[key] = count(text)
+    return tokens
+
+
+def _split_point(text: str) -> int:
+    """Return where ``text`` can be cut without changing its pre-tokenization.
+
+    The cut goes at the start of the last whitespace run that contains a
+    newline and is followed by more text, so the tail begins a fresh run
+    exactly as it would in the whole file. Returns 0 if there is no such run.
+    """
+    end = len(text)
+    while True:
+        i = text.rfind("\n", 0, end)
+        if i < 0:
+            return 0
+        j = i
+        while j > 0 and text[j - 1].isspace():
+            j -= 1
+        k = i + 1
+        while k < len(text) and text[k].isspace():
+            k += 1
+        if k < len(text):
+            return j
+        end = j
+
+
+def _stream_count(fh, size: int, engine: str) -> int:
+    """Count tokens in a large file chunk by chunk through mmap, in constant memory.
+
+    Chunks are decoded incrementally, so multi-byte UTF-8 sequences split
+    across chunks decode intact, and each decoded chunk is counted up to its
+    last safe split point (see _split_point); the rest carries into the next.
+    The stock "classes" engine also carries whether a chunk ends inside a
+    fenced block, and rounds once at the end, so its count matches the
+    whole-file one.
+    """
+    count = ENGINES[engine]
+    classes = count is _classes_engine
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    tokens = 0
+    score = 0.0
+    inside = 0
+    carry = ""
+
+    def add(text: str) -> None:
+        nonlocal tokens, score, inside
+        if classes:
+            part, inside = _classes_score(text, inside)
+            score += part
+        else:
+            tokens += count(text)
+
+    with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for offset in range(0, size, _STREAM_CHUNK_BYTES):
+            text = carry + decoder.decode(mm[offset:offset + _STREAM_CHUNK_BYTES])
+            cut = _split_point(text)
+            if cut == 0 and len(text) > 4 * _STREAM_CHUNK_BYTES:
+                # One enormous line: count it rather than grow without bound
+                cut = len(text)
+            add(text[:cut])
+            carry = text[cut:]
+    add(carry + decoder.decode(b"", final=True))
+    return max(0, round(score)) if classes else tokens
+
+
+def _count_open(fh, size: int, engine: str) -> int:
+    """Count tokens in an open binary file of ``size`` bytes (see count_file_tokens)."""
+    if engine == "bytes":
+        return size // 4
+    if size > _MAX_FILE_BYTES:
+        return _stream_count(fh, size, engine)
+    return estimate_tokens(fh.read().decode("utf-8", errors="replace"), engine)
+
+
+def _count_path(filepath: Path, engine: str) -> tuple[int, int]:
+    """Return ``(tokens, bytes read)`` for a file (see count_file_tokens)."""
+    if engine not in ENGINES:
+        raise ValueError(f"unknown tokenizer engine: {engine!r}")
+    with open(filepath, "rb") as fh:
+        size = os.fstat(fh.fileno()).st_size
+        return _count_open(fh, size, engine), 0 if engine == "bytes" else size
+
+
+def count_file_tokens(filepath: Path, engine: str = "bytes") -> int:
+    """Return the token count of a file under ``engine``.
+
+    The "bytes" engine works from the file size alone, with no read or
+    decode. Other engines read and decode files up to ``_MAX_FILE_BYTES``
+    whole (with the content-hash cache) and stream larger ones. Raises
+    OSError if the file cannot be opened.
+    """
+    return _count_path(filepath, engine)[0]
+
+
+def _engine_stamp(engine: str) -> str:
+    """Identify the counter behind ``engine`` so that swapping the merges file invalidates counts."""
+    if engine != "bpe":
+        return engine
+    try:
+        st = os.stat(BPE_MERGES_PATH)
+    except OSError:
+        return "bpe:missing"
+    return f"bpe:{BPE_MERGES_PATH}:{st.st_size}:{st.st_mtime_ns}"
+
+
+def _valid_entry(entry) -> bool:
+    return (
+        isinstance(entry, dict)
+        and isinstance(entry.get("tokens"), int)
+        and isinstance(entry.get("sha256"), str)
+    )
+
+
+class TokenManifest:
+    """Token counts from earlier runs, stored in ``.claude/cache/tokens.json``.
+
+    Entries are keyed by path relative to the root and record size,
+    mtime_ns, content sha256 and token count. A file whose size and mtime
+    match is not read at all; one whose stat changed but whose hash did not
+    (a touch, a checkout) is hashed but not recounted. ``save`` keeps only
+    the files counted in this run.
+    """
+
+    def __init__(self, root: Path, engine: str):
+        self.root = root
+        self.engine = engine
+        self.reused = 0
+        self._stamp = _engine_stamp(engine)
+        self._old: dict[str, dict] = {}
+        self._new: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        try:
+            data = json.loads((root / MANIFEST_PATH).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if (
+            isinstance(data, dict)
+            and data.get("version") == MANIFEST_VERSION
+            and data.get("engine") == self._stamp
+            and isinstance(data.get("files"), dict)
+        ):
+            self._old = data["files"]
+
+    def count(self, filepath: Path) -> int:
+        """Return the token count of ``filepath``, reusing the manifest where possible.
+
+        Safe to call from several threads at once.
+        """
+        return self.lookup(filepath)[0]
+
+    def lookup(self, filepath: Path) -> tuple[int, int, bool]:
+        """Like count, but return ``(tokens, bytes read, reused from the manifest)``."""
+        try:
+            rel = filepath.relative_to(self.root).as_posix()
+        except ValueError:
+            rel = str(filepath)
+        entry = self._old.get(rel)
+        if not _valid_entry(entry):
+            entry = None
+        reused = False
+        nbytes = 0
+        with open(filepath, "rb") as fh:
+            st = os.fstat(fh.fileno())
+            if entry and entry.get("size") == st.st_size and entry.get("mtime_ns") == st.st_mtime_ns:
+                digest, tokens = entry["sha256"], entry["tokens"]
+                reused = True
+            else:
+                nbytes = st.st_size
+                sha = hashlib.sha256()
+                for block in iter(lambda: fh.read(_STREAM_CHUNK_BYTES), b""):
+                    sha.update(block)
+                digest = sha.hexdigest()
+                if entry and entry["sha256"] == digest:
+                    tokens = entry["tokens"]
+                    reused = True
+                else:
+                    fh.seek(0)
+                    tokens = _count_open(fh, st.st_size, self.engine)
+                    nbytes += st.st_size
+        # A freshly written file could change again within the same mtime
+        # tick; leave its mtime out so the next run checks the hash instead.
+        settled = time.time_ns() - st.st_mtime_ns >= _RACY_WINDOW_NS
+        with self._lock:
+            self.reused += reused
+            self._new[rel] = {
+                "size": st.st_size,
+                "mtime_ns": st.st_mtime_ns if settled else None,
+                "sha256": digest,
+                "tokens": tokens,
+            }
+        return tokens, nbytes, reused
+
+    def save(self) -> None:
+        """Write the manifest if anything changed since it was loaded."""
+        if self._new == self._old:
+            return
+        manifest_file = self.root / MANIFEST_PATH
+        try:
+            manifest_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp = manifest_file.with_suffix(".tmp")
+            payload = {"version": MANIFEST_VERSION, "engine": self._stamp, "files": self._new}
+            tmp.write_text(json.dumps(payload, indent=1, sort_keys=True), encoding="utf-8")
+            os.replace(tmp, manifest_file)
+        except OSError as exc:
+            print(f"WARNING: Could not write token manifest {manifest_file}: {exc}", file=sys.stderr)
+
+
+def check_file(
+    filepath: Path,
+    engine: str = "bytes",
+    manifest: TokenManifest | None = None,
+    budget_key: str | None = None,
+    sections: bool = False,
+    profile: bool = False,
+) -> dict:
+    """Check a memory file's token count against its budget.
+
+    The budget is looked up in BUDGETS under ``budget_key`` (the path
+    relative to .claude/memory/), defaulting to the file name. With
+    ``sections=True`` the result also carries ``sections`` (see
+    scan_sections).
+
+    With ``profile=True`` it also carries ``io``: ``bytes_read`` (0 when
+    the count came from the file size or an unchanged manifest entry),
+    ``read_ms`` (time spent opening, reading and counting) and ``cache``
+    ("hit", "miss", or None without a manifest).
+    """
     if not filepath.exists():
         return {"exists": False}
-    budget = BUDGETS.get(filepath.name, MEMORY_DEFAULT_BUDGET)
+    budget = BUDGETS.get(budget_key or filepath.name, MEMORY_DEFAULT_BUDGET)
+    start = time.perf_counter()
+    cache = None
+    nbytes = 0
     try:
-        file_size = filepath.stat().st_size
+        if manifest is not None:
+            tokens, nbytes, reused = manifest.lookup(filepath)
+            cache = "hit" if reused else "miss"
+        else:
+            tokens, nbytes = _count_path(filepath, engine)
+        breakdown = None
+        if sections:
+            breakdown = file_sections(filepath, engine)
+            nbytes += filepath.stat().st_size
     except OSError as exc:
-        return {
+        info = {
             "exists": True,
-            "error": f"could not stat file: {exc}",
+            "error": f"could not read file: {exc}",
             "tokens": 0,
             "budget": budget,
             "over": True,
             "pct": None,
         }
-    if file_size > _MAX_FILE_BYTES:
-        return {
+    else:
+        info = {
             "exists": True,
-            "error": "file too large to check",
-            "tokens": 0,
+            "tokens": tokens,
             "budget": budget,
-            "over": True,
-            "pct": None,
+            "over": tokens > budget,
+            "pct": round(tokens / budget * 100, 1),
         }
-    try:
-        content = filepath.read_text(encoding="utf-8", errors="replace")
-    except OSError as exc:
-        return {
-            "exists": True,
-            "error": f"could not read file: {exc}",
-            "tokens": 0,
-            "budget": budget,
-            "over": True,
-            "pct": None,
+        if breakdown is not None:
+            info["sections"] = breakdown
+    if profile:
+        info["io"] = {
+            "bytes_read": nbytes,
+            "read_ms": round((time.perf_counter() - start) * 1000, 3),
+            "cache": cache,
         }
-    tokens = estimate_tokens(content)
-    return {
-        "exists": True,
-        "tokens": tokens,
-        "budget": budget,
-        "over": tokens > budget,
-        "pct": round(tokens / budget * 100, 1),
-    }
+    return info
+
+
+def scan_sections(lines, engine: str = "bytes") -> list[dict]:
+    """Return per-section token counts for markdown ``lines``, largest first.
+
+    One pass over the lines (any iterable, such as an open text file). Each
+    ATX heading starts a section that runs to the next heading of any level;
+    text before the first heading is a level-0 section with an empty title.
+    Fenced code blocks are counted as their own ``kind: "code"`` entries
+    (titled after the enclosing heading, with the fence's ``lang``) and are
+    left out of their section's count. Headings inside fences are ignored.
+    Entries are ``{kind, title, level, line, tokens}``, sorted by tokens
+    descending and then by line.
+    """
+    sections: list[dict] = []
+    title, level, start = "", 0, 1
+    prose: list[str] = []
+    fence = None
+    code: list[str] = []
+    code_start = 0
+    lang = ""
+
+    def close_section() -> None:
+        if prose or level:
+            sections.append({
+                "kind": "section",
+                "title": title,
+                "level": level,
+                "line": start,
+                "tokens": estimate_tokens("".join(prose), engine),
+            })
+
+    def close_code() -> None:
+        sections.append({
+            "kind": "code",
+            "title": title,
+            "level": level,
+            "line": code_start,
+            "lang": lang,
+            "tokens": estimate_tokens("".join(code), engine),
+        })
+
+    for lineno, line in enumerate(lines, 1):
+        if fence is not None:
+            code.append(line)
+            m = _FENCE.match(line)
+            if m and m.group(1)[0] == fence[0] and len(m.group(1)) >= len(fence) and not line.strip(" \t\r\n`~"):
+                close_code()
+                fence = None
+            continue
+        m = _FENCE.match(line)
+        if m:
+            fence, lang = m.group(1), m.group(2)
+            code, code_start = [line], lineno
+            continue
+        m = _HEADING.match(line.rstrip("\r\n"))
+        if m:
+            close_section()
+            title, level, start = (m.group(2) or "").strip(), len(m.group(1)), lineno
+            prose = [line]
+            continue
+        prose.append(line)
+    if fence is not None:
+        close_code()
+    close_section()
+    sections.sort(key=lambda e: (-e["tokens"], e["line"]))
+    return sections
+
+
+def file_sections(filepath: Path, engine: str = "bytes") -> list[dict]:
+    """Run scan_sections over a file, streaming its lines. Raises OSError if unreadable."""
+    with open(filepath, encoding="utf-8", errors="replace", newline="") as fh:
+        return scan_sections(fh, engine)
+
+
+def _memory_files(memory: Path) -> list[tuple[str, Path]]:
+    """Return ``(path relative to memory/, path)`` for every *.md under ``memory``, sorted."""
+    found = []
+    for f in memory.rglob("*.md"):
+        if f.is_file():
+            found.append((f.relative_to(memory).as_posix(), f))
+    return sorted(found)
+
 
+def _file_error(name: str, info: dict) -> str | None:
+    """Return the validation error for one file's check_file result, if any."""
+    if not info.get("over"):
+        return None
+    if info.get("error"):
+        return f"{name}: {info['error']}"
+    return f"{name}: {info['tokens']} > {info['budget']}"
 
-def validate(root: str = ".") -> dict:
+
+def _l2_error(memory_total: int) -> str:
+    return f"L2 total: {memory_total} > {L2_TOTAL_BUDGET} aggregate budget"
+
+
+def validate(
+    root: str = ".",
+    engine: str = "bytes",
+    use_cache: bool = False,
+    workers: int | None = None,
+    sections: bool = False,
+    profile: bool = False,
+) -> dict:
+    """Check CLAUDE.md and .claude/memory/**/*.md against their budgets and the L2 aggregate.
+
+    Memory files are found recursively and read on a thread pool of up to
+    ``workers`` threads (default MAX_READ_WORKERS); ``files`` and ``errors``
+    are reported in sorted path order whatever order the reads finish in.
+
+    With ``use_cache=True`` counts are reused from and saved to the token
+    manifest (see TokenManifest). The "bytes" engine never uses it: its
+    count comes from the file size, which is cheaper than any lookup.
+
+    With ``sections=True`` every file's entry carries a per-section
+    breakdown, largest first (see scan_sections).
+
+    With ``profile=True`` every file's entry carries ``io`` (see
+    check_file) and the result gains ``profile``: ``wall_ms`` for the whole
+    call, the summed ``read_ms`` and ``bytes_read`` and the manifest
+    ``cache_hits`` / ``cache_misses``.
+    """
+    start = time.perf_counter()
     path = Path(root)
-    result = {"valid": True, "files": {}, "total": 0, "errors": []}
+    result = {"valid": True, "files": {}, "total": 0, "errors": [], "engine": engine}
+    manifest = TokenManifest(path, engine) if use_cache and engine not in _UNCACHED_ENGINES else None
 
     # Check CLAUDE.md
     claude_md = path / "CLAUDE.md"
     if claude_md.exists():
-        info = check_file(claude_md)
+        info = check_file(claude_md, engine, manifest, "CLAUDE.md", sections, profile)
         result["files"]["CLAUDE.md"] = info
         result["total"] += info.get("tokens", 0)
-        if info.get("over"):
-            if info.get("error"):
-                result["errors"].append(f"CLAUDE.md: {info['error']}")
-            else:
-                result["errors"].append(
-                    f"CLAUDE.md: {info['tokens']} > {info['budget']}"
-                )
+        error = _file_error("CLAUDE.md", info)
+        if error:
+            result["errors"].append(error)
             result["valid"] = False
 
     # Check memory files — budget violations are enforced here too
     memory = path / ".claude" / "memory"
     if memory.exists():
         memory_total = 0
-        for f in memory.glob("*.md"):
-            info = check_file(f)
-            result["files"][f"memory/{f.name}"] = info
+        files = _memory_files(memory)
+
+        def check(item: tuple[str, Path]) -> dict:
+            return check_file(item[1], engine, manifest, item[0], sections, profile)
+
+        pool_size = min(workers or MAX_READ_WORKERS, len(files))
+        if pool_size > 1:
+            with ThreadPoolExecutor(max_workers=pool_size) as pool:
+                infos = list(pool.map(check, files))
+        else:
+            infos = [check(item) for item in files]
+        for (rel, _), info in zip(files, infos):
+            name = f"memory/{rel}"
+            result["files"][name] = info
             file_tokens = info.get("tokens", 0)
             result["total"] += file_tokens
             memory_total += file_tokens
-            if info.get("over"):
-                if info.get("error"):
-                    result["errors"].append(f"memory/{f.name}: {info['error']}")
-                else:
-                    result["errors"].append(
-                        f"memory/{f.name}: {info['tokens']} > {info['budget']}"
-                    )
+            error = _file_error(name, info)
+            if error:
+                result["errors"].append(error)
                 result["valid"] = False
         # Enforce aggregate L2 budget
         if memory_total > L2_TOTAL_BUDGET:
-            result["errors"].append(
-                f"L2 total: {memory_total} > {L2_TOTAL_BUDGET} aggregate budget"
-            )
+            result["errors"].append(_l2_error(memory_total))
             result["valid"] = False
 
+    if manifest is not None:
+        manifest.save()
+    if profile:
+        io = [info["io"] for info in result["files"].values() if "io" in info]
+        result["profile"] = {
+            "wall_ms": round((time.perf_counter() - start) * 1000, 3),
+            "read_ms": round(sum(i["read_ms"] for i in io), 3),
+            "bytes_read": sum(i["bytes_read"] for i in io),
+            "files": len(io),
+            "cache_hits": sum(i["cache"] == "hit" for i in io),
+            "cache_misses": sum(i["cache"] == "miss" for i in io),
+        }
     return result
 
 
-if __name__ == "__main__":
-    root_path = Path(sys.argv[1] if len(sys.argv) > 1 else ".").resolve()
-    if not root_path.is_dir():
-        print(f"ERROR: '{root_path}' is not a valid directory", file=sys.stderr)
-        sys.exit(1)
-    r = validate(str(root_path))
+def _split_blocks(lines: list[str]) -> list[dict]:
+    """Split CLAUDE.md into blocks: the head, ``##`` sections and USER regions.
+
+    The head (everything before the first level-2 heading) and USER regions
+    are never movable. Deeper headings stay inside their ``##`` section and
+    headings inside fenced code are ignored.
+    """
+    blocks = [{"title": None, "lines": [], "movable": False}]
+    fence = None
+    in_user = False
+    for line in lines:
+        if in_user:
+            blocks[-1]["lines"].append(line)
+            if _USER_END.match(line):
+                in_user = False
+                blocks.append({"title": None, "lines": [], "movable": False})
+            continue
+        if fence is not None:
+            m = _FENCE.match(line)
+            if m and m.group(1)[0] == fence[0] and len(m.group(1)) >= len(fence) and not line.strip(" \t\r\n`~"):
+                fence = None
+            blocks[-1]["lines"].append(line)
+            continue
+        m = _FENCE.match(line)
+        if m:
+            fence = m.group(1)
+        elif _USER_START.match(line):
+            in_user = True
+            blocks.append({"title": None, "lines": [line], "movable": False})
+            continue
+        else:
+            m = _HEADING.match(line.rstrip("\r\n"))
+            if m and len(m.group(1)) == 2:
+                title = (m.group(2) or "").strip()
+                blocks.append({"title": title, "lines": [line], "movable": title.lower() not in _PINNED_SECTIONS})
+                continue
+        blocks[-1]["lines"].append(line)
+    return [b for b in blocks if b["lines"]]
+
+
+def _l2_target(title: str) -> str:
+    lowered = title.lower()
+    for target, pattern in _L2_ROUTES:
+        if pattern.search(lowered):
+            return target
+    return _L2_DEFAULT
+
+
+def _insert_section(target_text: str, section: str, target: str) -> str:
+    """Add ``section`` to an L2 file's text, above its USER marker if it has one."""
+    if not target_text:
+        return f"# {_L2_TITLES.get(target, target)}\n\n{section}\n<!-- USER -->\n"
+    lines = target_text.splitlines(keepends=True)
+    at = next((i for i, line in enumerate(lines) if _USER_START.match(line)), len(lines))
+    before = "".join(lines[:at])
+    if before and not before.endswith("\n"):
+        before += "\n"
+    if before and not before.endswith("\n\n"):
+        before += "\n"
+    return before + section + ("\n" if at < len(lines) else "") + "".join(lines[at:])
+
+
+def _write_atomic(filepath: Path, text: str) -> None:
+    tmp = filepath.with_name(filepath.name + ".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, filepath)
+
+
+def compact_claude_md(root: str = ".", engine: str = "bytes") -> dict:
+    """Move low-priority sections of an over-budget CLAUDE.md into L2 files, in one pass.
+
+    Movable ``##`` sections are tried in order: ordinary sections before
+    core ones (_CORE_SECTIONS), largest first within each group, until
+    CLAUDE.md fits its budget. Each goes to the L2 file its heading routes
+    to (_L2_ROUTES), inserted above that file's USER marker, and only if
+    the file stays within its own budget and the L2 aggregate stays within
+    L2_TOTAL_BUDGET; otherwise it is skipped. The head of CLAUDE.md,
+    pinned sections and USER regions never move.
+
+    Returns ``{"fixed", "tokens_before", "tokens_after", "moved", "skipped"}``
+    where ``moved`` lists ``{"title", "tokens", "to"}`` and ``skipped``
+    lists ``{"title", "tokens", "reason"}``. Files are only written if
+    something moved.
+    """
+    path = Path(root)
+    claude_md = path / "CLAUDE.md"
+    budget = BUDGETS["CLAUDE.md"]
+    report = {"fixed": True, "tokens_before": 0, "tokens_after": 0, "moved": [], "skipped": []}
+    if not claude_md.is_file():
+        return report
+    text = claude_md.read_text(encoding="utf-8", errors="replace")
+    tokens = estimate_tokens(text, engine)
+    report["tokens_before"] = report["tokens_after"] = tokens
+    if tokens <= budget:
+        return report
+
+    memory = path / ".claude" / "memory"
+    current = validate(root, engine)
+    l2_total = sum(info.get("tokens", 0) for name, info in current["files"].items() if name.startswith("memory/"))
+    targets: dict[str, str] = {}
+
+    blocks = _split_blocks(text.splitlines(keepends=True))
+    candidates = [i for i, b in enumerate(blocks) if b["movable"]]
+    for i in candidates:
+        blocks[i]["tokens"] = estimate_tokens("".join(blocks[i]["lines"]), engine)
+    candidates.sort(key=lambda i: (blocks[i]["title"].lower() in _CORE_SECTIONS, -blocks[i]["tokens"], i))
+
+    kept = [True] * len(blocks)
+    for i in candidates:
+        if tokens <= budget:
+            break
+        block = blocks[i]
+        target = _l2_target(block["title"])
+        if target not in targets:
+            try:
+                targets[target] = (memory / target).read_text(encoding="utf-8")
+            except FileNotFoundError:
+                targets[target] = ""
+        section = "".join(block["lines"]).rstrip("\n") + "\n"
+        new_target = _insert_section(targets[target], section, target)
+        old_target_tokens = estimate_tokens(targets[target], engine)
+        new_target_tokens = estimate_tokens(new_target, engine)
+        entry = {"title": block["title"], "tokens": block["tokens"]}
+        if new_target_tokens > BUDGETS.get(target, MEMORY_DEFAULT_BUDGET):
+            report["skipped"].append({**entry, "reason": f"{target} would exceed its budget"})
+            continue
+        if l2_total - old_target_tokens + new_target_tokens > L2_TOTAL_BUDGET:
+            report["skipped"].append({**entry, "reason": "L2 total would exceed its aggregate budget"})
+            continue
+        targets[target] = new_target
+        l2_total += new_target_tokens - old_target_tokens
+        kept[i] = False
+        tokens = estimate_tokens("".join(line for j, b in enumerate(blocks) if kept[j] for line in b["lines"]), engine)
+        report["moved"].append({**entry, "to": f"memory/{target}"})
+
+    report["tokens_after"] = tokens
+    report["fixed"] = tokens <= budget
+    if report["moved"]:
+        memory.mkdir(parents=True, exist_ok=True)
+        for target in {m["to"].split("/", 1)[1] for m in report["moved"]}:
+            _write_atomic(memory / target, targets[target])
+        _write_atomic(claude_md, "".join(line for j, b in enumerate(blocks) if kept[j] for line in b["lines"]))
+    return report
+
+
+def _track_name(root: Path, path: Path) -> str | None:
+    """Map a path to its validate() name ("CLAUDE.md" or "memory/<rel>"), or None."""
+    try:
+        rel = path.relative_to(root).as_posix()
+    except ValueError:
+        return None
+    if rel == "CLAUDE.md":
+        return rel
+    if rel == ".claude/memory" or rel.startswith(".claude/memory/"):
+        return "memory" + rel[len(".claude/memory"):]
+    if rel in (".", ".claude"):
+        return rel
+    return None
+
+
+class BudgetWatcher:
+    """Validation state for --watch, updated one changed file at a time.
+
+    ``update(names)`` re-counts only the named files (directory names expand
+    to the files under them) and adjusts the running totals by the
+    difference, so the L2 aggregate is never re-summed; ``result()`` has the
+    same shape as validate().
+    """
+
+    def __init__(self, root: str = ".", engine: str = "bytes", use_cache: bool = False):
+        self.root = Path(root)
+        self.engine = engine
+        initial = validate(root, engine, use_cache)
+        self.files: dict[str, dict] = dict(initial["files"])
+        self.total = initial["total"]
+        self.memory_total = sum(info.get("tokens", 0) for name, info in self.files.items() if name != "CLAUDE.md")
+
+    def _path(self, name: str) -> Path:
+        if name == "CLAUDE.md":
+            return self.root / name
+        return self.root / ".claude" / name
+
+    def _expand(self, names) -> set[str]:
+        """Resolve changed names to file names, including every file under a changed directory.
+
+        "." (an overflowed event queue) and ".claude" mean "check everything".
+        """
+        out = set()
+        for name in names:
+            if name in (".", ".claude"):
+                out.add("CLAUDE.md")
+                name = "memory"
+            if name == "CLAUDE.md" or name.endswith(".md"):
+                out.add(name)
+            prefix = name + "/"
+            out.update(n for n in self.files if n.startswith(prefix))
+            directory = self._path(name)
+            if name.startswith("memory") and directory.is_dir():
+                out.update(f"{name}/{rel}" for rel, _ in _memory_files(directory))
+        return out
+
+    def update(self, names) -> list[str]:
+        """Re-count the named files and return the tracked names that changed, sorted."""
+        changed = []
+        for name in sorted(self._expand(names)):
+            path = self._path(name)
+            old = self.files.pop(name, None)
+            new = None
+            if path.is_file():
+                budget_key = name if name == "CLAUDE.md" else name[len("memory/"):]
+                new = check_file(path, self.engine, None, budget_key)
+                self.files[name] = new
+            if old == new:
+                continue
+            delta = (new or {}).get("tokens", 0) - (old or {}).get("tokens", 0)
+            self.total += delta
+            if name != "CLAUDE.md":
+                self.memory_total += delta
+            changed.append(name)
+        return changed
+
+    def result(self) -> dict:
+        result = {"valid": True, "files": {}, "total": self.total, "errors": [], "engine": self.engine}
+        for name in sorted(self.files, key=lambda n: (n != "CLAUDE.md", n)):
+            info = self.files[name]
+            result["files"][name] = info
+            error = _file_error(name, info)
+            if error:
+                result["errors"].append(error)
+                result["valid"] = False
+        if self.memory_total > L2_TOTAL_BUDGET:
+            result["errors"].append(_l2_error(self.memory_total))
+            result["valid"] = False
+        return result
+
+
+class _PollSource:
+    """Change source that compares (size, mtime_ns) of the watched files every interval."""
+
+    def __init__(self, root: Path, interval: float = WATCH_POLL_INTERVAL):
+        self.root = root
+        self.interval = interval
+        self._last = self._snapshot()
+
+    def _snapshot(self) -> dict[str, tuple[int, int]]:
+        stamps = {}
+        paths = [self.root / "CLAUDE.md"]
+        memory = self.root / ".claude" / "memory"
+        if memory.is_dir():
+            paths.extend(f for _, f in _memory_files(memory))
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            stamps[_track_name(self.root, path)] = (st.st_size, st.st_mtime_ns)
+        return stamps
+
+    def wait(self, timeout: float | None) -> set[str]:
+        """Return the names that changed, sweeping until ``timeout`` (None: forever)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            current = self._snapshot()
+            changed = {n for n in current.keys() | self._last.keys() if current.get(n) != self._last.get(n)}
+            self._last = current
+            if changed:
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+            time.sleep(self.interval if deadline is None else min(self.interval, max(0.0, deadline - time.monotonic())))
+
+    def close(self) -> None:
+        pass
+
+
+class _InotifySource:
+    """Linux change source: inotify through ctypes on the root, .claude and the memory tree."""
+
+    _IN_MODIFY = 0x2
+    _IN_CLOSE_WRITE = 0x8
+    _IN_MOVED_FROM = 0x40
+    _IN_MOVED_TO = 0x80
+    _IN_CREATE = 0x100
+    _IN_DELETE = 0x200
+    _IN_Q_OVERFLOW = 0x4000
+    _IN_ISDIR = 0x40000000
+    _MASK = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+    _EVENT = struct.Struct("iIII")
+
+    def __init__(self, root: Path):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._add = libc.inotify_add_watch
+        self._add.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.root = root
+        self._dirs: dict[int, Path] = {}
+        self._watch_tree()
+
+    def _watch_tree(self) -> None:
+        """Watch every directory that can hold a tracked file (idempotent)."""
+        dirs = [self.root, self.root / ".claude"]
+        memory = self.root / ".claude" / "memory"
+        if memory.is_dir():
+            dirs.append(memory)
+            dirs.extend(p for p in memory.rglob("*") if p.is_dir())
+        for d in dirs:
+            wd = self._add(self.fd, os.fsencode(d), self._MASK)
+            if wd >= 0:
+                self._dirs[wd] = d
+
+    def _read(self) -> set[str]:
+        names = set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return names
+        offset = 0
+        rewatch = False
+        while offset + self._EVENT.size <= len(data):
+            wd, mask, _, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            raw = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & self._IN_Q_OVERFLOW:
+                names.add(".")
+                rewatch = True
+                continue
+            base = self._dirs.get(wd)
+            if base is None:
+                continue
+            name = _track_name(self.root, base / os.fsdecode(raw)) if raw else None
+            if name is not None:
+                names.add(name)
+            if mask & self._IN_ISDIR:
+                rewatch = True
+        if rewatch:
+            self._watch_tree()
+        return names
+
+    def wait(self, timeout: float | None) -> set[str]:
+        """Return the names that changed, waiting up to ``timeout`` seconds (None: forever)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            ready, _, _ = select.select([self.fd], [], [], remaining)
+            if ready:
+                names = self._read()
+                if names:
+                    return names
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def _change_source(root: Path, poll: bool = False):
+    """Return an inotify source where available, else the stat-polling fallback."""
+    if not poll and sys.platform.startswith("linux"):
+        try:
+            return _InotifySource(root)
+        except (OSError, AttributeError) as exc:
+            print(f"WARNING: inotify unavailable ({exc}); polling instead", file=sys.stderr)
+    return _PollSource(root)
+
+
+def watch(root: str = ".", engine: str = "bytes", on_change=None, poll: bool = False,
+          debounce: float = WATCH_DEBOUNCE, max_updates: int | None = None) -> None:
+    """Validate ``root`` and then re-validate whenever CLAUDE.md or a memory file changes.
+
+    ``on_change(result, changed)`` is called with the initial result (and an
+    empty ``changed`` list) and after each burst of writes, once nothing has
+    changed for ``debounce`` seconds. Only the changed files are re-counted
+    (see BudgetWatcher). Runs until interrupted, or for ``max_updates``
+    bursts.
+    """
+    watcher = BudgetWatcher(root, engine)
+    source = _change_source(Path(root), poll)
+    if on_change:
+        on_change(watcher.result(), [])
+    updates = 0
+    try:
+        while max_updates is None or updates < max_updates:
+            names = source.wait(None)
+            while True:
+                more = source.wait(debounce)
+                if not more:
+                    break
+                names |= more
+            changed = watcher.update(names)
+            if changed:
+                updates += 1
+                if on_change:
+                    on_change(watcher.result(), changed)
+    finally:
+        source.close()
+
+
+def _census_scan(dirpath: str, rel: str, ignore) -> tuple[list[tuple[str, int, str]], int, list[tuple]]:
+    """List one directory for the census.
+
+    Returns ``(files, binaries, subdirs)``: text files as ``(rel, size,
+    language)``, the number of binary files skipped, and the subdirectories
+    to walk next. Skipped and ignored directories are pruned as in
+    detect-repo-type.py.
+    """
+    detector = load_sibling("detect-repo-type")
+    try:
+        with os.scandir(dirpath) as it:
+            entries = list(it)
+    except OSError:
+        return [], 0, []
+    for entry in entries:
+        if entry.name in detector.IGNORE_FILES:
+            ignore = ignore.extend(rel, detector._read_ignore_file(entry.path))
+    files, subdirs = [], []
+    binaries = 0
+    for entry in entries:
+        child_rel = f"{rel}/{entry.name}" if rel else entry.name
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name not in detector._SKIP_DIRS and not ignore.is_ignored(child_rel, True):
+                    subdirs.append((entry.path, child_rel, ignore))
+                continue
+            if not entry.is_file(follow_symlinks=False) or ignore.is_ignored(child_rel, False):
+                continue
+            ext = os.path.splitext(entry.name)[1].lower()
+            language = LANGUAGES.get(ext)
+            if language is None:
+                if ext in _BINARY_EXTENSIONS:
+                    binaries += 1
+                    continue
+                with open(entry.path, "rb") as fh:
+                    if b"\0" in fh.read(_SNIFF_BYTES):
+                        binaries += 1
+                        continue
+                language = "Other"
+            files.append((child_rel, entry.stat(follow_symlinks=False).st_size, language))
+        except OSError:
+            continue
+    return files, binaries, subdirs
+
+
+def _sample_ratio(root: Path, files: list[tuple[str, int, str]], engine: str) -> tuple[float, int]:
+    """Measure tokens per byte for one language on up to CENSUS_SAMPLES_PER_LANGUAGE files.
+
+    Samples are spread evenly over the files ordered by size, so one huge
+    generated file does not set the ratio for the rest. Returns ``(ratio,
+    samples used)``; the bytes/4 rule if nothing could be read.
+    """
+    ordered = sorted((f for f in files if f[1] > 0), key=lambda f: (f[1], f[0]))
+    if not ordered:
+        return 0.25, 0
+    k = min(CENSUS_SAMPLES_PER_LANGUAGE, len(ordered))
+    picks = [ordered[(2 * i + 1) * len(ordered) // (2 * k)] for i in range(k)]
+    tokens = nbytes = used = 0
+    for rel, _, _ in picks:
+        try:
+            with open(root / rel, "rb") as fh:
+                data = fh.read(_MAX_SAMPLE_BYTES)
+        except OSError:
+            continue
+        tokens += estimate_tokens(data.decode("utf-8", errors="replace"), engine)
+        nbytes += len(data)
+        used += 1
+    return (tokens / nbytes if nbytes else 0.25), used
+
+
+def census(
+    root: str = ".",
+    engine: str = "classes",
+    depth: int = CENSUS_DEPTH,
+    workers: int | None = None,
+) -> dict:
+    """Estimate what reading the whole repository would cost, in tokens.
+
+    Walks the tree level by level on a thread pool, pruning ``_SKIP_DIRS``
+    and gitignored paths as detect-repo-type.py does and skipping binaries
+    (by extension, else by a NUL byte in the first ``_SNIFF_BYTES``). Each
+    file's tokens are its size times its language's tokens-per-byte ratio,
+    measured with ``engine`` on a few sample files (see _sample_ratio), so
+    only the samples are read.
+
+    Returns ``total`` and ``languages`` summaries, ``directories`` rolled
+    up to ``depth`` levels (deeper files count toward their ancestor at that
+    depth; "." is the whole tree), ``files`` sorted by tokens descending,
+    and ``skipped_binary``.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"unknown tokenizer engine: {engine!r}")
+    detector = load_sibling("detect-repo-type")
+    path = Path(root).resolve()
+    ignore = detector.IgnoreMatcher.for_root(path, detector.RepoSnapshot(path))
+    found: list[tuple[str, int, str]] = []
+    skipped = 0
+    level = [(str(path), "", ignore)]
+    with ThreadPoolExecutor(max_workers=workers or MAX_READ_WORKERS) as pool:
+        while level:
+            next_level = []
+            for files, binaries, subdirs in pool.map(lambda item: _census_scan(*item), level):
+                found.extend(files)
+                skipped += binaries
+                next_level.extend(subdirs)
+            level = sorted(next_level)
+
+        by_language: dict[str, list[tuple[str, int, str]]] = {}
+        for item in found:
+            by_language.setdefault(item[2], []).append(item)
+        names = sorted(by_language)
+        ratios = dict(zip(names, pool.map(lambda lang: _sample_ratio(path, by_language[lang], engine), names)))
+
+    languages = {}
+    for lang in names:
+        ratio, sampled = ratios[lang]
+        entries = by_language[lang]
+        languages[lang] = {
+            "files": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "tokens": sum(round(size * ratio) for _, size, _ in entries),
+            "ratio": round(ratio, 4),
+            "sampled": sampled,
+        }
+    files = sorted(
+        ({"path": rel, "language": lang, "bytes": size, "tokens": round(size * ratios[lang][0])}
+         for rel, size, lang in found),
+        key=lambda f: (-f["tokens"], f["path"]),
+    )
+    directories: dict[str, dict] = {}
+    for f in files:
+        parts = f["path"].split("/")[:-1]
+        for d in ["."] + ["/".join(parts[:i]) for i in range(1, min(len(parts), depth) + 1)]:
+            agg = directories.setdefault(d, {"files": 0, "bytes": 0, "tokens": 0})
+            agg["files"] += 1
+            agg["bytes"] += f["bytes"]
+            agg["tokens"] += f["tokens"]
+    total = directories.get(".", {"files": 0, "bytes": 0, "tokens": 0})
+    return {
+        "root": str(path),
+        "engine": engine,
+        "total": dict(total),
+        "languages": dict(sorted(languages.items(), key=lambda kv: (-kv[1]["tokens"], kv[0]))),
+        "directories": dict(sorted(directories.items())),
+        "files": files,
+        "skipped_binary": skipped,
+    }
+
+
+def _print_census(c: dict, top: int = 20) -> None:
+    total = c["total"]
+    print(f"Census: {total['files']} files, {total['bytes']} bytes, ~{total['tokens']} tokens "
+          f"(engine: {c['engine']}, {c['skipped_binary']} binary files skipped)")
+    print("By language:")
+    for lang, info in c["languages"].items():
+        print(f"  {lang}: {info['files']} files, ~{info['tokens']} tokens "
+              f"({info['ratio']} tokens/byte, {info['sampled']} sampled)")
+    print("By directory:")
+    children: dict[str, list[str]] = {}
+    for d in c["directories"]:
+        if d != ".":
+            children.setdefault(d.rpartition("/")[0] or ".", []).append(d)
+
+    def show(d: str, indent: int) -> None:
+        info = c["directories"][d]
+        label = d if d == "." else d.rpartition("/")[2] + "/"
+        print(f"  {'  ' * indent}{label}: ~{info['tokens']} tokens ({info['files']} files)")
+        for child in sorted(children.get(d, []), key=lambda x: (-c["directories"][x]["tokens"], x)):
+            show(child, indent + 1)
+
+    if c["directories"]:
+        show(".", 0)
+    print(f"Largest files (top {top}):")
+    for f in c["files"][:top]:
+        print(f"  ~{f['tokens']:>8}  {f['path']} ({f['language']})")
+
+
+def _print_report(r: dict) -> None:
     print(f"Valid: {r['valid']} | Total: {r['total']} tokens")
     for name, info in r["files"].items():
         s = "⚠️ OVER" if info.get("over") else "✓"
@@ -133,6 +1503,106 @@ if __name__ == "__main__":
         print(
             f"  {s} {name}: {info.get('tokens', 0)}/{info.get('budget', '?')} ({pct_str})"
         )
+        for sec in info.get("sections", [])[:_SECTIONS_SHOWN]:
+            heading = f"{'#' * sec['level']} {sec['title']}" if sec["level"] else "(before first heading)"
+            if sec["kind"] == "code":
+                heading = f"```{sec['lang']} block in {heading}"
+            print(f"      {sec['tokens']:>6}  {heading} (line {sec['line']})")
     for e in r["errors"]:
         print(f"❌ {e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("root", nargs="?", default=".", help="repository root (default: .)")
+    parser.add_argument(
+        "--engine",
+        choices=sorted(ENGINES),
+        default=None,
+        help="token counter: 'bytes' (4 bytes/token, default), 'classes' (calibrated byte-class histogram, "
+        "default for --census) or 'bpe' (bundled byte-level BPE)",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="ignore and do not update .claude/cache/tokens.json")
+    parser.add_argument(
+        "--sections",
+        action="store_true",
+        help=f"list each file's {_SECTIONS_SHOWN} largest sections and code blocks",
+    )
+    parser.add_argument(
+        "--fix",
+        action="store_true",
+        help="move low-priority sections of an over-budget CLAUDE.md into .claude/memory/ before validating",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="keep running and re-validate when CLAUDE.md or .claude/memory/ changes (Ctrl-C to stop)",
+    )
+    parser.add_argument(
+        "--census",
+        action="store_true",
+        help="estimate tokens for the whole source tree per language and directory instead of validating",
+    )
+    parser.add_argument(
+        "--depth",
+        type=int,
+        default=CENSUS_DEPTH,
+        help=f"--census directory rollup depth (default {CENSUS_DEPTH})",
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="print the result as JSON, with per-file bytes read, read time and cache hit/miss and run totals",
+    )
+    args = parser.parse_args()
+    root_path = Path(args.root).resolve()
+    if not root_path.is_dir():
+        print(f"ERROR: '{root_path}' is not a valid directory", file=sys.stderr)
+        sys.exit(1)
+    if args.census:
+        c = census(str(root_path), engine=args.engine or "classes", depth=args.depth)
+        if args.json:
+            print(json.dumps(c, indent=2))
+        else:
+            _print_census(c)
+        sys.exit(0)
+    args.engine = args.engine or "bytes"
+    if args.fix:
+        try:
+            fix = compact_claude_md(str(root_path), engine=args.engine)
+        except OSError as exc:
+            print(f"ERROR: could not compact CLAUDE.md: {exc}", file=sys.stderr)
+            sys.exit(1)
+        for m in [] if args.json else fix["moved"]:
+            print(f"Moved '## {m['title']}' ({m['tokens']} tokens) → {m['to']}")
+        for m in [] if args.json else fix["skipped"]:
+            print(f"Kept '## {m['title']}' ({m['tokens']} tokens): {m['reason']}")
+        if fix["moved"] and not args.json:
+            print(f"CLAUDE.md: {fix['tokens_before']} → {fix['tokens_after']} tokens")
+    if args.watch:
+
+        def report(result: dict, changed: list[str]) -> None:
+            if args.json:
+                # One line per update, so consumers can read the stream as JSONL
+                print(json.dumps(dict(result, changed=changed)))
+            else:
+                if changed:
+                    print(f"--- {time.strftime('%H:%M:%S')} changed: {', '.join(changed)}")
+                _print_report(result)
+            sys.stdout.flush()
+
+        try:
+            watch(str(root_path), engine=args.engine, on_change=report)
+        except KeyboardInterrupt:
+            pass
+        sys.exit(0)
+    r = validate(
+        str(root_path), engine=args.engine, use_cache=not args.no_cache, sections=args.sections, profile=args.json
+    )
+    if args.json:
+        if args.fix:
+            r["fix"] = fix
+        print(json.dumps(r, indent=2))
+    else:
+        _print_report(r)
     sys.exit(0 if r["valid"] else 1)
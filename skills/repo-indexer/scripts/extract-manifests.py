@@ -0,0 +1,578 @@
+#!/usr/bin/env python3
+"""Extract a ranked tech stack and key modules from a repository's manifests."""
+
+from __future__ import annotations
+
+import argparse
+import configparser
+import json
+import os
+import re
+import sys
+from pathlib import Path
+from typing import NamedTuple
+
+from _siblings import load_sibling
+
+try:
+    import tomllib
+except ModuleNotFoundError:  # Python < 3.11
+    tomllib = None
+
+# Manifests read from the repository root, in the order they are parsed
+MANIFESTS = ("pyproject.toml", "setup.cfg", "package.json", "Cargo.toml", "go.mod")
+# Root requirements files (requirements.txt, requirements-dev.txt, ...); a name
+# with a _DEV_NAME token marks its requirements (or an extras group) as development-only;
+# tokens are whole name parts, so "docker" or "decimal" stay runtime
+_REQUIREMENTS = re.compile(r"^requirements[\w.-]*\.txt$")
+_DEV_NAME = re.compile(r"(?:^|[-_.])(?:dev|tests?|testing|lint|docs?|ci)(?:$|[-_.])", re.IGNORECASE)
+
+# Packages worth naming in a tech stack, by ecosystem; anything else ranks below these
+FRAMEWORKS = {
+    "python": {
+        "django": "Django", "flask": "Flask", "fastapi": "FastAPI", "starlette": "Starlette",
+        "sqlalchemy": "SQLAlchemy", "pydantic": "Pydantic", "celery": "Celery", "numpy": "NumPy",
+        "pandas": "pandas", "torch": "PyTorch", "tensorflow": "TensorFlow", "scikit-learn": "scikit-learn",
+        "click": "Click", "typer": "Typer", "aiohttp": "aiohttp", "pytest": "pytest", "alembic": "Alembic",
+    },
+    "node": {
+        "react": "React", "next": "Next.js", "vue": "Vue", "nuxt": "Nuxt", "svelte": "Svelte",
+        "@angular/core": "Angular", "express": "Express", "fastify": "Fastify", "@nestjs/core": "NestJS",
+        "vite": "Vite", "jest": "Jest", "vitest": "Vitest", "prisma": "Prisma", "tailwindcss": "Tailwind CSS",
+        "graphql": "GraphQL",
+    },
+    "rust": {
+        "tokio": "Tokio", "axum": "Axum", "actix-web": "Actix Web", "serde": "Serde", "clap": "clap",
+        "diesel": "Diesel", "sqlx": "SQLx", "rocket": "Rocket", "tonic": "tonic",
+    },
+    "go": {
+        "github.com/gin-gonic/gin": "Gin", "github.com/labstack/echo/v4": "Echo",
+        "github.com/gofiber/fiber/v2": "Fiber", "google.golang.org/grpc": "gRPC", "gorm.io/gorm": "GORM",
+        "github.com/spf13/cobra": "Cobra",
+    },
+}
+# Ranking: languages, then known frameworks, then other runtime dependencies;
+# development-only dependencies rank below runtime ones of the same kind
+_RANK_LANGUAGE, _RANK_FRAMEWORK, _RANK_DEPENDENCY = 0, 1, 2
+# Longest tech_stack / key_modules returned; generate-memory-update.py packs from these
+MAX_STACK = 15
+MAX_MODULES = 12
+
+# Directories under which each child is a module of its own
+_MODULE_CONTAINERS = {"src", "lib", "cmd", "internal", "pkg", "packages", "apps", "crates", "services"}
+# Directories that hold no application modules
+_NON_MODULE_DIRS = {"tests", "test", "docs", "doc", "examples", "scripts", "benchmarks", "build", "dist", "target"}
+_SOURCE_EXTENSIONS = {
+    ".py", ".js", ".jsx", ".mjs", ".ts", ".tsx", ".vue", ".svelte", ".go", ".rs", ".java", ".kt", ".scala",
+    ".rb", ".php", ".c", ".h", ".cc", ".cpp", ".hpp", ".cs", ".swift", ".ex", ".exs",
+}
+# Files counted per module before its count is taken as "large enough"
+_MAX_MODULE_FILES = 2000
+
+_VERSION = re.compile(r"\d+(?:\.\d+)*")
+_PEP508_NAME = re.compile(r"^\s*([A-Za-z0-9][A-Za-z0-9._-]*)\s*(?:\[[^\]]*\])?\s*([^;]*)")
+
+
+class Dependency(NamedTuple):
+    """One named technology found in a manifest, before ranking."""
+
+    name: str
+    version: str
+    rank: int
+    dev: bool = False
+
+    def label(self) -> str:
+        return f"{self.name} {self.version}".strip()
+
+
+# --- TOML --------------------------------------------------------------------
+
+_TOML_KEY = re.compile(r"\s*(?:([A-Za-z0-9_-]+)|\"((?:[^\"\\]|\\.)*)\"|'([^']*)')\s*")
+_TOML_BASIC = re.compile(r"\"(?:[^\"\\\n]|\\.)*\"")
+_TOML_NUMBER = re.compile(r"[+-]?(?:\d[\d_]*)(?:\.\d[\d_]*)?(?:[eE][+-]?\d+)?")
+_TOML_BARE = re.compile(r"[^\s,\]}]+")
+
+
+def _toml_keys(text: str) -> list[str]:
+    """Split a possibly dotted, possibly quoted TOML key into its parts."""
+    keys, pos = [], 0
+    while True:
+        m = _TOML_KEY.match(text, pos)
+        if not m or m.end() == pos:
+            raise ValueError(f"invalid TOML key: {text!r}")
+        bare, basic, literal = m.groups()
+        keys.append(bare if bare is not None else json.loads(f'"{basic}"') if basic is not None else literal)
+        pos = m.end()
+        if pos == len(text):
+            return keys
+        if text[pos] != ".":
+            raise ValueError(f"invalid TOML key: {text!r}")
+        pos += 1
+
+
+def _toml_value(text: str, pos: int):
+    """Parse the TOML value starting at ``pos``; return ``(value, end)``."""
+    while pos < len(text) and text[pos] in " \t\r\n":
+        pos += 1
+    for quote in ('"""', "'''"):
+        if text.startswith(quote, pos):
+            end = text.find(quote, pos + 3)
+            if end < 0:
+                raise ValueError("unterminated multi-line string")
+            value = text[pos + 3:end]
+            return value[1:] if value.startswith("\n") else value, end + 3
+    if text.startswith('"', pos):
+        m = _TOML_BASIC.match(text, pos)
+        if not m:
+            raise ValueError("unterminated string")
+        return json.loads(m.group()), m.end()
+    if text.startswith("'", pos):
+        end = text.find("'", pos + 1)
+        if end < 0:
+            raise ValueError("unterminated string")
+        return text[pos + 1:end], end + 1
+    if text.startswith("[", pos) or text.startswith("{", pos):
+        inline_table = text[pos] == "{"
+        close = "}" if inline_table else "]"
+        items: list | dict = {} if inline_table else []
+        pos += 1
+        while True:
+            while pos < len(text) and text[pos] in " \t\r\n,":
+                pos += 1
+            if text.startswith(close, pos):
+                return items, pos + 1
+            if pos >= len(text):
+                raise ValueError(f"missing {close!r}")
+            if inline_table:
+                eq = text.find("=", pos)
+                if eq < 0:
+                    raise ValueError("inline table entry without '='")
+                *parents, last = _toml_keys(text[pos:eq])
+                target = items
+                for key in parents:
+                    target = target.setdefault(key, {})
+                target[last], pos = _toml_value(text, eq + 1)
+            else:
+                value, pos = _toml_value(text, pos)
+                items.append(value)
+    for literal, value in (("true", True), ("false", False)):
+        if text.startswith(literal, pos):
+            return value, pos + len(literal)
+    m = _TOML_BARE.match(text, pos)
+    if not m:
+        raise ValueError("missing value")
+    token = m.group()
+    if _TOML_NUMBER.fullmatch(token):
+        token = token.replace("_", "")
+        return (float(token) if any(c in token for c in ".eE") else int(token)), m.end()
+    # Dates, times and other scalars are kept as text
+    return token, m.end()
+
+
+_TOML_TOKEN = re.compile(r"\"(?:[^\"\\]|\\.)*\"|'[^']*'|[\[\]{}#]")
+
+
+def _strip_toml_comment(line: str) -> str:
+    """Drop a trailing ``#`` comment, ignoring ``#`` inside strings."""
+    for m in _TOML_TOKEN.finditer(line):
+        if m.group() == "#":
+            return line[:m.start()]
+    return line
+
+
+def _bracket_depth(text: str) -> int:
+    """Return how many arrays / inline tables are still open at the end of ``text``."""
+    depth = 0
+    for m in _TOML_TOKEN.finditer(text):
+        if m.group() in ("[", "{"):
+            depth += 1
+        elif m.group() in ("]", "}"):
+            depth -= 1
+    return depth
+
+
+def parse_toml_subset(text: str) -> dict:
+    """Parse the TOML that manifests use, for Python versions without tomllib.
+
+    Covers tables, arrays of tables, dotted and quoted keys, strings
+    (multi-line ones without escape processing), numbers, booleans, arrays
+    (across lines too) and inline tables; dates are returned as text.
+    Raises ValueError on input it cannot parse.
+    """
+    root: dict = {}
+    table = root
+    pending = ""
+    lines = iter(text.splitlines())
+    for raw in lines:
+        opened = next((q for q in ('"""', "'''") if raw.count(q) == 1), None)
+        if opened and not pending:
+            # A multi-line string value: its lines are taken verbatim
+            block = [raw]
+            for more in lines:
+                block.append(more)
+                if opened in more:
+                    break
+            else:
+                raise ValueError("unterminated multi-line string")
+            head, _, tail = "\n".join(block).rpartition(opened)
+            line = head + opened + _strip_toml_comment(tail)
+        else:
+            line = (pending + "\n" if pending else "") + _strip_toml_comment(raw)
+            if _bracket_depth(line.partition("=")[2]) > 0:
+                pending = line
+                continue
+        pending = ""
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if stripped.startswith("["):
+            array = stripped.startswith("[[")
+            name = stripped[2:-2] if array else stripped[1:-1]
+            *parents, last = _toml_keys(name)
+            table = root
+            for key in parents:
+                table = table.setdefault(key, {})
+                if isinstance(table, list):
+                    table = table[-1]
+            if array:
+                table.setdefault(last, []).append({})
+                table = table[last][-1]
+            else:
+                table = table.setdefault(last, {})
+            continue
+        key, eq, value = stripped.partition("=")
+        if not eq:
+            raise ValueError(f"expected 'key = value': {stripped!r}")
+        *parents, last = _toml_keys(key)
+        target = table
+        for part in parents:
+            target = target.setdefault(part, {})
+        target[last], end = _toml_value(value, 0)
+        if value[end:].strip():
+            raise ValueError(f"unexpected text after value: {value[end:].strip()!r}")
+    if pending:
+        raise ValueError("unterminated array or inline table")
+    return root
+
+
+def load_toml(text: str) -> dict:
+    """Parse TOML with tomllib when available, else with parse_toml_subset."""
+    if tomllib is not None:
+        return tomllib.loads(text)
+    return parse_toml_subset(text)
+
+
+# --- Manifest parsers --------------------------------------------------------
+
+
+def _version(spec: str) -> str:
+    m = _VERSION.search(spec or "")
+    return m.group() if m else ""
+
+
+def _named(ecosystem: str, name: str, spec: str, dev: bool) -> Dependency:
+    known = FRAMEWORKS[ecosystem].get(name.lower())
+    return Dependency(known or name, _version(spec), _RANK_FRAMEWORK if known else _RANK_DEPENDENCY, dev)
+
+
+def _requirement(requirement: str, dev: bool) -> Dependency | None:
+    """Parse one PEP 508 requirement string."""
+    m = _PEP508_NAME.match(requirement)
+    if not m:
+        return None
+    return _named("python", m.group(1).replace("_", "-"), m.group(2), dev)
+
+
+def _table(value) -> dict:
+    """Return ``value`` if it is a TOML table, else an empty one (for well-formed but unexpected types)."""
+    return value if isinstance(value, dict) else {}
+
+
+def _parse_pyproject(data: dict) -> list[Dependency]:
+    deps = []
+    project = _table(data.get("project"))
+    poetry = _table(_table(data.get("tool")).get("poetry"))
+    python = project.get("requires-python") or _table(poetry.get("dependencies")).get("python")
+    deps.append(Dependency("Python", _version(python) if isinstance(python, str) else "", _RANK_LANGUAGE))
+    requirements = project.get("dependencies")
+    for req in requirements if isinstance(requirements, list) else []:
+        if isinstance(req, str):
+            deps.append(_requirement(req, False))
+    for group, reqs in _table(project.get("optional-dependencies")).items():
+        for req in reqs if isinstance(reqs, list) else []:
+            if isinstance(req, str):
+                deps.append(_requirement(req, bool(_DEV_NAME.search(group))))
+    groups = [(poetry.get("dependencies"), False), (poetry.get("dev-dependencies"), True)]
+    groups += [(_table(g).get("dependencies"), True) for g in _table(poetry.get("group")).values()]
+    for table, dev in groups:
+        for name, spec in _table(table).items():
+            if name.lower() != "python":
+                version = spec.get("version", "") if isinstance(spec, dict) else str(spec)
+                deps.append(_named("python", name, version, dev))
+    return deps
+
+
+def _parse_setup_cfg(text: str) -> list[Dependency]:
+    parser = configparser.ConfigParser(interpolation=None)
+    parser.read_string(text)
+    deps = [Dependency("Python", _version(parser.get("options", "python_requires", fallback="")), _RANK_LANGUAGE)]
+    for req in parser.get("options", "install_requires", fallback="").splitlines():
+        if req.strip():
+            deps.append(_requirement(req, False))
+    if parser.has_section("options.extras_require"):
+        for group, reqs in parser.items("options.extras_require"):
+            for req in reqs.splitlines():
+                if req.strip():
+                    deps.append(_requirement(req, bool(_DEV_NAME.search(group))))
+    return deps
+
+
+def _parse_requirements(text: str, dev: bool) -> list[Dependency]:
+    deps = [Dependency("Python", "", _RANK_LANGUAGE)]
+    for line in text.splitlines():
+        line = line.split(" #", 1)[0].strip()
+        if line and not line.startswith(("#", "-")) and "://" not in line:
+            deps.append(_requirement(line, dev))
+    return deps
+
+
+def _parse_package_json(data: dict, typescript: bool) -> list[Dependency]:
+    engines = data.get("engines") if isinstance(data.get("engines"), dict) else {}
+    deps = [Dependency("Node.js", _version(engines.get("node", "")), _RANK_LANGUAGE)]
+    all_deps = {}
+    for field, dev in (("dependencies", False), ("devDependencies", True)):
+        table = data.get(field)
+        for name, spec in (table.items() if isinstance(table, dict) else []):
+            all_deps.setdefault(name, (str(spec), dev))
+    if "typescript" in all_deps or typescript:
+        deps.insert(0, Dependency("TypeScript", _version(all_deps.get("typescript", ("", False))[0]), _RANK_LANGUAGE))
+    for name, (spec, dev) in all_deps.items():
+        if name != "typescript":
+            deps.append(_named("node", name, spec, dev))
+    return deps
+
+
+def _parse_cargo(data: dict) -> list[Dependency]:
+    package = data.get("package") if isinstance(data.get("package"), dict) else {}
+    rust_version = package.get("rust-version")
+    version = _version(rust_version) if isinstance(rust_version, str) else ""
+    deps = [Dependency("Rust", version, _RANK_LANGUAGE)]
+    workspace = data.get("workspace") if isinstance(data.get("workspace"), dict) else {}
+    tables = [(data.get("dependencies"), False), (workspace.get("dependencies"), False)]
+    tables += [(data.get("dev-dependencies"), True), (data.get("build-dependencies"), True)]
+    for table, dev in tables:
+        for name, spec in (table.items() if isinstance(table, dict) else []):
+            spec = spec.get("version", "") if isinstance(spec, dict) else spec
+            deps.append(_named("rust", name, spec if isinstance(spec, str) else "", dev))
+    return deps
+
+
+def _parse_go_mod(text: str) -> list[Dependency]:
+    deps = [Dependency("Go", "", _RANK_LANGUAGE)]
+    in_block = False
+    for raw in text.splitlines():
+        line = raw.strip()
+        if line.startswith("go ") and not in_block:
+            deps[0] = Dependency("Go", _version(line[3:]), _RANK_LANGUAGE)
+            continue
+        if line.startswith("require ("):
+            in_block = True
+            continue
+        if in_block and line == ")":
+            in_block = False
+            continue
+        if line.startswith("require "):
+            line = line[len("require "):]
+        elif not in_block:
+            continue
+        if "// indirect" in line:
+            continue
+        parts = line.split()
+        if len(parts) >= 2:
+            deps.append(_named("go", parts[0], parts[1], False))
+    return deps
+
+
+def _read_manifest(path: Path) -> str | None:
+    try:
+        return path.read_text(encoding="utf-8", errors="replace")
+    except OSError as exc:
+        print(f"WARNING: Could not read {path}: {exc}", file=sys.stderr)
+        return None
+
+
+def _manifest_deps(root: Path, name: str, files: set[str]) -> list[Dependency]:
+    """Parse one root manifest, warning and returning nothing if it is unreadable or malformed."""
+    path = root / name
+    text = _read_manifest(path)
+    if text is None:
+        return []
+    try:
+        if name in ("pyproject.toml", "Cargo.toml"):
+            data = load_toml(text)
+            return _parse_pyproject(data) if name == "pyproject.toml" else _parse_cargo(data)
+        if name == "package.json":
+            data = json.loads(text)
+            return _parse_package_json(data, "tsconfig.json" in files) if isinstance(data, dict) else []
+        if name == "setup.cfg":
+            return _parse_setup_cfg(text)
+        if name == "go.mod":
+            return _parse_go_mod(text)
+        return _parse_requirements(text, bool(_DEV_NAME.search(name)))
+    except (ValueError, configparser.Error) as exc:
+        print(f"WARNING: Could not parse {path}: {exc}", file=sys.stderr)
+        return []
+
+
+def rank_stack(deps: list[Dependency], limit: int = MAX_STACK) -> list[str]:
+    """Order dependencies for a tech stack: languages, frameworks, then the rest; runtime before dev.
+
+    Within a rank, manifest order is kept. A name found in several manifests
+    is listed once, where it ranks highest, with the first version declared
+    for it anywhere.
+    """
+    best: dict[str, tuple[tuple[int, bool, int], Dependency]] = {}
+    versions: dict[str, str] = {}
+    for order, dep in enumerate(d for d in deps if d is not None):
+        name = dep.name.lower()
+        if dep.version:
+            versions.setdefault(name, dep.version)
+        key = (dep.rank, dep.dev, order)
+        if name not in best or key < best[name][0]:
+            best[name] = (key, dep)
+    ranked = sorted(best.values(), key=lambda item: item[0])
+    return [dep._replace(version=versions.get(dep.name.lower(), "")).label() for _, dep in ranked[:limit]]
+
+
+# --- Modules -----------------------------------------------------------------
+
+
+def _with_ignore_files(path: str, rel: str, ignore):
+    """Return ``ignore`` extended with any ignore files directly inside ``path``."""
+    detector = load_sibling("detect-repo-type")
+    for name in detector.IGNORE_FILES:
+        ignore_file = os.path.join(path, name)
+        if os.path.isfile(ignore_file):
+            ignore = ignore.extend(rel, detector._read_ignore_file(ignore_file))
+    return ignore
+
+
+def _count_sources(path: str, rel: str, ignore) -> int:
+    """Count source files under ``path`` (root-relative ``rel``), stopping at _MAX_MODULE_FILES.
+
+    Nested directories are pruned like the detector's walk: hidden and
+    ``_SKIP_DIRS`` names, plus whatever the ignore rules in effect exclude,
+    including ignore files found on the way down.
+    """
+    detector = load_sibling("detect-repo-type")
+    count = 0
+    stack = [(path, rel, ignore)]
+    while stack:
+        dirpath, dir_rel, matcher = stack.pop()
+        matcher = _with_ignore_files(dirpath, dir_rel, matcher)
+        try:
+            with os.scandir(dirpath) as it:
+                entries = [(e.name, e.path, e.is_dir(follow_symlinks=False)) for e in it]
+        except OSError:
+            continue
+        for name, child_path, is_dir in entries:
+            child = f"{dir_rel}/{name}"
+            if is_dir:
+                if name not in detector._SKIP_DIRS and not name.startswith(".") and not matcher.is_ignored(child, True):
+                    stack.append((child_path, child, matcher))
+            elif os.path.splitext(name)[1] in _SOURCE_EXTENSIONS and not matcher.is_ignored(child, False):
+                count += 1
+        if count >= _MAX_MODULE_FILES:
+            return _MAX_MODULE_FILES
+    return count
+
+
+def find_modules(root: Path, limit: int = MAX_MODULES) -> list[str]:
+    """Return the repository's top-level modules, largest (by source file count) first.
+
+    A module is a top-level directory holding source files, or a child of a
+    container such as ``src/``, ``cmd/`` or ``packages/`` (with the
+    container itself counted when it has source files of its own). Hidden,
+    skipped, gitignored and non-code directories (tests, docs, build output)
+    are not candidates; only the ignore rules prune what is counted inside
+    a module, so a nested ``scripts/`` or ``docs/`` still counts.
+    """
+    detector = load_sibling("detect-repo-type")
+    ignore = detector.IgnoreMatcher.for_root(root, detector.RepoSnapshot(root))
+    skip = detector._SKIP_DIRS | _NON_MODULE_DIRS
+    found: list[tuple[int, str]] = []
+
+    def subdirs(path: Path, rel: str, matcher) -> list[tuple[Path, str]]:
+        try:
+            with os.scandir(path) as it:
+                entries = sorted(e.name for e in it if e.is_dir(follow_symlinks=False))
+        except OSError:
+            return []
+        out = []
+        for name in entries:
+            child = f"{rel}/{name}" if rel else name
+            if name not in skip and not name.startswith(".") and not matcher.is_ignored(child, True):
+                out.append((path / name, child))
+        return out
+
+    for path, rel in subdirs(root, "", ignore):
+        if rel in _MODULE_CONTAINERS:
+            matcher = _with_ignore_files(str(path), rel, ignore)
+            children = subdirs(path, rel, matcher)
+            for child_path, child_rel in children:
+                found.append((_count_sources(str(child_path), child_rel, matcher), child_rel))
+            try:
+                with os.scandir(path) as it:
+                    direct = sum(
+                        e.is_file() and os.path.splitext(e.name)[1] in _SOURCE_EXTENSIONS
+                        and not matcher.is_ignored(f"{rel}/{e.name}", False)
+                        for e in it
+                    )
+            except OSError:
+                direct = 0
+            if direct or not children:
+                found.append((direct, rel))
+        else:
+            found.append((_count_sources(str(path), rel, ignore), rel))
+    found = [(count, rel) for count, rel in found if count]
+    found.sort(key=lambda item: (-item[0], item[1]))
+    return [rel for _, rel in found[:limit]]
+
+
+def extract_manifests(root: str = ".") -> dict:
+    """Derive generate_memory_update's ``tech_stack`` and ``key_modules`` from a repository.
+
+    Reads every root manifest in MANIFESTS plus ``requirements*.txt`` once,
+    ranks what they declare (see rank_stack) and lists modules (see
+    find_modules). Unreadable or malformed manifests are skipped with a
+    warning. Returns ``repo_name`` (the directory name), ``tech_stack``,
+    ``key_modules`` and ``manifests`` (the files parsed).
+    """
+    path = Path(root).resolve()
+    try:
+        files = {e.name for e in os.scandir(path) if e.is_file()}
+    except OSError as exc:
+        print(f"WARNING: Could not list {path}: {exc}", file=sys.stderr)
+        files = set()
+    manifests = [name for name in MANIFESTS if name in files]
+    manifests += sorted(name for name in files if _REQUIREMENTS.match(name))
+    deps: list[Dependency] = []
+    for name in manifests:
+        deps.extend(_manifest_deps(path, name, files))
+    return {
+        "repo_name": path.name,
+        "tech_stack": rank_stack(deps),
+        "key_modules": find_modules(path),
+        "manifests": manifests,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("root", nargs="?", default=".", help="repository root (default: .)")
+    args = parser.parse_args()
+    root_path = Path(args.root).resolve()
+    if not root_path.is_dir():
+        print(f"ERROR: '{root_path}' is not a valid directory", file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(extract_manifests(str(root_path)), indent=2))
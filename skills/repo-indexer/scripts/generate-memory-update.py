@@ -3,24 +3,210 @@
 
 from __future__ import annotations
 
+import argparse
+import hashlib
 import json
+import os
+import re
 import sys
 from datetime import date
+from pathlib import Path
+
+from _siblings import load_sibling
 
 REQUIRED_KEYS = {"repo_name", "repo_type", "tech_stack", "key_modules", "patterns"}
+ACCEPTED_KEYS = REQUIRED_KEYS | {"summary"}
+_KEYS_HINT = "  JSON must contain: repo_name, repo_type, tech_stack, key_modules, patterns"
 
+# L0 (native memory) budget the CLI packs entries into; SKILL.md documents ~100–300
+L0_TOKEN_BUDGET = 300
+# Value of the first item of each field when packing; later items lose
+# _RANK_DECAY per position, since callers list the most important first
+L0_WEIGHTS = {"tech_stack": 3.0, "key_modules": 2.0, "patterns": 1.5, "summary": 1.0}
+_RANK_DECAY = 0.8
 
-def generate_memory_update(
+# Local copy of the native-memory roster: one {"repo", "field", "entry"} record per line
+ROSTER_PATH = Path.home() / ".claude" / "repo-roster.jsonl"
+# How each memory_entries line is recognised in a roster, in rendering order
+ENTRY_FIELDS = {
+    "repo": re.compile(r"^Repo: (?P<repo>.+?) \| Type: "),
+    "indexed": re.compile(r"^(?P<repo>.+?) indexed \d{4}-\d{2}-\d{2} \| Key: "),
+    "patterns": re.compile(r"^(?P<repo>.+?) patterns: "),
+    "summary": re.compile(r"^(?P<repo>.+?) summary: "),
+}
+# Exported memory may list entries as bullets: "- Repo: x | Type: ..."
+_LIST_MARKER = re.compile(r"^\s*[-*\u2022]\s*")
+# The index date alone changing is not worth a memory edit
+_INDEX_DATE = re.compile(r"(?<= indexed )\d{4}-\d{2}-\d{2}(?= \| Key: )")
+
+
+def check_payload(data) -> str | None:
+    """Return why ``data`` is not a valid generate_memory_update payload, or None if it is."""
+    if not isinstance(data, dict):
+        return "JSON input must be an object, not an array or primitive"
+    missing = REQUIRED_KEYS - data.keys()
+    if missing:
+        return f"Missing required keys: {', '.join(sorted(missing))}"
+    for str_key in ("repo_name", "repo_type"):
+        if not isinstance(data.get(str_key), str):
+            return f"'{str_key}' must be a string"
+    for list_key in ("tech_stack", "key_modules", "patterns"):
+        if not isinstance(data.get(list_key), list):
+            return f"'{list_key}' must be an array"
+        if not all(isinstance(el, str) for el in data[list_key]):
+            return f"'{list_key}' elements must be strings"
+    if "summary" in data and not isinstance(data["summary"], str):
+        return "'summary' must be a string"
+    return None
+
+
+def fill_from_repo(data, root: str) -> dict:
+    """Fill in the ``repo_name``, ``tech_stack``, ``key_modules`` and ``patterns`` that ``data`` leaves out.
+
+    The stack and modules come from the repository's manifests (see
+    extract-manifests.py); keys already in ``data`` win. Non-object payloads
+    are returned unchanged for check_payload to reject.
+    """
+    if not isinstance(data, dict):
+        return data
+    extracted = load_sibling("extract-manifests").extract_manifests(root)
+    filled = {key: extracted[key] for key in ("repo_name", "tech_stack", "key_modules")}
+    filled["patterns"] = []
+    filled.update(data)
+    return filled
+
+
+def _render(lines, kept: list[list[int]]) -> list[str]:
+    out = []
+    for (prefix, items, required), keep in zip(lines, kept):
+        if keep or required:
+            out.append(prefix + ", ".join(items[i][0] for i in keep))
+    return out
+
+
+def pack_l0(lines, budget: int = L0_TOKEN_BUDGET, engine: str = "bytes") -> dict:
+    """Choose the items that give ``lines`` the most total weight within ``budget`` tokens.
+
+    ``lines`` is a list of ``(prefix, items, required)`` with ``items`` as
+    ``(text, weight)``; a line renders as ``prefix`` plus its kept items
+    joined by ", ", and an optional line with nothing kept is left out.
+
+    Each item costs at least one token on its own. For every choice of
+    optional lines (there are few), the 0/1 knapsack over item costs is
+    solved exactly by dynamic programming in the budget left after the line
+    prefixes; the heaviest outcome wins. Token counts are not quite
+    additive, so the rendered text is then measured with estimate-tokens.py's
+    ``estimate_tokens``: the lowest-weight items go until it fits, and
+    dropped items are tried again, heaviest first, while they still fit.
+
+    Returns ``entries`` (the rendered lines), ``tokens``, ``budget``,
+    ``dropped`` (texts of the items left out, in input order) and ``over``
+    (True if even the required prefixes exceed the budget).
+    """
+    estimate = load_sibling("estimate-tokens").estimate_tokens
+
+    def measure(kept: list[list[int]]) -> int:
+        return estimate("\n".join(_render(lines, kept)), engine)
+
+    flat = [(li, i) for li, (_, items, _) in enumerate(lines) for i in range(len(items))]
+    costs = [max(1, estimate(", " + lines[li][1][i][0], engine)) for li, i in flat]
+    prefix_cost = [estimate(prefix + "\n", engine) for prefix, _, _ in lines]
+    optional = [li for li, line in enumerate(lines) if not line[2]]
+
+    def weight_of(n: int) -> float:
+        li, i = flat[n]
+        return lines[li][1][i][1]
+
+    best_weight, picked = -1.0, set()
+    for mask in range(1 << len(optional)):
+        included = {li for li, line in enumerate(lines) if line[2]}
+        included.update(li for bit, li in enumerate(optional) if mask >> bit & 1)
+        capacity = budget - sum(prefix_cost[li] for li in included)
+        if capacity < 0:
+            continue
+        best = [0.0] * (capacity + 1)
+        chosen: list[frozenset[int]] = [frozenset()] * (capacity + 1)
+        for n, cost in enumerate(costs):
+            if flat[n][0] not in included:
+                continue
+            for c in range(capacity, cost - 1, -1):
+                if best[c - cost] + weight_of(n) > best[c]:
+                    best[c] = best[c - cost] + weight_of(n)
+                    chosen[c] = chosen[c - cost] | {n}
+        if best[capacity] > best_weight:
+            best_weight, picked = best[capacity], set(chosen[capacity])
+
+    def kept_from(selection) -> list[list[int]]:
+        kept: list[list[int]] = [[] for _ in lines]
+        for n in sorted(selection):
+            kept[flat[n][0]].append(flat[n][1])
+        return kept
+
+    while picked and measure(kept_from(picked)) > budget:
+        picked = picked - {min(picked, key=lambda n: (weight_of(n), -n))}
+    for n in sorted(set(range(len(flat))) - picked, key=lambda n: (-weight_of(n), n)):
+        if measure(kept_from(picked | {n})) <= budget:
+            picked = picked | {n}
+    kept = kept_from(picked)
+    tokens = measure(kept)
+    return {
+        "entries": _render(lines, kept),
+        "tokens": tokens,
+        "budget": budget,
+        "dropped": [lines[flat[n][0]][1][flat[n][1]][0] for n in range(len(flat)) if n not in picked],
+        "over": tokens > budget,
+    }
+
+
+def _weighted(field: str, values: list[str]) -> list[tuple[str, float]]:
+    return [(v, L0_WEIGHTS[field] * _RANK_DECAY ** rank) for rank, v in enumerate(values)]
+
+
+def pack_memory_entries(
     repo_name: str,
     repo_type: str,
     tech_stack: list[str],
     key_modules: list[str],
     patterns: list[str],
-    summary: str = ""
-) -> str:
-    """Generate memory update text for Claude's native memory."""
+    summary: str = "",
+    today: str | None = None,
+    budget: int = L0_TOKEN_BUDGET,
+    engine: str = "bytes",
+) -> dict:
+    """Pack a payload's memory entries into ``budget`` tokens (see pack_l0)."""
+    today = today or date.today().isoformat()
+    lines = [
+        (f"Repo: {repo_name} | Type: {repo_type} | Stack: ", _weighted("tech_stack", tech_stack), True),
+        (f"{repo_name} indexed {today} | Key: ", _weighted("key_modules", key_modules), True),
+        (f"{repo_name} patterns: ", _weighted("patterns", patterns), False),
+    ]
+    if summary:
+        lines.append((f"{repo_name} summary: ", _weighted("summary", [summary]), False))
+    return pack_l0(lines, budget, engine)
 
-    today = date.today().isoformat()
+
+def memory_entries(
+    repo_name: str,
+    repo_type: str,
+    tech_stack: list[str],
+    key_modules: list[str],
+    patterns: list[str],
+    summary: str = "",
+    today: str | None = None,
+    budget: int | None = None,
+    engine: str = "bytes",
+) -> list[str]:
+    """Return the memory entry lines that generate_memory_update renders.
+
+    With a token ``budget`` the entries are packed into it (see
+    pack_memory_entries); without one, each field is cut to a fixed number
+    of items.
+    """
+    if budget is not None:
+        return pack_memory_entries(
+            repo_name, repo_type, tech_stack, key_modules, patterns, summary, today, budget, engine
+        )["entries"]
+    today = today or date.today().isoformat()
 
     # Build concise memory entries
     entries = []
@@ -42,6 +228,56 @@ def generate_memory_update(
     if summary:
         entries.append(f"{repo_name} summary: {summary}")
 
+    return entries
+
+
+def generate_memory_update(
+    repo_name: str,
+    repo_type: str,
+    tech_stack: list[str],
+    key_modules: list[str],
+    patterns: list[str],
+    summary: str = "",
+    budget: int | None = None,
+    engine: str = "bytes",
+    roster: dict | None = None,
+) -> str:
+    """Generate memory update text for Claude's native memory.
+
+    With a token ``budget`` the entries are packed into it and anything
+    left out is listed below them (see pack_memory_entries). With a
+    ``roster`` (see load_roster) only the changes to it are shown, as a
+    diff (see diff_roster).
+    """
+    dropped_note = ""
+    if budget is None:
+        entries = memory_entries(repo_name, repo_type, tech_stack, key_modules, patterns, summary)
+    else:
+        packed = pack_memory_entries(
+            repo_name, repo_type, tech_stack, key_modules, patterns, summary, budget=budget, engine=engine
+        )
+        entries = packed["entries"]
+        if packed["dropped"]:
+            dropped_note = (
+                f"\nLeft out to fit the {budget}-token memory budget: {', '.join(packed['dropped'])}\n"
+            )
+    if roster is not None:
+        ops = diff_roster(roster, entries)
+        if not ops:
+            return f"## Claude Memory Update\n\nClaude's memory is up to date for {repo_name}; nothing to change."
+        return f"""
+## Claude Memory Update
+
+After indexing, suggest these changes to Claude's memory:
+
+```diff
+{_render_ops(ops)}
+```
+{dropped_note}
+### How to apply:
+1. Ask Claude to forget the entries marked `-`
+2. Ask Claude to remember the entries marked `+`
+""".strip()
     entries_text = "\n".join(entries)
 
     output = f"""
@@ -52,7 +288,7 @@ After indexing, suggest adding to Claude's memory:
 ```
 {entries_text}
 ```
-
+{dropped_note}
 ### How to add:
 1. Ask Claude: "Remember that I work on {repo_name}"
 2. Or use memory tool: add the entries above
@@ -65,44 +301,283 @@ After indexing, suggest adding to Claude's memory:
     return output.strip()
 
 
+def entry_key(entry: str) -> tuple[str, str] | None:
+    """Return ``(repo name, field)`` for a memory entry line, or None if it is not one of ours.
+
+    A field's text can contain another field's delimiter ("api summary: ...
+    key patterns: CQRS"), so the match whose delimiter comes first wins.
+    """
+    best = None
+    for field, pattern in ENTRY_FIELDS.items():
+        m = pattern.match(entry)
+        if m and (best is None or m.end("repo") < best[0].end("repo")):
+            best = (m, field)
+    return None if best is None else (best[0].group("repo"), best[1])
+
+
+def _entry_digest(entry: str) -> str:
+    return hashlib.sha256(_INDEX_DATE.sub("", entry).encode("utf-8")).hexdigest()
+
+
+def _roster_lines(record) -> list[str]:
+    """Return the entry lines held by one roster record: a string, a roster record or an --entries record."""
+    if isinstance(record, str):
+        return [record]
+    if isinstance(record, dict):
+        if isinstance(record.get("entry"), str):
+            return [record["entry"]]
+        if isinstance(record.get("entries"), list):
+            return [e for e in record["entries"] if isinstance(e, str)]
+    return []
+
+
+def load_roster(path) -> dict[tuple[str, str], tuple[str, str]]:
+    """Index the memory entries in a roster file by ``(repo name, field)``.
+
+    The file is either JSONL (roster records as written by save_roster, or
+    ``--batch --entries`` output) or plain exported memory, one entry per
+    line, optionally behind a ``-``, ``*`` or ``•`` list marker. Lines that
+    are not repo entries are ignored, and a later entry for the same key
+    replaces an earlier one. Values are ``(digest, entry)``, where the
+    digest ignores the index date. A missing file is an empty roster; an
+    unreadable one is too, with a warning.
+    """
+    index: dict[tuple[str, str], tuple[str, str]] = {}
+    try:
+        with open(path, encoding="utf-8") as fh:
+            lines = fh.read().splitlines()
+    except FileNotFoundError:
+        return index
+    except OSError as exc:
+        print(f"WARNING: Could not read roster {path}: {exc}", file=sys.stderr)
+        return index
+    for line in lines:
+        line = line.strip()
+        record = line
+        if line.startswith(("{", '"')):
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                pass
+        for entry in _roster_lines(record):
+            entry = _LIST_MARKER.sub("", entry.strip())
+            key = entry_key(entry)
+            if key:
+                index[key] = (_entry_digest(entry), entry)
+    return index
+
+
+def diff_roster(roster: dict, entries: list[str]) -> list[dict]:
+    """Return the add / replace / delete operations that bring ``roster`` up to ``entries``.
+
+    Only the repos named in ``entries`` are compared; every other repo's
+    entries are left alone, so the work is proportional to what changed.
+    An entry whose digest matches the roster's (see load_roster) needs no
+    operation. Each operation is ``{"op", "repo", "field", "entry"}``, plus
+    ``old`` for a replace; for a delete ``entry`` is the line to remove.
+    """
+    new = {}
+    for entry in entries:
+        key = entry_key(entry)
+        if key:
+            new[key] = entry
+    ops = []
+    for key, entry in new.items():
+        old = roster.get(key)
+        if old is None:
+            ops.append({"op": "add", "repo": key[0], "field": key[1], "entry": entry})
+        elif old[0] != _entry_digest(entry):
+            ops.append({"op": "replace", "repo": key[0], "field": key[1], "entry": entry, "old": old[1]})
+    repos = {repo for repo, _ in new}
+    for key, (_, entry) in roster.items():
+        if key[0] in repos and key not in new:
+            ops.append({"op": "delete", "repo": key[0], "field": key[1], "entry": entry})
+    fields = list(ENTRY_FIELDS)
+    ops.sort(key=lambda op: (op["repo"], fields.index(op["field"])))
+    return ops
+
+
+def apply_roster_ops(roster: dict, ops: list[dict]) -> None:
+    """Apply diff_roster operations to ``roster`` in place."""
+    for op in ops:
+        key = (op["repo"], op["field"])
+        if op["op"] == "delete":
+            roster.pop(key, None)
+        else:
+            roster[key] = (_entry_digest(op["entry"]), op["entry"])
+
+
+def save_roster(path, roster: dict) -> None:
+    """Write ``roster`` as JSONL records sorted by repo and field, replacing the file atomically."""
+    path = Path(path)
+    fields = list(ENTRY_FIELDS)
+    keys = sorted(roster, key=lambda k: (k[0], fields.index(k[1])))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as fh:
+        for repo, field in keys:
+            fh.write(json.dumps({"repo": repo, "field": field, "entry": roster[repo, field][1]}) + "\n")
+    os.replace(tmp, path)
+
+
+def _render_ops(ops: list[dict]) -> str:
+    lines = []
+    for op in ops:
+        if op["op"] == "replace":
+            lines += [f"- {op['old']}", f"+ {op['entry']}"]
+        else:
+            lines.append(f"{'-' if op['op'] == 'delete' else '+'} {op['entry']}")
+    return "\n".join(lines)
+
+
+def run_batch(
+    lines, out=None, entries: bool = False, budget: int | None = None, roster: dict | None = None
+) -> int:
+    """Render one update per JSONL record in ``lines``, writing each to ``out`` as soon as it is ready.
+
+    Records are validated like the single-payload CLI, but a bad record does
+    not stop the batch: in text mode its error goes to stderr as ``ERROR:
+    line N: ...``; with ``entries=True`` every record becomes one JSON line
+    on ``out``, either ``{"line", "repo_name", "entries"}`` or ``{"line",
+    "error"}``. Blank lines are skipped. Returns the number of bad records.
+
+    With a token ``budget`` every record is packed into it (see
+    pack_memory_entries) and entries records also carry ``tokens`` and
+    ``dropped``.
+
+    With a ``roster`` (see load_roster) each record is diffed against it:
+    text mode shows only the changes, entries records gain ``ops``, and the
+    operations are applied to ``roster`` as the batch goes, so a repo listed
+    twice is not added twice.
+    """
+    out = out or sys.stdout
+    today = date.today().isoformat()
+    failed = 0
+    rendered = 0
+    for lineno, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError as e:
+            error = f"Invalid JSON input: {e}"
+        else:
+            error = check_payload(data)
+        if error:
+            failed += 1
+            if entries:
+                out.write(json.dumps({"line": lineno, "error": error}) + "\n")
+            else:
+                print(f"ERROR: line {lineno}: {error}", file=sys.stderr)
+            continue
+        filtered = {k: v for k, v in data.items() if k in ACCEPTED_KEYS}
+        if entries:
+            record = {"line": lineno, "repo_name": filtered["repo_name"]}
+            if budget is None:
+                record["entries"] = memory_entries(**filtered, today=today)
+            else:
+                packed = pack_memory_entries(**filtered, today=today, budget=budget)
+                record.update(entries=packed["entries"], tokens=packed["tokens"], dropped=packed["dropped"])
+            if roster is not None:
+                record["ops"] = diff_roster(roster, record["entries"])
+                apply_roster_ops(roster, record["ops"])
+            out.write(json.dumps(record) + "\n")
+        else:
+            text = generate_memory_update(**filtered, budget=budget, roster=roster)
+            if roster is not None:
+                apply_roster_ops(roster, diff_roster(roster, memory_entries(**filtered, budget=budget)))
+            out.write(("\n\n" if rendered else "") + text + "\n")
+            rendered += 1
+        out.flush()
+    return failed
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("payload", nargs="?", help="JSON object with " + ", ".join(sorted(REQUIRED_KEYS)))
+    parser.add_argument(
+        "--repo",
+        metavar="DIR",
+        help="derive repo_name, tech_stack and key_modules missing from the payload from DIR's manifests",
+    )
+    parser.add_argument(
+        "--batch",
+        nargs="?",
+        const="-",
+        metavar="FILE",
+        help="render one update per JSONL record from FILE (default: stdin), streaming to stdout",
+    )
+    parser.add_argument("--entries", action="store_true", help="--batch: emit JSONL of memory entries instead of text")
+    parser.add_argument(
+        "--budget",
+        type=int,
+        default=L0_TOKEN_BUDGET,
+        help=f"pack entries into this many tokens (default {L0_TOKEN_BUDGET}; 0 keeps fixed per-field limits)",
+    )
+    parser.add_argument(
+        "--roster",
+        nargs="?",
+        const=str(ROSTER_PATH),
+        metavar="FILE",
+        help=f"show only the changes against the entries already in FILE (JSONL or exported memory lines; "
+        f"default {ROSTER_PATH})",
+    )
+    parser.add_argument(
+        "--update-roster",
+        action="store_true",
+        help="apply the changes to the --roster file (JSONL only)",
+    )
+    args = parser.parse_args()
+    budget = args.budget or None
+    roster = None
+    if args.roster:
+        if args.update_roster and not args.roster.endswith(".jsonl"):
+            print("ERROR: --update-roster needs a .jsonl roster file", file=sys.stderr)
+            sys.exit(1)
+        roster = load_roster(args.roster)
+    elif args.update_roster:
+        print("ERROR: --update-roster needs --roster", file=sys.stderr)
+        sys.exit(1)
+    if args.batch is not None:
+        try:
+            if args.batch == "-":
+                failed = run_batch(sys.stdin, entries=args.entries, budget=budget, roster=roster)
+            else:
+                with open(args.batch, encoding="utf-8") as fh:
+                    failed = run_batch(fh, entries=args.entries, budget=budget, roster=roster)
+        except OSError as e:
+            print(f"ERROR: Could not read batch input: {e}", file=sys.stderr)
+            sys.exit(1)
+        if args.update_roster:
+            save_roster(args.roster, roster)
+        sys.exit(1 if failed else 0)
     # Example usage / CLI interface
-    if len(sys.argv) > 1:
+    if args.payload is not None or args.repo:
         # Accept JSON input
         try:
-            data = json.loads(sys.argv[1])
+            data = json.loads(args.payload or "{}")
         except json.JSONDecodeError as e:
             print(f"ERROR: Invalid JSON input: {e}", file=sys.stderr)
-            print("Usage: generate-memory-update.py '<json>'", file=sys.stderr)
-            print("  JSON must contain: repo_name, repo_type, tech_stack, key_modules, patterns", file=sys.stderr)
-            sys.exit(1)
-        if not isinstance(data, dict):
-            print("ERROR: JSON input must be an object, not an array or primitive", file=sys.stderr)
-            sys.exit(1)
-        missing = REQUIRED_KEYS - data.keys()
-        if missing:
-            print(f"ERROR: Missing required keys: {', '.join(sorted(missing))}", file=sys.stderr)
-            print("  JSON must contain: repo_name, repo_type, tech_stack, key_modules, patterns", file=sys.stderr)
+            print("Usage: generate-memory-update.py '<json>' [--repo DIR] [--budget N]", file=sys.stderr)
+            print("       generate-memory-update.py --batch [FILE.jsonl] [--entries]", file=sys.stderr)
+            print(_KEYS_HINT, file=sys.stderr)
             sys.exit(1)
-        # Type validation
-        for str_key in ("repo_name", "repo_type"):
-            if not isinstance(data.get(str_key), str):
-                print(f"ERROR: '{str_key}' must be a string", file=sys.stderr)
-                sys.exit(1)
-        for list_key in ("tech_stack", "key_modules", "patterns"):
-            if not isinstance(data.get(list_key), list):
-                print(f"ERROR: '{list_key}' must be an array", file=sys.stderr)
-                sys.exit(1)
-            # Validate that all list elements are strings
-            if not all(isinstance(el, str) for el in data[list_key]):
-                print(f"ERROR: '{list_key}' elements must be strings", file=sys.stderr)
+        if args.repo:
+            if not Path(args.repo).is_dir():
+                print(f"ERROR: '{args.repo}' is not a valid directory", file=sys.stderr)
                 sys.exit(1)
-        if "summary" in data and not isinstance(data["summary"], str):
-            print("ERROR: 'summary' must be a string", file=sys.stderr)
+            data = fill_from_repo(data, args.repo)
+        error = check_payload(data)
+        if error:
+            print(f"ERROR: {error}", file=sys.stderr)
+            if error.startswith("Missing"):
+                print(_KEYS_HINT, file=sys.stderr)
             sys.exit(1)
-        ACCEPTED_KEYS = REQUIRED_KEYS | {"summary"}
         filtered = {k: v for k, v in data.items() if k in ACCEPTED_KEYS}
-        print(generate_memory_update(**filtered))
+        print(generate_memory_update(**filtered, budget=budget, roster=roster))
+        if args.update_roster:
+            apply_roster_ops(roster, diff_roster(roster, memory_entries(**filtered, budget=budget)))
+            save_roster(args.roster, roster)
     else:
         # Demo output
         print(generate_memory_update(
@@ -110,5 +585,6 @@ if __name__ == "__main__":
             repo_type="microservices",
             tech_stack=["Go 1.21", "gRPC", "PostgreSQL", "Redis"],
             key_modules=["handlers", "services", "middleware", "proto"],
-            patterns=["Clean Architecture", "Repository Pattern", "CQRS"]
+            patterns=["Clean Architecture", "Repository Pattern", "CQRS"],
+            budget=budget,
         ))
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""Render the document templates in references/templates.md from a facts dict."""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import hashlib
+import json
+import marshal
+import os
+import re
+import sys
+from pathlib import Path
+
+from _siblings import load_sibling
+
+TEMPLATES_PATH = Path(__file__).resolve().parent.parent / "references" / "templates.md"
+# Compiled templates are cached next to the source by default, e.g. references/templates.marshal
+CACHE_SUFFIX = ".marshal"
+CACHE_VERSION = 1  # bump whenever compile_templates output changes shape or meaning
+
+# detect_repo_type's ``type`` → CLAUDE.md variant; single_app uses the base template
+VARIANTS = {"monorepo": "monorepo", "library": "library", "microservices": "microservices"}
+# Placeholders written as instructions to the model, and the fact that fills each
+ALIASES = {
+    "one-sentence": "summary",
+    "2-3-sentence-overview": "summary",
+    "2-3-sentences": "overview",
+    "yyyy-mm-dd": "date",
+    "monorepo|microservices|single-app|library": "type",
+    "name": "repo-name",
+}
+
+_TEMPLATE_HEADING = re.compile(r"^## (.+?)\s*$")
+_OPEN_FENCE = re.compile(r"^(`{3,})markdown\s*$")
+_INNER_FENCE = re.compile(r"^\s*```")
+_HEADING = re.compile(r"^#{1,6} (.+?)\s*$")
+_PLACEHOLDER = re.compile(r"\{([^{}\n]+)\}")
+# Lines that a list-valued fact repeats: bullets, numbered items and table rows
+_ROW = re.compile(r"^\s*(?:[-*] |\d+\. |\| )")
+
+# Compiled templates by source sha256, so a process compiles or unmarshals each once
+_COMPILED: dict[str, dict] = {}
+
+
+def _norm(key: str) -> str:
+    """Normalise a placeholder or fact name: ``repo_name``, ``Repo Name`` and ``repo-name`` are one key."""
+    return re.sub(r"[\s_]+", "-", key.strip().lower())
+
+
+def _placeholder_key(text: str, row: bool = False) -> str:
+    """Return the fact key a placeholder asks for; prose placeholders are cut at their first colon.
+
+    ALIASES do not apply in rows, whose placeholders name fields of a list
+    item (``packages/{name}`` is a package's name, not the repo's).
+    """
+    key = _norm(text.split(":", 1)[0]) if ":" in text else _norm(text)
+    return key if row else ALIASES.get(key, key)
+
+
+def _template_name(heading: str) -> str:
+    """``CLAUDE.md — Library variant`` → ``CLAUDE.md:library``; ``CLAUDE.md (<500 tokens)`` → ``CLAUDE.md``."""
+    heading = re.sub(r"\s*\(.*\)\s*$", "", heading)
+    base, sep, variant = heading.partition(" — ")
+    if sep:
+        return f"{base}:{_norm(variant.replace(' variant', ''))}"
+    return base if base.endswith(".md") else _norm(base)
+
+
+def _compile_line(line: str, section: str) -> tuple:
+    """Compile one template line to ``(section, parts, keys, is_row)``.
+
+    ``parts`` alternates literal text (even indexes) and fact keys (odd
+    indexes), with the placeholder's original text after each key so an
+    unfilled placeholder renders unchanged.
+    """
+    is_row = bool(_ROW.match(line)) and bool(_PLACEHOLDER.search(line))
+    parts: list[str] = []
+    pos = 0
+    for m in _PLACEHOLDER.finditer(line):
+        parts += [line[pos:m.start()], _placeholder_key(m.group(1), is_row) + "\0" + m.group(1)]
+        pos = m.end()
+    parts.append(line[pos:])
+    keys = tuple(sorted({p.split("\0", 1)[0] for p in parts[1::2]}))
+    return section, tuple(parts), keys, is_row
+
+
+def compile_templates(text: str) -> dict[str, dict]:
+    """Parse templates.md into compiled templates keyed by name (see _template_name).
+
+    Each ``## `` section's first ````markdown fence is one template. Every
+    line is compiled once (see _compile_line) and tagged with its nearest
+    heading inside the template, skipping lines in nested code fences.
+    """
+    templates: dict[str, dict] = {}
+    name = fence = None
+    section = ""
+    in_code = False
+    lines: list[tuple] = []
+    for line in text.splitlines():
+        if fence is None:
+            m = _TEMPLATE_HEADING.match(line)
+            if m:
+                name = _template_name(m.group(1))
+                continue
+            m = _OPEN_FENCE.match(line)
+            if m and name and name not in templates:
+                fence, section, in_code, lines = m.group(1), "", False, []
+            continue
+        if line.rstrip() == fence:
+            templates[name] = {"name": name, "lines": tuple(lines)}
+            fence = None
+            continue
+        if _INNER_FENCE.match(line):
+            in_code = not in_code
+        elif not in_code:
+            m = _HEADING.match(line)
+            if m:
+                section = _norm(_PLACEHOLDER.sub("", m.group(1))).strip("-:")
+        lines.append(_compile_line(line, section))
+    return templates
+
+
+def _read_cache(cache_path: Path, digest: str) -> dict | None:
+    try:
+        # Our own cache file, checked for version and source hash before use
+        data = marshal.loads(cache_path.read_bytes())  # noqa: S302
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if (
+        isinstance(data, dict)
+        and data.get("version") == CACHE_VERSION
+        and data.get("sha256") == digest
+        and isinstance(data.get("templates"), dict)
+    ):
+        return data["templates"]
+    return None
+
+
+def load_templates(path: Path | str = TEMPLATES_PATH, cache_dir: Path | str | None = None) -> dict[str, dict]:
+    """Return the compiled templates for ``path``, compiling only when its content changed.
+
+    Compiled templates are kept in memory and in a marshal file named after
+    the source (``templates.marshal``) in ``cache_dir``, by default the
+    source's own directory, both keyed by the source's sha256. A stale or
+    corrupt cache just means compiling again, and an unwritable one means
+    keeping the result in memory only.
+    """
+    path = Path(path)
+    data = path.read_bytes()
+    digest = hashlib.sha256(data).hexdigest()
+    if digest in _COMPILED:
+        return _COMPILED[digest]
+    cache_path = (Path(cache_dir) if cache_dir is not None else path.parent) / (path.stem + CACHE_SUFFIX)
+    templates = _read_cache(cache_path, digest)
+    if templates is None:
+        templates = compile_templates(data.decode("utf-8", errors="replace"))
+        payload = {"version": CACHE_VERSION, "sha256": digest, "templates": templates}
+        tmp = cache_path.with_name(cache_path.name + ".tmp")
+        try:
+            tmp.write_bytes(marshal.dumps(payload))
+            os.replace(tmp, cache_path)
+        except OSError:
+            # Read-only installs are expected; the in-memory copy is enough
+            with contextlib.suppress(OSError):
+                tmp.unlink()
+    _COMPILED[digest] = templates
+    return templates
+
+
+def _items(value) -> list:
+    return list(value) if isinstance(value, (list, tuple)) else []
+
+
+def _value(value) -> str:
+    if isinstance(value, (list, tuple)):
+        return ", ".join(str(v) for v in value)
+    return str(value)
+
+
+def _fill(parts: tuple, scope: dict, missing: list[str], section: str = "") -> str:
+    out = []
+    for i, part in enumerate(parts):
+        if i % 2 == 0:
+            out.append(part)
+            continue
+        key, original = part.split("\0", 1)
+        value = scope.get(key)
+        if value is None and " " in original:
+            # Prose placeholders ("{Detailed analysis}") take the fact named after their section
+            value = scope.get(section)
+        if value is None or isinstance(value, dict) or any(isinstance(v, (dict, list)) for v in _items(value)):
+            out.append("{" + original + "}")
+            if original not in missing:
+                missing.append(original)
+        else:
+            out.append(_value(value))
+    return "".join(out)
+
+
+def _pick_row(group: list[tuple], item, scope: dict) -> tuple[tuple, dict]:
+    """Choose the row of ``group`` that renders ``item`` and the scope to fill it from.
+
+    A dict item takes the first row all of whose placeholders it (or the
+    facts) supplies, and whose text contains its ``kind`` if it has one; a
+    plain item fills the first row with a single placeholder.
+    """
+    if isinstance(item, dict):
+        scope = dict(scope, **{_norm(k): v for k, v in item.items()})
+        kind = str(item.get("kind", ""))
+        for row in group:
+            if all(k in scope for k in row[2]) and kind in "".join(row[1][0::2]):
+                return row, scope
+        return group[0], scope
+    row = next((r for r in group if len(r[2]) == 1), group[0])
+    return row, dict(scope, **{row[2][0]: item})
+
+
+def _uniform(group: list[tuple]) -> bool:
+    """True if the rows differ only in their placeholders ("- {insight-1}", "- {insight-2}")."""
+    return len({row[1][0::2] for row in group}) == 1
+
+
+def render_template(template: dict, facts: dict) -> dict:
+    """Fill a compiled template from ``facts``.
+
+    Fact names are matched loosely (see _norm). A list of scalars fills a
+    placeholder as a comma-separated list. A list fact named after a
+    section (``services``, ``public-api``, ``key-insights``...) repeats that
+    section's bullet or table rows once per item instead (see _pick_row):
+    dict items in any section, plain items only where the rows differ
+    just in their placeholders, so "- Language: {lang}" is never repeated.
+    Placeholders with no fact are left as written. Returns ``text`` and
+    ``missing`` (the unfilled placeholders, in order).
+    """
+    scope = {_norm(k): v for k, v in facts.items()}
+    lines = template["lines"]
+    out: list[str] = []
+    missing: list[str] = []
+    i = 0
+    while i < len(lines):
+        section, parts, _, is_row = lines[i]
+        items = scope.get(section)
+        if is_row and isinstance(items, list) and items:
+            j = i
+            while j < len(lines) and lines[j][3] and lines[j][0] == section:
+                j += 1
+            group = list(lines[i:j])
+            if all(isinstance(item, dict) for item in items) or _uniform(group):
+                for item in items:
+                    row, row_scope = _pick_row(group, item, scope)
+                    out.append(_fill(row[1], row_scope, missing, section))
+            else:
+                out.extend(_fill(row[1], scope, missing, section) for row in group)
+            i = j
+            continue
+        out.append(_fill(parts, scope, missing, section))
+        i += 1
+    return {"text": "\n".join(out) + "\n", "missing": missing}
+
+
+def template_for(name: str, repo_type: str | None, templates: dict) -> str:
+    """Return the template key for ``name``, using the ``repo_type`` variant of it if there is one."""
+    variant = VARIANTS.get(repo_type or "")
+    if variant and f"{name}:{variant}" in templates:
+        return f"{name}:{variant}"
+    if name not in templates:
+        raise KeyError(f"unknown template: {name!r} (have: {', '.join(sorted(templates))})")
+    return name
+
+
+def render(name: str, facts: dict, path: Path | str = TEMPLATES_PATH) -> dict:
+    """Render template ``name`` (e.g. "CLAUDE.md", "architecture.md") from ``facts``.
+
+    The variant is chosen by ``facts["type"]``, as returned by
+    detect_repo_type. Returns render_template's result plus ``template``,
+    the key of the template used. Raises KeyError for an unknown name.
+    """
+    templates = load_templates(path)
+    key = template_for(name, facts.get("type"), templates)
+    return dict(render_template(templates[key], facts), template=key)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("template", nargs="?", default="CLAUDE.md", help="template to render (default: CLAUDE.md)")
+    parser.add_argument("--facts", metavar="FILE", help="JSON object of facts ('-' for stdin)")
+    parser.add_argument(
+        "--repo",
+        metavar="DIR",
+        help="fill 'type' (via detect-repo-type.py) and 'repo-name' from DIR when the facts lack them",
+    )
+    parser.add_argument("--list", action="store_true", help="list the available templates")
+    args = parser.parse_args()
+    try:
+        templates = load_templates()
+    except OSError as exc:
+        print(f"ERROR: Could not read {TEMPLATES_PATH}: {exc}", file=sys.stderr)
+        sys.exit(1)
+    if args.list:
+        print("\n".join(sorted(templates)))
+        sys.exit(0)
+    facts = {}
+    if args.facts:
+        try:
+            facts = json.loads(sys.stdin.read() if args.facts == "-" else Path(args.facts).read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError) as exc:
+            print(f"ERROR: Could not load facts: {exc}", file=sys.stderr)
+            sys.exit(1)
+        if not isinstance(facts, dict):
+            print("ERROR: facts must be a JSON object", file=sys.stderr)
+            sys.exit(1)
+    if args.repo:
+        root = Path(args.repo).resolve()
+        if not root.is_dir():
+            print(f"ERROR: '{root}' is not a valid directory", file=sys.stderr)
+            sys.exit(1)
+        scope = {_norm(k) for k in facts}
+        if "type" not in scope:
+            facts["type"] = load_sibling("detect-repo-type").detect_repo_type(str(root))["type"]
+        if "repo-name" not in scope:
+            facts["repo-name"] = root.name
+    try:
+        result = render(args.template, facts)
+    except KeyError as exc:
+        print(f"ERROR: {exc.args[0]}", file=sys.stderr)
+        sys.exit(1)
+    sys.stdout.write(result["text"])
+    if result["missing"]:
+        print(f"WARNING: {len(result['missing'])} placeholders left unfilled in {result['template']}: "
+              + ", ".join("{" + m + "}" for m in result["missing"]), file=sys.stderr)
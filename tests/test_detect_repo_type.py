@@ -1,7 +1,10 @@
 """Tests for detect-repo-type.py."""
 
+import json
+import multiprocessing
 import os
 import pathlib
+import shutil
 import subprocess
 import sys
 
@@ -11,6 +14,10 @@ from helpers import import_script
 _mod = import_script("detect-repo-type")
 detect_repo_type = _mod.detect_repo_type
 _find_dockerfiles = _mod._find_dockerfiles
+RepoSnapshot = _mod.RepoSnapshot
+IgnoreMatcher = _mod.IgnoreMatcher
+analyze_compose = _mod.analyze_compose
+_GIT = shutil.which("git")
 
 DETECT_REPO_TYPE_SCRIPT = (
     pathlib.Path(__file__).resolve().parent.parent
@@ -207,6 +214,208 @@ class TestWorkspaceConfigDetection:
         assert result["type"] == "monorepo"
 
 
+class TestSignalRegistry:
+    @pytest.mark.parametrize(
+        "filename, content",
+        [
+            ("WORKSPACE", ""),
+            ("MODULE.bazel", 'module(name = "x")\n'),
+            ("settings.gradle", "rootProject.name = 'x'\ninclude 'app', 'lib'\n"),
+            ("settings.gradle.kts", 'include(":app")\n'),
+            ("pom.xml", "<project><modules><module>a</module></modules></project>"),
+            ("Cargo.toml", '[workspace]\nmembers = ["crates/*"]\n'),
+        ],
+    )
+    def test_build_system_workspaces_are_monorepo(self, tmp_path, filename, content):
+        (tmp_path / filename).write_text(content)
+        result = detect_repo_type(str(tmp_path))
+        assert result["type"] == "monorepo", result
+
+    @pytest.mark.parametrize(
+        "filename, content",
+        [
+            ("settings.gradle", "rootProject.name = 'single'\n"),
+            ("pom.xml", "<project><artifactId>x</artifactId></project>"),
+        ],
+    )
+    def test_single_module_builds_are_not_monorepo(self, tmp_path, filename, content):
+        (tmp_path / filename).write_text(content)
+        assert detect_repo_type(str(tmp_path))["scores"]["monorepo"] == 0
+
+    def test_nx_project_json_files(self, tmp_path):
+        for name in ("web", "api"):
+            (tmp_path / "projects" / name).mkdir(parents=True)
+            (tmp_path / "projects" / name / "project.json").write_text("{}")
+        result = detect_repo_type(str(tmp_path))
+        assert result["type"] == "monorepo"
+        assert any("2 Nx project.json files" in e for e in result["evidence"])
+
+    def test_single_traversal_for_all_deep_signals(self, microservices_repo, monkeypatch):
+        (microservices_repo / "api" / "project.json").write_text("{}")
+        scanned = []
+        real = _mod._scan_dir
+
+        def spy(dirpath, *args):
+            scanned.append(dirpath)
+            return real(dirpath, *args)
+
+        monkeypatch.setattr(_mod, "_scan_dir", spy)
+        detect_repo_type(str(microservices_repo))
+        assert len(scanned) == len(set(scanned)) == 3
+
+    def test_custom_signal_table(self, tmp_path):
+        (tmp_path / "charts" / "a").mkdir(parents=True)
+        (tmp_path / "charts" / "a" / "Chart.yaml").write_text("name: a\n")
+        (tmp_path / "charts" / "b").mkdir()
+        (tmp_path / "charts" / "b" / "Chart.yaml").write_text("name: b\n")
+        signals = _mod.SignalSet(
+            [_mod.Signal("**/charts/*/Chart.yaml", "microservices", 2, "{count} Helm charts", per_match=True)]
+        )
+        result = _mod._detect(tmp_path, RepoSnapshot(tmp_path), signals)
+        assert result["scores"]["microservices"] == 4
+        assert "2 Helm charts" in result["evidence"]
+
+    def test_signal_set_matching(self):
+        signals = _mod.SignalSet(
+            [
+                _mod.Signal("nx.json", "monorepo", 3),
+                _mod.Signal("**/Dockerfile", "microservices", 1),
+                _mod.Signal("**/*.csproj", "monorepo", 1),
+            ]
+        )
+        assert signals.root == [0]
+        assert signals.match("svc/Dockerfile", "Dockerfile") == [1]
+        assert signals.match("src/App/App.csproj", "App.csproj") == [2]
+        assert signals.match("README.md", "README.md") == []
+
+
+class TestAnytimeDetection:
+    def _no_walk(self, monkeypatch):
+        def fail(*args, **kwargs):
+            raise AssertionError("deep stage must be skipped")
+
+        monkeypatch.setattr(_mod, "_walk_signals", fail)
+
+    def test_all_stages_run_by_default(self, monorepo):
+        result = detect_repo_type(str(monorepo))
+        assert result["stages"] == list(_mod.STAGES)
+        assert result["stop_reason"] is None
+
+    def test_min_confidence_skips_deep_walk(self, monorepo, monkeypatch):
+        (monorepo / "turbo.json").write_text("{}")
+        self._no_walk(monkeypatch)
+        result = detect_repo_type(str(monorepo), min_confidence=0.9)
+        assert result["type"] == "monorepo"
+        assert result["stages"] == ["markers"]
+        assert result["stop_reason"] == "min_confidence"
+        assert any("Stopped after markers stage" in e for e in result["evidence"])
+
+    def test_min_confidence_not_reached_keeps_going(self, tmp_path):
+        (tmp_path / "packages").mkdir()
+        (tmp_path / "pyproject.toml").write_text("[project]\nname = 'x'\n")
+        result = detect_repo_type(str(tmp_path), min_confidence=0.9)
+        assert result["stages"] == list(_mod.STAGES)
+
+    def test_zero_deadline_stops_after_markers(self, microservices_repo, monkeypatch):
+        (microservices_repo / "packages").mkdir()
+        self._no_walk(monkeypatch)
+        result = detect_repo_type(str(microservices_repo), deadline_ms=0)
+        assert result["stages"] == ["markers"]
+        assert result["stop_reason"] == "deadline"
+
+    def test_expired_deadline_exhausts_visit_budget(self):
+        budget = _mod._VisitBudget(10, deadline=_mod.time.monotonic() - 1)
+        assert budget.claim() is False
+        assert budget.exhausted is True
+
+    def test_deadline_cuts_walk_short(self, microservices_repo, monkeypatch):
+        real = _mod._scan_dir
+
+        def slow(*args):
+            _mod.time.sleep(0.2)
+            return real(*args)
+
+        monkeypatch.setattr(_mod, "_scan_dir", slow)
+        result = detect_repo_type(str(microservices_repo), deadline_ms=100)
+        assert result["stop_reason"] == "deadline"
+        assert result["truncated"] is True
+
+    def test_decisive_when_leader_cannot_be_overtaken(self, tmp_path, monkeypatch):
+        (tmp_path / "nx.json").write_text("{}")
+        signals = _mod.SignalSet([_mod.Signal("nx.json", "monorepo", 3, "Found {path}")])
+        self._no_walk(monkeypatch)
+        result = _mod._detect(tmp_path, RepoSnapshot(tmp_path), signals)
+        assert result["stages"] == ["markers"]
+        assert result["stop_reason"] == "decisive"
+
+    @pytest.mark.skipif(_GIT is None, reason="git not installed")
+    def test_decisive_with_stock_signals_in_git(self, tmp_path):
+        (tmp_path / "pnpm-workspace.yaml").write_text("packages:\n  - 'packages/*'\n")
+        (tmp_path / "turbo.json").write_text("{}")
+        _git(tmp_path, "init", "-q")
+        _git(tmp_path, "add", "-A")
+        result = detect_repo_type(str(tmp_path))
+        assert result["stages"] == ["markers"]
+        assert result["stop_reason"] == "decisive"
+        assert result["type"] == "monorepo"
+
+    def test_untracked_tree_is_walked_without_limits(self, tmp_path):
+        for name in ("packages", "services"):
+            (tmp_path / name).mkdir()
+        (tmp_path / "turbo.json").write_text("{}")
+        for i in range(12):
+            (tmp_path / "services" / f"s{i}").mkdir()
+            (tmp_path / "services" / f"s{i}" / "Dockerfile").write_text("FROM scratch")
+        result = detect_repo_type(str(tmp_path))
+        assert result["stages"] == list(_mod.STAGES)
+        assert result["scores"]["microservices"] == 12
+        assert result["type"] == "microservices"
+
+    def test_unbounded_stage_prevents_decisive_stop(self, monorepo):
+        (monorepo / "docker-compose.yml").write_text("services:\n  a:\n    image: x\n")
+        result = detect_repo_type(str(monorepo))
+        assert "compose" in result["stages"]
+
+    def test_incomplete_results_are_not_cached(self, monorepo):
+        (monorepo / "turbo.json").write_text("{}")
+        (monorepo / ".claude").mkdir()
+        _age_tree(monorepo)
+        detect_repo_type(str(monorepo), use_cache=True, min_confidence=0.9)
+        assert not (monorepo / _mod.CACHE_PATH).exists()
+
+
+class TestDetectionProfile:
+    def test_profile_off_by_default(self, monorepo):
+        assert "profile" not in detect_repo_type(str(monorepo))
+
+    def test_profile_reports_each_stage(self, microservices_repo):
+        result = detect_repo_type(str(microservices_repo), profile=True)
+        stages = result["profile"]["stages"]
+        assert list(stages) == ["snapshot", *_mod.STAGES]
+        assert stages["snapshot"]["dirs"] == 1
+        assert stages["deep"]["dirs"] > 0 or stages["deep"]["bytes"] > 0
+        total = result["profile"]["total"]
+        assert total["dirs"] == sum(c["dirs"] for c in stages.values())
+        assert all(c["wall_ms"] >= 0 for c in stages.values())
+
+    def test_compose_bytes_counted(self, tmp_path):
+        body = "services:\n  a:\n    image: x\n"
+        (tmp_path / "docker-compose.yml").write_text(body)
+        result = detect_repo_type(str(tmp_path), profile=True)
+        assert result["profile"]["stages"]["compose"]["bytes"] >= len(body)
+
+    def test_cache_stage_profiled(self, monorepo):
+        (monorepo / ".claude").mkdir()
+        _age_tree(monorepo)
+        detect_repo_type(str(monorepo), use_cache=True)
+        result = detect_repo_type(str(monorepo), use_cache=True, profile=True)
+        assert list(result["profile"]["stages"]) == ["snapshot", "cache"]
+
+    def test_profile_cleared_after_call(self, monorepo):
+        detect_repo_type(str(monorepo), profile=True)
+        assert _mod._active_profile is None
+
+
 class TestCLI:
     _script = DETECT_REPO_TYPE_SCRIPT
 
@@ -219,25 +428,159 @@ class TestCLI:
         assert result.returncode == 1
         assert "ERROR" in result.stderr
 
+    def test_min_confidence_flag(self, monorepo):
+        result = subprocess.run(
+            [sys.executable, str(self._script), "--min-confidence", "0.9", str(monorepo)],
+            capture_output=True,
+            text=True,
+        )
+        assert result.returncode == 0
+        assert "Stopped after markers stage (min_confidence)" in result.stdout
+
+    def test_json_flag(self, monorepo):
+        result = subprocess.run(
+            [sys.executable, str(self._script), "--json", str(monorepo)],
+            capture_output=True,
+            text=True,
+        )
+        assert result.returncode == 0
+        data = json.loads(result.stdout)
+        assert data["type"] == "monorepo"
+        assert data["scores"]["monorepo"] > 0
+        assert "profile" not in data
+
+    def test_profile_flag(self, monorepo):
+        result = subprocess.run(
+            [sys.executable, str(self._script), "--profile", str(monorepo)],
+            capture_output=True,
+            text=True,
+        )
+        assert result.returncode == 0
+        assert "PROFILE:" in result.stdout
+        assert "  markers: " in result.stdout
+        assert "  total: " in result.stdout
+
+    def test_json_with_profile(self, monorepo):
+        result = subprocess.run(
+            [sys.executable, str(self._script), "--json", "--profile", str(monorepo)],
+            capture_output=True,
+            text=True,
+        )
+        data = json.loads(result.stdout)
+        assert set(data["profile"]) == {"stages", "total"}
+
+    def test_leaves_tree_untouched_by_default(self, monorepo):
+        _age_tree(monorepo)
+        result = subprocess.run([sys.executable, str(self._script), str(monorepo)], capture_output=True, text=True)
+        assert result.returncode == 0
+        assert not (monorepo / ".claude").exists()
+
+    def test_cache_flag_writes_cache(self, monorepo):
+        (monorepo / ".claude").mkdir()
+        _age_tree(monorepo)
+        result = subprocess.run(
+            [sys.executable, str(self._script), "--cache", str(monorepo)], capture_output=True, text=True
+        )
+        assert result.returncode == 0
+        assert (monorepo / _mod.CACHE_PATH).is_file()
+
+
+class TestFleet:
+    _script = DETECT_REPO_TYPE_SCRIPT
+
+    @pytest.fixture
+    def fleet(self, tmp_path):
+        (tmp_path / "mono" / "packages").mkdir(parents=True)
+        (tmp_path / "mono" / "turbo.json").write_text("{}")
+        (tmp_path / "lib").mkdir()
+        (tmp_path / "lib" / "pyproject.toml").write_text("[project]\nname = 'x'\n")
+        (tmp_path / "empty").mkdir()
+        (tmp_path / ".hidden").mkdir()
+        return tmp_path
+
+    def test_detect_many_inline(self, fleet):
+        roots = [fleet / "lib", fleet / "mono"]
+        records = list(_mod.detect_many(roots, workers=1))
+        assert [r["type"] for r in records] == ["library", "monorepo"]
+        assert all(r["elapsed_ms"] >= 0 and r["root"] for r in records)
+
+    def test_errors_are_isolated(self, fleet, monkeypatch):
+        real = _mod.detect_repo_type
+
+        def flaky(root, use_cache=False):
+            if root.endswith("mono"):
+                raise RuntimeError("boom")
+            return real(root, use_cache=use_cache)
+
+        monkeypatch.setattr(_mod, "detect_repo_type", flaky)
+        records = list(_mod.detect_many([fleet / "mono", fleet / "lib"], workers=1))
+        assert records[0]["error"] == "RuntimeError: boom"
+        assert records[1]["type"] == "library"
+
+    def test_detect_many_spawn(self, fleet):
+        roots = [fleet / "lib", fleet / "mono"]
+        records = list(_mod.detect_many(roots, workers=2, mp_context=multiprocessing.get_context("spawn")))
+        assert sorted(r["type"] for r in records) == ["library", "monorepo"]
+
+    def test_pool_failures_reported_per_repo(self, fleet, monkeypatch):
+        monkeypatch.setattr(_mod, "call_sibling", lambda *args: None)  # lambdas cannot be pickled
+        records = list(_mod.detect_many([fleet / "mono", fleet / "lib"], workers=2))
+        assert sorted(pathlib.Path(r["root"]).name for r in records) == ["lib", "mono"]
+        assert all("error" in r and r["elapsed_ms"] >= 0 for r in records)
+
+    def test_fleet_cli_streams_jsonl(self, fleet):
+        result = subprocess.run(
+            [sys.executable, str(self._script), "--fleet", str(fleet), "--workers", "2"],
+            capture_output=True,
+            text=True,
+        )
+        assert result.returncode == 0, result.stderr
+        records = [json.loads(line) for line in result.stdout.splitlines()]
+        by_name = {pathlib.Path(r["root"]).name: r for r in records}
+        assert set(by_name) == {"mono", "lib", "empty"}
+        assert by_name["mono"]["type"] == "monorepo"
+        assert by_name["empty"]["type"] == "single_app"
+        assert "scores" in by_name["lib"] and "elapsed_ms" in by_name["lib"]
+
+    def test_fleet_cli_invalid_dir(self):
+        result = subprocess.run(
+            [sys.executable, str(self._script), "--fleet", "/nonexistent/fleet/abc123"],
+            capture_output=True,
+            text=True,
+        )
+        assert result.returncode == 1
+        assert "ERROR" in result.stderr
+
 
 class TestFindDockerfiles:
     def test_finds_nested_dockerfiles(self, microservices_repo):
-        found = _find_dockerfiles(microservices_repo)
+        found, truncated = _find_dockerfiles(microservices_repo)
         assert len(found) == 3
+        assert truncated is False
+
+    def test_single_worker_matches_parallel(self, microservices_repo):
+        serial, _ = _find_dockerfiles(microservices_repo, workers=1)
+        parallel, _ = _find_dockerfiles(microservices_repo, workers=4)
+        assert sorted(serial) == sorted(parallel)
+
+    def test_root_dockerfile_found(self, tmp_repo):
+        (tmp_repo / "Dockerfile").write_text("FROM scratch")
+        found, _ = _find_dockerfiles(tmp_repo)
+        assert len(found) == 1
 
     def test_respects_max_depth(self, tmp_repo):
         # Create a Dockerfile 5 levels deep (beyond default MAX_DOCKERFILE_DEPTH=4)
         deep = tmp_repo / "a" / "b" / "c" / "d" / "e"
         deep.mkdir(parents=True)
         (deep / "Dockerfile").write_text("FROM scratch")
-        found = _find_dockerfiles(tmp_repo, max_depth=4)
+        found, _ = _find_dockerfiles(tmp_repo, max_depth=4)
         assert len(found) == 0
 
     def test_skips_node_modules(self, tmp_repo):
         nm = tmp_repo / "node_modules" / "some-pkg"
         nm.mkdir(parents=True)
         (nm / "Dockerfile").write_text("FROM node:18")
-        found = _find_dockerfiles(tmp_repo)
+        found, _ = _find_dockerfiles(tmp_repo)
         assert len(found) == 0
 
     def test_does_not_follow_symlinks(self, tmp_repo, tmp_path_factory):
@@ -246,7 +589,7 @@ class TestFindDockerfiles:
         (outside / "Dockerfile").write_text("FROM scratch")
         link = tmp_repo / "linked"
         link.symlink_to(outside)
-        found = _find_dockerfiles(tmp_repo)
+        found, _ = _find_dockerfiles(tmp_repo)
         assert len(found) == 0
 
     def test_max_dirs_visited_guard(self, tmp_repo):
@@ -257,9 +600,320 @@ class TestFindDockerfiles:
             d = tmp_repo / f"d{i:04d}"
             d.mkdir()
             (d / "Dockerfile").write_text("FROM scratch")
-        found = _find_dockerfiles(tmp_repo)
+        found, truncated = _find_dockerfiles(tmp_repo)
         # The guard must have fired — not all Dockerfiles can be found
         assert len(found) < max_dirs + 1
+        assert truncated is True
+
+    def test_shallow_services_seen_before_budget_spent(self, tmp_repo, monkeypatch):
+        """Breadth-first walk finds every top-level service even when one subtree is huge."""
+        monkeypatch.setattr(_mod, "MAX_DIRS_VISITED", 40)
+        for i in range(10):
+            svc = tmp_repo / f"svc{i}"
+            svc.mkdir()
+            (svc / "Dockerfile").write_text("FROM scratch")
+        wide = tmp_repo / "aaa-generated"
+        wide.mkdir()
+        for i in range(50):
+            (wide / f"d{i}").mkdir()
+        found, truncated = _find_dockerfiles(tmp_repo)
+        assert len(found) == 10
+        assert truncated is True
+
+    def test_truncation_reported_in_result(self, tmp_repo, monkeypatch):
+        monkeypatch.setattr(_mod, "MAX_DIRS_VISITED", 3)
+        for i in range(5):
+            (tmp_repo / f"d{i}").mkdir()
+        result = detect_repo_type(str(tmp_repo))
+        assert result["truncated"] is True
+        assert any("partial" in e for e in result["evidence"])
+
+
+class TestRepoSnapshot:
+    def test_classifies_root_entries(self, tmp_repo):
+        (tmp_repo / "packages").mkdir()
+        (tmp_repo / "turbo.json").write_text("{}")
+        snap = RepoSnapshot(tmp_repo)
+        assert snap.is_dir("packages/")
+        assert snap.exists("turbo.json")
+        assert not snap.is_dir("turbo.json")
+        assert not snap.exists("nx.json")
+
+    def test_missing_root_is_empty(self, tmp_path):
+        snap = RepoSnapshot(tmp_path / "missing")
+        assert not snap.files and not snap.dirs
+
+    def test_symlinked_dir_is_marker_but_not_walked(self, tmp_repo, tmp_path_factory):
+        outside = tmp_path_factory.mktemp("outside")
+        (tmp_repo / "packages").symlink_to(outside)
+        snap = RepoSnapshot(tmp_repo)
+        assert snap.is_dir("packages")
+        assert "packages" not in snap.walk_dirs
+
+    def test_detection_uses_single_root_listing(self, monorepo, monkeypatch):
+        """Root markers are answered from the snapshot, not per-marker stat calls."""
+        calls = []
+        real_scandir = os.scandir
+
+        def counting_scandir(p):
+            calls.append(os.fspath(p))
+            return real_scandir(p)
+
+        monkeypatch.setattr(_mod.os, "scandir", counting_scandir)
+        result = detect_repo_type(str(monorepo))
+        assert result["type"] == "monorepo"
+        root_listings = [c for c in calls if pathlib.Path(c).resolve() == monorepo.resolve()]
+        assert len(root_listings) == 1
+
+
+def _age_tree(root, seconds=3600):
+    """Push every mtime under ``root`` into the past so the cache treats it as settled."""
+    past = os.stat(root).st_mtime - seconds
+    for dirpath, dirnames, filenames in os.walk(root):
+        for name in dirnames + filenames:
+            os.utime(os.path.join(dirpath, name), (past, past), follow_symlinks=False)
+    os.utime(root, (past, past))
+
+
+class TestDetectionCache:
+    def test_disabled_by_default(self, monorepo):
+        detect_repo_type(str(monorepo))
+        assert not (monorepo / ".claude").exists()
+
+    def test_hit_skips_walk(self, monorepo, monkeypatch):
+        first = detect_repo_type(str(monorepo), use_cache=True)
+        _age_tree(monorepo)
+        detect_repo_type(str(monorepo), use_cache=True)
+        assert (monorepo / _mod.CACHE_PATH).exists()
+
+        def fail_walk(*args, **kwargs):
+            raise AssertionError("cache hit must not walk the tree")
+
+        monkeypatch.setattr(_mod, "_find_dockerfiles", fail_walk)
+        assert detect_repo_type(str(monorepo), use_cache=True) == first
+
+    def test_recent_changes_are_not_cached(self, monorepo):
+        detect_repo_type(str(monorepo), use_cache=True)
+        assert not (monorepo / _mod.CACHE_PATH).exists()
+
+    def test_marker_change_invalidates(self, tmp_repo):
+        (tmp_repo / "package.json").write_text('{"name": "app"}')
+        (tmp_repo / ".claude").mkdir()
+        _age_tree(tmp_repo)
+        assert detect_repo_type(str(tmp_repo), use_cache=True)["type"] == "single_app"
+        (tmp_repo / "package.json").write_text('{"workspaces": ["packages/*"]}')
+        assert detect_repo_type(str(tmp_repo), use_cache=True)["type"] == "monorepo"
+
+    def test_new_service_dockerfile_invalidates(self, microservices_repo):
+        (microservices_repo / ".claude").mkdir()
+        _age_tree(microservices_repo)
+        before = detect_repo_type(str(microservices_repo), use_cache=True)
+        (microservices_repo / "api" / "sub").mkdir()
+        (microservices_repo / "billing").mkdir()
+        (microservices_repo / "billing" / "Dockerfile").write_text("FROM scratch")
+        after = detect_repo_type(str(microservices_repo), use_cache=True)
+        assert after["scores"]["microservices"] == before["scores"]["microservices"] + 1
+
+    def test_corrupt_cache_is_ignored(self, monorepo):
+        cache = monorepo / _mod.CACHE_PATH
+        cache.parent.mkdir(parents=True)
+        cache.write_text("{not json")
+        assert detect_repo_type(str(monorepo), use_cache=True)["type"] == "monorepo"
+
+    def test_git_head_is_part_of_key(self, tmp_repo):
+        git = tmp_repo / ".git"
+        (git / "refs" / "heads").mkdir(parents=True)
+        (git / "HEAD").write_text("ref: refs/heads/main\n")
+        (git / "refs" / "heads" / "main").write_text("a" * 40 + "\n")
+        key_a = _mod._cache_key(tmp_repo)
+        (git / "refs" / "heads" / "main").unlink()
+        (git / "packed-refs").write_text("b" * 40 + " refs/heads/main\n")
+        key_b = _mod._cache_key(tmp_repo)
+        assert _mod._git_head(git) == "b" * 40
+        assert key_a != key_b
+
+    def test_dockerfile_two_levels_down_invalidates(self, tmp_repo):
+        for svc in ("a", "b", "c", "d"):
+            (tmp_repo / "svc" / svc).mkdir(parents=True)
+        for svc in ("a", "b", "c"):
+            (tmp_repo / "svc" / svc / "Dockerfile").write_text("FROM scratch")
+        (tmp_repo / ".claude").mkdir()
+        _age_tree(tmp_repo)
+        assert detect_repo_type(str(tmp_repo), use_cache=True)["scores"]["microservices"] == 3
+        assert (tmp_repo / _mod.CACHE_PATH).exists()
+        (tmp_repo / "svc" / "d" / "Dockerfile").write_text("FROM scratch")
+        assert detect_repo_type(str(tmp_repo), use_cache=True)["scores"]["microservices"] == 4
+
+    def test_compose_include_change_invalidates(self, tmp_repo):
+        (tmp_repo / "compose.yaml").write_text("include:\n  - deploy/extra.yaml\nservices:\n  api:\n    image: a\n")
+        (tmp_repo / "deploy").mkdir()
+        (tmp_repo / "deploy" / "extra.yaml").write_text("services:\n  web:\n    image: w\n")
+        (tmp_repo / ".claude").mkdir()
+        _age_tree(tmp_repo)
+        before = detect_repo_type(str(tmp_repo), use_cache=True)
+        (tmp_repo / "deploy" / "extra.yaml").write_text(
+            "services:\n  web:\n    image: w\n  worker:\n    image: k\n  cron:\n    image: c\n"
+        )
+        after = detect_repo_type(str(tmp_repo), use_cache=True)
+        assert after["scores"]["microservices"] > before["scores"]["microservices"]
+
+    def test_nested_gitignore_change_invalidates(self, tmp_repo):
+        for svc in ("api", "worker", "gateway", "legacy"):
+            (tmp_repo / "svc" / svc).mkdir(parents=True)
+            (tmp_repo / "svc" / svc / "Dockerfile").write_text("FROM scratch")
+        (tmp_repo / "svc" / ".gitignore").write_text("legacy/\n")
+        (tmp_repo / ".claude").mkdir()
+        _age_tree(tmp_repo)
+        assert detect_repo_type(str(tmp_repo), use_cache=True)["scores"]["microservices"] == 3
+        assert (tmp_repo / _mod.CACHE_PATH).exists()
+        (tmp_repo / "svc" / ".gitignore").write_text("# nothing ignored\n")
+        assert detect_repo_type(str(tmp_repo), use_cache=True)["scores"]["microservices"] == 4
+
+
+def _git(repo, *args):
+    subprocess.run([_GIT, "-C", str(repo), *args], check=True, capture_output=True)
+
+
+@pytest.mark.skipif(_GIT is None, reason="git not installed")
+class TestGitIndex:
+    @pytest.fixture
+    def tracked_repo(self, tmp_path):
+        deep = tmp_path / "platform" / "a" / "b" / "c" / "d" / "billing"
+        deep.mkdir(parents=True)
+        (deep / "Dockerfile").write_text("FROM scratch")
+        for svc in ("api", "worker"):
+            (tmp_path / svc).mkdir()
+            (tmp_path / svc / "Dockerfile").write_text("FROM scratch")
+        (tmp_path / "README.md").write_text("# repo\n")
+        _git(tmp_path, "init", "-q")
+        _git(tmp_path, "add", ".")
+        # Untracked build output must not count.
+        (tmp_path / "out" / "gen").mkdir(parents=True)
+        (tmp_path / "out" / "gen" / "Dockerfile").write_text("FROM scratch")
+        return tmp_path
+
+    @pytest.mark.parametrize("index_version", ["2", "3", "4"])
+    def test_reads_tracked_paths(self, tracked_repo, index_version):
+        _git(tracked_repo, "update-index", "--index-version", index_version)
+        paths = _mod._read_git_index(tracked_repo / ".git")
+        assert paths == sorted(paths)
+        assert "README.md" in paths
+        assert "platform/a/b/c/d/billing/Dockerfile" in paths
+        assert "out/gen/Dockerfile" not in paths
+
+    def test_split_index_falls_back_to_walk(self, tracked_repo):
+        _git(tracked_repo, "update-index", "--split-index")
+        (tracked_repo / "README.md").write_text("# changed\n")
+        _git(tracked_repo, "add", "README.md")
+        assert list((tracked_repo / ".git").glob("sharedindex.*"))
+        assert _mod._read_git_index(tracked_repo / ".git") is None
+        result = detect_repo_type(str(tracked_repo))
+        # Walk fallback: depth-limited, but sees the untracked output dir.
+        assert result["scores"]["microservices"] == 3
+
+    def test_deep_signals_matched_from_index(self, tracked_repo):
+        for name in ("a", "b"):
+            (tracked_repo / "libs" / name).mkdir(parents=True)
+            (tracked_repo / "libs" / name / "project.json").write_text("{}")
+        _git(tracked_repo, "add", "libs")
+        result = detect_repo_type(str(tracked_repo))
+        assert any("2 Nx project.json files" in e for e in result["evidence"])
+
+    def test_detection_uses_index_without_depth_cutoff(self, tracked_repo):
+        result = detect_repo_type(str(tracked_repo))
+        assert result["scores"]["microservices"] == 3
+        assert result["type"] == "microservices"
+        assert result["truncated"] is False
+
+    def test_malformed_index_falls_back_to_walk(self, tracked_repo):
+        (tracked_repo / ".git" / "index").write_bytes(b"DIRC\x00\x00\x00\x02\x00\x00\x00\x05")
+        assert _mod._read_git_index(tracked_repo / ".git") is None
+        result = detect_repo_type(str(tracked_repo))
+        # Walk fallback: depth-limited, but sees the untracked output dir.
+        assert result["scores"]["microservices"] == 3
+
+
+class TestIgnoreMatcher:
+    @pytest.mark.parametrize(
+        "lines, rel, is_dir, expected",
+        [
+            (["target/"], "target", True, True),
+            (["target/"], "crates/core/target", True, True),
+            (["target/"], "target", False, False),
+            (["/build"], "build", True, True),
+            (["/build"], "web/build", True, False),
+            (["bazel-*"], "bazel-out", True, True),
+            (["docs/*.md"], "docs/a.md", False, True),
+            (["docs/*.md"], "docs/sub/a.md", False, False),
+            (["**/gen"], "a/b/gen", True, True),
+            (["a/**/z"], "a/z", True, True),
+            (["a/**/z"], "a/x/y/z", True, True),
+            (["dist", "!dist"], "dist", True, False),
+            (["*.log", "!keep.log"], "x/keep.log", False, False),
+            (["# comment", "", "out"], "out", True, True),
+            (["\\#hash"], "#hash", False, True),
+            (["file[0-9]"], "file7", False, True),
+            (["file[!0-9]"], "file7", False, False),
+            (["a[!x]b"], "a/b", False, False),
+            (["[]"], "[]", False, True),
+            (["[!]"], "[!]", False, True),
+            (["[]a]"], "]", False, True),
+            (["v[[:digit:]]"], "v7", False, True),
+            (["v[[:digit:]]"], "vx", False, False),
+            (["[![:upper:]]*"], "Makefile", False, False),
+            (["[[:punct:]]x"], "[x", False, True),
+            (["[z-a]", "out"], "out", True, True),
+            (["[z-a]"], "z", False, False),
+            (["[[:nope:]]"], "n", False, False),
+        ],
+    )
+    def test_gitignore_semantics(self, lines, rel, is_dir, expected):
+        assert IgnoreMatcher().extend("", lines).is_ignored(rel, is_dir) is expected
+
+    def test_malformed_patterns_do_not_break_detection(self, microservices_repo, recwarn):
+        (microservices_repo / ".gitignore").write_text("[z-a]\n[]\n[!]\n[[:alpha:]]*.tmp\n[[:nope:]]\n")
+        result = detect_repo_type(str(microservices_repo))
+        assert result["type"] == "microservices"
+        assert not [w for w in recwarn if issubclass(w.category, FutureWarning)]
+
+    def test_nested_rules_are_relative_to_their_directory(self):
+        matcher = IgnoreMatcher().extend("web", ["/out"])
+        assert matcher.is_ignored("web/out", True)
+        assert not matcher.is_ignored("out", True)
+
+    def test_prunes_gitignored_dirs(self, microservices_repo, monkeypatch):
+        (microservices_repo / ".gitignore").write_text("target/\n")
+        target = microservices_repo / "target" / "debug"
+        target.mkdir(parents=True)
+        (target / "Dockerfile").write_text("FROM scratch")
+        scanned = []
+        real = _mod._scan_dir
+
+        def spy(dirpath, *args):
+            scanned.append(dirpath)
+            return real(dirpath, *args)
+
+        monkeypatch.setattr(_mod, "_scan_dir", spy)
+        found, _ = _find_dockerfiles(microservices_repo)
+        assert len(found) == 3
+        assert not any("target" in d for d in scanned)
+
+    def test_nested_gitignore_and_repoindexerignore(self, tmp_repo):
+        for rel in ("web/build", "web/src", "generated/svc"):
+            (tmp_repo / rel).mkdir(parents=True)
+            (tmp_repo / rel / "Dockerfile").write_text("FROM scratch")
+        (tmp_repo / "web" / ".gitignore").write_text("build/\n")
+        (tmp_repo / ".repoindexerignore").write_text("generated/\n")
+        found, _ = _find_dockerfiles(tmp_repo)
+        assert [pathlib.Path(f).parent.name for f in found] == ["src"]
+
+    def test_git_info_exclude(self, tmp_repo):
+        (tmp_repo / ".git" / "info").mkdir(parents=True)
+        (tmp_repo / ".git" / "info" / "exclude").write_text("scratch\n")
+        (tmp_repo / "scratch").mkdir()
+        (tmp_repo / "scratch" / "Dockerfile").write_text("FROM scratch")
+        found, _ = _find_dockerfiles(tmp_repo)
+        assert found == []
 
 
 class TestMicroservicesComposeVariants:
@@ -316,6 +970,126 @@ class TestMicroservicesComposeVariants:
         assert result["scores"]["microservices"] >= 3
 
 
+class TestAnalyzeCompose:
+    def test_no_compose_file(self, tmp_repo):
+        assert analyze_compose(tmp_repo) is None
+
+    def test_structured_services(self, tmp_repo):
+        (tmp_repo / "docker-compose.yml").write_text(
+            "services:\n"
+            "  api:\n"
+            "    build:\n      context: ./api\n      dockerfile: Dockerfile\n"
+            "    ports:\n      - \"8080:80\"\n      - target: 443\n        published: 8443\n"
+            "  cache:\n    image: 'redis:7'  # pinned\n    ports: [\"6379:6379\"]\n"
+            "  web:\n    build: ./web\n    ports:\n    - 3000:3000\n"
+        )
+        result = analyze_compose(tmp_repo)
+        services = {svc["name"]: svc for svc in result["services"]}
+        assert services["api"]["build"] == "./api"
+        assert services["api"]["ports"] == ["8080:80", "8443:443"]
+        assert services["cache"]["image"] == "redis:7"
+        assert services["cache"]["ports"] == ["6379:6379"]
+        assert services["web"]["ports"] == ["3000:3000"]
+        assert result["file"] == "docker-compose.yml"
+        assert result["truncated"] is False
+
+    def test_override_file_merged(self, tmp_repo):
+        (tmp_repo / "docker-compose.yml").write_text(
+            "services:\n  api:\n    image: api:1\n    ports:\n      - 80:80\n"
+        )
+        (tmp_repo / "docker-compose.override.yml").write_text(
+            "services:\n  api:\n    image: api:dev\n    ports:\n      - 9229:9229\n"
+            "  debug:\n    image: busybox\n"
+        )
+        result = analyze_compose(tmp_repo)
+        services = {svc["name"]: svc for svc in result["services"]}
+        assert services["api"]["image"] == "api:dev"
+        assert services["api"]["ports"] == ["80:80", "9229:9229"]
+        assert "debug" in services
+        assert result["files"] == ["docker-compose.yml", "docker-compose.override.yml"]
+
+    def test_include_followed_transitively(self, tmp_repo):
+        (tmp_repo / "infra").mkdir()
+        (tmp_repo / "compose.yaml").write_text(
+            "include:\n  - infra/db.yml\n  - path: infra/queue.yml\n"
+            "services:\n  api:\n    build: .\n"
+        )
+        (tmp_repo / "infra" / "db.yml").write_text(
+            "include:\n  - path:\n      - cache.yml\n    env_file: .env\n"
+            "services:\n  db:\n    image: postgres\n"
+        )
+        (tmp_repo / "infra" / "queue.yml").write_text("services:\n  queue:\n    image: rabbitmq\n")
+        (tmp_repo / "infra" / "cache.yml").write_text("services:\n  cache:\n    image: redis\n")
+        result = analyze_compose(tmp_repo)
+        assert sorted(svc["name"] for svc in result["services"]) == ["api", "cache", "db", "queue"]
+        by_name = {svc["name"]: svc for svc in result["services"]}
+        assert by_name["cache"]["file"] == "infra/cache.yml"
+        detected = detect_repo_type(str(tmp_repo))
+        assert any("compose.yaml with 4 services" in e for e in detected["evidence"])
+
+    def test_references_outside_root_skipped(self, tmp_path, capsys):
+        repo = tmp_path / "repo"
+        repo.mkdir()
+        outside = tmp_path / "secret.yml"
+        outside.write_text("services:\n  leaked:\n    image: x\n")
+        (repo / "compose.yaml").write_text(
+            f"include:\n  - ../secret.yml\n  - {outside}\n"
+            "services:\n  api:\n    extends:\n      file: ../secret.yml\n      service: leaked\n"
+        )
+        result = analyze_compose(repo)
+        assert [svc["name"] for svc in result["services"]] == ["api"]
+        assert result["services"][0]["image"] is None
+        assert result["files"] == ["compose.yaml"]
+        assert "outside the repository" in capsys.readouterr().err
+
+    def test_extends_across_files(self, tmp_repo):
+        (tmp_repo / "common.yml").write_text(
+            "services:\n  base:\n    build: ./base\n    ports:\n      - 9000:9000\n"
+        )
+        (tmp_repo / "docker-compose.yml").write_text(
+            "services:\n"
+            "  api:\n    extends:\n      file: common.yml\n      service: base\n"
+            "  worker:\n    extends: api\n    image: worker:1\n"
+        )
+        result = analyze_compose(tmp_repo)
+        services = {svc["name"]: svc for svc in result["services"]}
+        assert services["api"]["build"] == "./base"
+        assert services["api"]["ports"] == ["9000:9000"]
+        assert services["worker"]["build"] == "./base"
+        assert services["worker"]["image"] == "worker:1"
+        assert "base" not in services
+
+    def test_extends_cycle_terminates(self, tmp_repo):
+        (tmp_repo / "docker-compose.yml").write_text(
+            "services:\n  a:\n    extends: b\n  b:\n    extends: a\n"
+        )
+        assert len(analyze_compose(tmp_repo)["services"]) == 2
+
+    def test_byte_cap_truncates(self, tmp_repo, monkeypatch):
+        monkeypatch.setattr(_mod, "MAX_COMPOSE_BYTES", 200)
+        body = "services:\n" + "".join(f"  svc{i}:\n    image: img{i}\n" for i in range(50))
+        (tmp_repo / "docker-compose.yml").write_text(body)
+        result = analyze_compose(tmp_repo)
+        assert result["truncated"] is True
+        assert 0 < len(result["services"]) < 50
+
+    def test_overlong_line_does_not_end_services(self, tmp_repo):
+        command = "x" * (_mod._MAX_COMPOSE_LINE * 2 + 100)
+        (tmp_repo / "docker-compose.yml").write_text(
+            f"services:\n  a:\n    command: {command}\n    image: a\n"
+            "  b:\n    image: b\n  c:\n    image: c\n  d:\n    image: d\n"
+        )
+        services = {svc["name"]: svc for svc in analyze_compose(tmp_repo)["services"]}
+        assert sorted(services) == ["a", "b", "c", "d"]
+        assert services["a"]["image"] == "a"
+
+    def test_duplicate_service_names_counted_once(self, tmp_repo):
+        (tmp_repo / "docker-compose.yml").write_text(
+            "services:\n  api:\n    image: a\n  api:\n    image: b\n  db:\n    image: c\n"
+        )
+        assert len(analyze_compose(tmp_repo)["services"]) == 2
+
+
 class TestWorkspaceConfigFiles:
     """Tests for workspace config files that signal monorepo."""
 
@@ -1,9 +1,13 @@
 """Tests for estimate-tokens.py."""
 
+import hashlib
+import json
 import os
 import pathlib
+import shutil
 import subprocess
 import sys
+import threading
 
 import pytest
 from helpers import import_script
@@ -15,6 +19,7 @@ validate = _mod.validate
 L2_TOTAL_BUDGET = _mod.L2_TOTAL_BUDGET
 BUDGETS = _mod.BUDGETS
 _MAX_FILE_BYTES = _mod._MAX_FILE_BYTES
+BPETokenizer = _mod.BPETokenizer
 
 
 class TestEstimateTokens:
@@ -35,6 +40,114 @@ class TestEstimateTokens:
         assert tokens == 50  # 200 // 4
 
 
+class TestTokenizerEngines:
+    @pytest.fixture
+    def merges(self, tmp_path):
+        f = tmp_path / "merges.txt"
+        f.write_text("#version: 0.2\nh e\nl l\nhe ll\nhell o\n")
+        return f
+
+    @pytest.fixture(autouse=True)
+    def _fresh_count_cache(self, monkeypatch):
+        monkeypatch.setattr(_mod, "_COUNT_CACHE", {})
+
+    def test_unknown_engine_rejected(self):
+        with pytest.raises(ValueError, match="unknown tokenizer engine"):
+            estimate_tokens("hello", engine="nope")
+
+    def test_merges_applied_by_rank(self, merges):
+        bpe = BPETokenizer(merges)
+        assert bpe.encode_word("hello") == ["hello"]
+        assert bpe.encode_word("help") == ["he", "l", "p"]
+
+    def test_count_splits_words_first(self, merges):
+        # "hello" + " hello" ("Ġ" is the GPT-2 symbol for a space byte)
+        assert BPETokenizer(merges).count("hello hello") == 3
+
+    def test_bundled_merges_are_gpt2(self):
+        # sha256 of GPT-2's published vocab.bpe, as pinned by tiktoken
+        digest = hashlib.sha256(_mod.BPE_MERGES_PATH.read_bytes()).hexdigest()
+        assert digest == "1ce1664773c50f3e0cc8842619a93edc4624525b728b188a9e0be33b7726adc5"
+        assert len(_mod.load_bpe().ranks) == 50000
+
+    # Expected counts are GPT-2's, from tiktoken with the same ranks
+    @pytest.mark.parametrize("text,expected", [
+        ("The quick brown fox jumps over the lazy dog. It's 2024, and we're indexing repositories!", 21),
+        ("def load(path):\n    with open(path) as fh:\n        return [line.rstrip() for line in fh]\n", 40),
+        ("| Component | Owns | Depends On |\n|---|---|---|\n| api | routes | db |\n", 27),
+        ("今天天气很好，我们一起去公园散步吧。", 34),
+        ("Café naïve résumé — Deploy 🚀 done ✅", 15),
+    ])
+    def test_bpe_matches_gpt2(self, text, expected):
+        assert estimate_tokens(text, engine="bpe") == expected
+
+    def test_bpe_counts_cached_by_content(self, monkeypatch):
+        calls = []
+
+        def spy(text):
+            calls.append(text)
+            return 7
+
+        monkeypatch.setitem(_mod.ENGINES, "bpe", spy)
+        assert estimate_tokens("same text", engine="bpe") == 7
+        assert estimate_tokens("same text", engine="bpe") == 7
+        assert estimate_tokens("other text", engine="bpe") == 7
+        assert calls == ["same text", "other text"]
+
+    def test_missing_merges_falls_back_to_bytes(self, tmp_path, monkeypatch, capsys):
+        monkeypatch.setattr(_mod, "BPE_MERGES_PATH", tmp_path / "missing.txt")
+        assert estimate_tokens("abcdefgh", engine="bpe") == 2
+        assert "WARNING" in capsys.readouterr().err
+
+    def test_validate_with_bpe(self, tmp_repo):
+        (tmp_repo / "CLAUDE.md").write_text("# Boot\nStack: Python\n")
+        result = validate(str(tmp_repo), engine="bpe")
+        assert result["engine"] == "bpe"
+        assert result["files"]["CLAUDE.md"]["tokens"] > 0
+
+
+class TestByteClassEstimator:
+    def test_histogram(self):
+        hist = _mod.byte_class_histogram("ab 12, cd\né!".encode())
+        assert hist == {
+            "bytes": 13, "letters": 4, "letter_runs": 2, "digits": 2, "digit_runs": 1,
+            "space_runs": 2, "newlines": 1, "punct": 2, "punct_runs": 2,
+            "multibyte2": 1, "multibyte3": 0,
+        }
+
+    def test_runs_at_start(self):
+        assert _mod.byte_class_histogram(b"word")["letter_runs"] == 1
+        assert _mod.byte_class_histogram("日本".encode())["multibyte3"] == 2
+
+    def test_fenced_code_split_out(self):
+        prose, code, inside = _mod._split_fenced(b"intro\n```py\nx = 1\n```\nafter\n")
+        assert inside == 0
+        assert b"".join(code) == b"\nx = 1\n"
+        assert b"".join(prose) == b"intro\n```py```\nafter\n"
+
+    @pytest.mark.parametrize("text", [
+        (pathlib.Path(_mod.__file__).parent.parent / "references" / "templates.md").read_text(),
+        "| Component | Owns | Depends On |\n|---|---|---|\n" * 30,
+        "## Setup\n```python\ndef f(x):\n    return {k: v for k, v in x.items()}\n```\n" * 20,
+        "今天天气很好，我们一起去公园散步吧。这个项目的目标是为代码仓库建立索引，以便快速加载上下文。",
+    ])
+    def test_closer_to_bpe_than_bytes(self, text):
+        reference = estimate_tokens(text, engine="bpe")
+        classes = estimate_tokens(text, engine="classes")
+        assert abs(classes - reference) < abs(estimate_tokens(text) - reference)
+
+    def test_fit_recovers_linear_reference(self):
+        texts = ["word " * n + "1, 2; 3\n" * (n % 5) for n in range(1, 60)]
+        weights = _mod.fit_class_weights([(t, t.encode()) for t in texts], reference="bytes", ridge=1e-9)
+        predicted = [_mod._score(_mod.byte_class_histogram(t.encode()), weights) for t in texts]
+        assert all(abs(p - estimate_tokens(t)) < 1 for p, t in zip(predicted, texts))
+
+    def test_refit_reproduces_class_weights(self):
+        samples = _mod.calibration_samples(pathlib.Path(__file__).parent / "data" / "calibration")
+        for region in ("prose", "code"):
+            assert _mod.fit_class_weights(samples[region]) == pytest.approx(_mod.CLASS_WEIGHTS[region], abs=2e-4)
+
+
 class TestCheckFile:
     def test_missing_file(self, tmp_path):
         result = check_file(tmp_path / "nonexistent.md")
@@ -62,15 +175,20 @@ class TestCheckFile:
         result = check_file(f)
         assert result["budget"] == 5000  # MEMORY_DEFAULT_BUDGET
 
-    def test_oversized_file_marked_over_budget(self, tmp_path):
-        """S3: Files exceeding _MAX_FILE_BYTES should be flagged as over budget."""
+    def test_oversized_file_counted(self, tmp_path):
+        """Files exceeding _MAX_FILE_BYTES are counted, not rejected."""
         f = tmp_path / "CLAUDE.md"
         f.write_bytes(b"x" * 1_000_001)
         result = check_file(f)
         assert result["exists"] is True
+        assert result["tokens"] == 250_000
         assert result["over"] is True
-        assert result["pct"] is None
-        assert result["error"] == "file too large to check"
+        assert "error" not in result
+
+    def test_bytes_engine_uses_size_without_decoding(self, tmp_path):
+        f = tmp_path / "CLAUDE.md"
+        f.write_bytes(b"\xff" * 8)  # would decode to 8 U+FFFD (24 bytes)
+        assert check_file(f)["tokens"] == 2
 
     @pytest.mark.skipif(
         not hasattr(os, "getuid") or os.getuid() == 0,
@@ -98,6 +216,424 @@ class TestCheckFile:
         assert result.get("error") != "file too large to check"
 
 
+class TestRecursiveValidate:
+    @pytest.fixture
+    def tree(self, claude_dir):
+        memory = claude_dir / ".claude" / "memory"
+        for sub, names in {"services": ["zeta", "api", "architecture"], "adr": ["0002", "0001"]}.items():
+            (memory / sub).mkdir()
+            for name in names:
+                (memory / sub / f"{name}.md").write_text(f"# {name}\n" + "word " * 20)
+        return claude_dir
+
+    def test_nested_files_found_in_sorted_order(self, tree):
+        result = validate(str(tree))
+        assert list(result["files"]) == [
+            "CLAUDE.md",
+            "memory/adr/0001.md",
+            "memory/adr/0002.md",
+            "memory/architecture.md",
+            "memory/conventions.md",
+            "memory/services/api.md",
+            "memory/services/architecture.md",
+            "memory/services/zeta.md",
+        ]
+
+    def test_budget_matched_on_relative_path(self, tree, monkeypatch):
+        monkeypatch.setitem(BUDGETS, "adr/0001.md", 10)
+        result = validate(str(tree))
+        assert result["files"]["memory/architecture.md"]["budget"] == BUDGETS["architecture.md"]
+        assert result["files"]["memory/services/architecture.md"]["budget"] == _mod.MEMORY_DEFAULT_BUDGET
+        assert result["files"]["memory/adr/0001.md"]["budget"] == 10
+        assert result["errors"] == ["memory/adr/0001.md: 26 > 10"]
+
+    def test_nested_files_count_toward_l2_total(self, tree):
+        (tree / ".claude" / "memory" / "adr" / "big.md").write_text("abcd" * L2_TOTAL_BUDGET)
+        result = validate(str(tree))
+        assert any("L2 total" in e for e in result["errors"])
+
+    def test_thread_pool_matches_serial(self, tree):
+        assert validate(str(tree), workers=8) == validate(str(tree), workers=1)
+
+
+class TestSectionBreakdown:
+    _doc = (
+        "intro line\n"                      # 11 bytes
+        "# Title\n"                          # 8
+        "## Small\n" + "abcd" * 2 + "\n"    # 10 + 9
+        "## Big ##\n" + "abcd" * 30 + "\n"  # 11 + 121
+        "```python\n" + "# not a heading\n" + "abcd" * 10 + "\n```\n"
+        "tail\n"
+    )
+
+    def _by_title(self, sections, kind="section"):
+        return {e["title"]: e for e in sections if e["kind"] == kind}
+
+    def test_sections_split_on_headings(self):
+        sections = _mod.scan_sections(self._doc.splitlines(keepends=True))
+        by_title = self._by_title(sections)
+        assert set(by_title) == {"", "Title", "Small", "Big"}
+        assert by_title[""]["level"] == 0
+        assert by_title["Small"] == {"kind": "section", "title": "Small", "level": 2, "line": 3, "tokens": 19 // 4}
+        assert by_title["Big"]["line"] == 5
+
+    @pytest.mark.parametrize("line,title", [
+        ("## C#\n", "C#"),
+        ("## F# Notes ##\n", "F# Notes"),
+        ("## Closed ###   \n", "Closed"),
+    ])
+    def test_closing_hashes_need_preceding_space(self, line, title):
+        sections = _mod.scan_sections(["intro\n", line, "body\n"])
+        assert title in self._by_title(sections)
+
+    def test_largest_first(self):
+        sections = _mod.scan_sections(self._doc.splitlines(keepends=True))
+        tokens = [e["tokens"] for e in sections]
+        assert tokens == sorted(tokens, reverse=True)
+        assert sections[0]["title"] == "Big"
+
+    def test_code_block_counted_separately(self):
+        sections = _mod.scan_sections(self._doc.splitlines(keepends=True))
+        (code,) = [e for e in sections if e["kind"] == "code"]
+        assert code["lang"] == "python"
+        assert code["title"] == "Big"
+        assert code["line"] == 7
+        assert code["tokens"] == (10 + 16 + 41 + 4) // 4
+        # The fence is not part of the section, and "tail" after it is
+        assert self._by_title(sections)["Big"]["tokens"] == (11 + 121 + 5) // 4
+
+    def test_unclosed_fence_runs_to_end(self):
+        sections = _mod.scan_sections(["# A\n", "~~~\n", "# inside\n", "more\n"])
+        assert [e["kind"] for e in sections] == ["code", "section"]
+        assert sections[0]["title"] == "A"
+
+    def test_longer_closing_fence_required(self):
+        lines = ["````\n", "```\n", "# still code\n", "````\n", "# After\n"]
+        titles = [(e["kind"], e["title"]) for e in _mod.scan_sections(lines)]
+        assert ("section", "still code") not in titles
+        assert ("section", "After") in titles
+
+    def test_validate_sections_opt_in(self, claude_dir):
+        assert "sections" not in validate(str(claude_dir))["files"]["CLAUDE.md"]
+        result = validate(str(claude_dir), sections=True)
+        arch = result["files"]["memory/architecture.md"]["sections"]
+        assert arch[0]["title"] == "Architecture"
+
+
+class TestCompactClaudeMd:
+    @pytest.fixture
+    def repo(self, tmp_path):
+        (tmp_path / ".claude" / "memory").mkdir(parents=True)
+        (tmp_path / ".claude" / "memory" / "conventions.md").write_text(
+            "# Conventions\n\n## Naming\nsnake_case\n\n<!-- USER -->\nmy rule\n"
+        )
+        (tmp_path / "CLAUDE.md").write_text(
+            "# demo\nA demo repo.\n\n"
+            "## Stack\n" + "Python " * 100 + "\n\n"
+            "## Commands\n```bash\n## not a heading\nmake\n```\n\n"
+            "## Glossary\n" + "| term | def |\n" * 60 + "\n"
+            "## Data Flow\n" + "request goes in " * 50 + "\n\n"
+            "## Commit Style\n" + "imperative mood " * 30 + "\n\n"
+            "## Context Loading\n1. cat .claude/memory/architecture.md\n\n"
+            "<!-- USER: Add notes below -->\n## My notes\nkeep me\n"
+        )
+        return tmp_path
+
+    def _memory(self, repo, name):
+        return (repo / ".claude" / "memory" / name).read_text()
+
+    def test_within_budget_untouched(self, claude_dir):
+        before = (claude_dir / "CLAUDE.md").read_text()
+        report = _mod.compact_claude_md(str(claude_dir))
+        assert report["moved"] == [] and report["fixed"] is True
+        assert (claude_dir / "CLAUDE.md").read_text() == before
+
+    def test_largest_ordinary_sections_move_first(self, repo):
+        report = _mod.compact_claude_md(str(repo))
+        assert report["fixed"] is True
+        assert [m["title"] for m in report["moved"]] == ["Glossary", "Data Flow"]
+        assert report["tokens_after"] <= BUDGETS["CLAUDE.md"] < report["tokens_before"]
+        claude = (repo / "CLAUDE.md").read_text()
+        assert "## Glossary" not in claude and "## Data Flow" not in claude
+        assert "## Stack" in claude and "## Commit Style" in claude
+        assert validate(str(repo))["valid"] is True
+
+    def test_sections_routed_by_heading(self, repo):
+        report = _mod.compact_claude_md(str(repo))
+        assert {m["title"]: m["to"] for m in report["moved"]} == {
+            "Glossary": "memory/glossary.md",
+            "Data Flow": "memory/architecture.md",
+        }
+        glossary = self._memory(repo, "glossary.md")
+        assert glossary.startswith("# Glossary\n\n## Glossary\n")
+        assert glossary.endswith("<!-- USER -->\n")
+
+    @pytest.mark.parametrize("title,target", [
+        ("Terms", "glossary.md"),
+        ("Testing", "conventions.md"),
+        ("Code Formatting", "conventions.md"),
+        ("Git Workflow", "conventions.md"),
+        ("Information Flow", "architecture.md"),
+        ("Terminal UI", "architecture.md"),
+        ("Latest Changes", "architecture.md"),
+        ("Digital Signing", "architecture.md"),
+        ("Determinism", "architecture.md"),
+        ("Contest Mode", "architecture.md"),
+    ])
+    def test_route_keywords_match_whole_words(self, title, target):
+        assert _mod._l2_target(title) == target
+
+    def test_inserted_above_target_user_block(self, repo, monkeypatch):
+        monkeypatch.setitem(BUDGETS, "CLAUDE.md", 100)
+        _mod.compact_claude_md(str(repo))
+        conventions = self._memory(repo, "conventions.md")
+        assert conventions.index("## Commit Style") < conventions.index("<!-- USER -->")
+        assert conventions.endswith("<!-- USER -->\nmy rule\n")
+
+    def test_user_block_pinned_and_context_loading_kept(self, repo, monkeypatch):
+        monkeypatch.setitem(BUDGETS, "CLAUDE.md", 1)
+        report = _mod.compact_claude_md(str(repo))
+        assert report["fixed"] is False
+        assert [m["title"] for m in report["moved"]][-2:] == ["Stack", "Commands"]
+        claude = (repo / "CLAUDE.md").read_text()
+        assert claude.startswith("# demo\nA demo repo.\n")
+        assert "## Context Loading" in claude
+        assert claude.endswith("<!-- USER: Add notes below -->\n## My notes\nkeep me\n")
+        assert "## not a heading" in self._memory(repo, "architecture.md")
+
+    def test_target_budget_respected(self, repo, monkeypatch):
+        monkeypatch.setitem(BUDGETS, "glossary.md", 50)
+        report = _mod.compact_claude_md(str(repo))
+        assert report["skipped"][0]["title"] == "Glossary"
+        assert "glossary.md would exceed" in report["skipped"][0]["reason"]
+        assert not (repo / ".claude" / "memory" / "glossary.md").exists()
+
+    def test_l2_total_respected(self, repo, monkeypatch):
+        monkeypatch.setattr(_mod, "L2_TOTAL_BUDGET", 20)
+        report = _mod.compact_claude_md(str(repo))
+        assert report["moved"] == []
+        assert report["fixed"] is False
+        assert all("L2 total" in m["reason"] for m in report["skipped"])
+
+    def test_cli_fix(self, repo):
+        result = subprocess.run(
+            [sys.executable, str(TestCLI._script), "--fix", "--no-cache", str(repo)],
+            capture_output=True,
+            text=True,
+        )
+        assert result.returncode == 0, result.stdout
+        assert "Moved '## Glossary'" in result.stdout
+        assert "Valid: True" in result.stdout
+
+
+class TestBudgetWatcher:
+    def test_initial_result_matches_validate(self, claude_dir):
+        assert _mod.BudgetWatcher(str(claude_dir)).result() == validate(str(claude_dir))
+
+    def test_only_changed_files_recounted(self, claude_dir, monkeypatch):
+        watcher = _mod.BudgetWatcher(str(claude_dir))
+        counted = []
+        real = _mod.check_file
+
+        def spy(path, *args, **kwargs):
+            counted.append(path.name)
+            return real(path, *args, **kwargs)
+
+        monkeypatch.setattr(_mod, "check_file", spy)
+        (claude_dir / ".claude" / "memory" / "conventions.md").write_text("word " * 400)
+        assert watcher.update({"memory/conventions.md"}) == ["memory/conventions.md"]
+        assert counted == ["conventions.md"]
+        assert watcher.result() == validate(str(claude_dir))
+
+    def test_running_l2_total_tracks_changes(self, claude_dir):
+        memory = claude_dir / ".claude" / "memory"
+        watcher = _mod.BudgetWatcher(str(claude_dir))
+        (memory / "adr").mkdir()
+        (memory / "adr" / "big.md").write_text("abcd" * L2_TOTAL_BUDGET)
+        assert watcher.update({"memory/adr"}) == ["memory/adr/big.md"]
+        assert any("L2 total" in e for e in watcher.result()["errors"])
+        (memory / "adr" / "big.md").unlink()
+        watcher.update({"memory/adr/big.md"})
+        assert watcher.result() == validate(str(claude_dir))
+
+    def test_unchanged_content_not_reported(self, claude_dir):
+        watcher = _mod.BudgetWatcher(str(claude_dir))
+        os.utime(claude_dir / "CLAUDE.md")
+        assert watcher.update({"CLAUDE.md"}) == []
+
+    def test_overflow_rechecks_everything(self, claude_dir):
+        watcher = _mod.BudgetWatcher(str(claude_dir))
+        (claude_dir / "CLAUDE.md").write_text("word " * 600)
+        (claude_dir / ".claude" / "memory" / "new.md").write_text("# New\n")
+        assert watcher.update({"."}) == ["CLAUDE.md", "memory/new.md"]
+
+
+class TestChangeSources:
+    def _sources(self, root):
+        sources = [_mod._PollSource(root, interval=0.01)]
+        if sys.platform.startswith("linux"):
+            sources.append(_mod._InotifySource(root))
+        return sources
+
+    def test_sources_report_tracked_changes(self, claude_dir):
+        for source in self._sources(claude_dir):
+            try:
+                (claude_dir / "README.md").write_text("not tracked")
+                (claude_dir / "CLAUDE.md").write_text("# Changed\n")
+                (claude_dir / ".claude" / "memory" / "architecture.md").unlink()
+                seen = set()
+                while "memory/architecture.md" not in seen or "CLAUDE.md" not in seen:
+                    more = source.wait(2)
+                    assert more, f"{type(source).__name__} missed a change: {seen}"
+                    seen |= more
+                assert "README.md" not in seen
+            finally:
+                source.close()
+            (claude_dir / ".claude" / "memory" / "architecture.md").write_text("# Architecture\n")
+
+    @pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux-only")
+    def test_inotify_follows_new_directories(self, claude_dir):
+        source = _mod._InotifySource(claude_dir)
+        try:
+            (claude_dir / ".claude" / "memory" / "adr").mkdir()
+            assert "memory/adr" in source.wait(2)
+            (claude_dir / ".claude" / "memory" / "adr" / "0001.md").write_text("# ADR\n")
+            assert "memory/adr/0001.md" in source.wait(2)
+        finally:
+            source.close()
+
+    def test_watch_reports_initial_and_burst(self, claude_dir):
+        results = []
+        thread = threading.Thread(
+            target=_mod.watch,
+            kwargs={
+                "root": str(claude_dir),
+                "on_change": lambda r, changed: results.append((r["valid"], changed)),
+                "poll": True,
+                "debounce": 0.1,
+                "max_updates": 1,
+            },
+        )
+        thread.start()
+        for _ in range(200):
+            if results:
+                break
+            threading.Event().wait(0.01)
+        for i in range(3):
+            (claude_dir / "CLAUDE.md").write_text("word " * (600 + i))
+        thread.join(10)
+        assert not thread.is_alive()
+        assert results == [(True, []), (False, ["CLAUDE.md"])]
+
+
+class TestCensus:
+    @pytest.fixture
+    def tree(self, tmp_path):
+        (tmp_path / "src" / "app" / "core" / "deep").mkdir(parents=True)
+        (tmp_path / "src" / "app" / "core" / "deep" / "x.py").write_text("def f():\n    return 1\n" * 40)
+        (tmp_path / "src" / "main.py").write_text("import os\n" * 100)
+        (tmp_path / "README.md").write_text("Some prose about the project.\n" * 20)
+        (tmp_path / "logo.png").write_bytes(b"\x89PNG" + b"\0" * 100)
+        (tmp_path / "blob").write_bytes(b"abc\0def")
+        (tmp_path / "NOTICE").write_text("plain text\n")
+        (tmp_path / "node_modules" / "pkg").mkdir(parents=True)
+        (tmp_path / "node_modules" / "pkg" / "index.js").write_text("x" * 5000)
+        (tmp_path / "build").mkdir()
+        (tmp_path / "build" / "out.js").write_text("y" * 5000)
+        (tmp_path / ".gitignore").write_text("build/\n")
+        return tmp_path
+
+    def test_skips_binaries_vendored_and_ignored(self, tree):
+        c = _mod.census(str(tree))
+        paths = {f["path"] for f in c["files"]}
+        assert paths == {"src/app/core/deep/x.py", "src/main.py", "README.md", "NOTICE", ".gitignore"}
+        assert c["skipped_binary"] == 2
+        assert c["languages"]["Other"]["files"] == 2
+
+    def test_rollups_stop_at_depth(self, tree):
+        c = _mod.census(str(tree), depth=2)
+        assert set(c["directories"]) == {".", "src", "src/app"}
+        assert c["directories"]["src/app"]["files"] == 1
+        assert c["directories"]["src"]["tokens"] == sum(
+            f["tokens"] for f in c["files"] if f["path"].startswith("src/")
+        )
+        assert c["directories"]["."] == c["total"]
+        assert c["total"]["bytes"] == sum(f["bytes"] for f in c["files"])
+
+    def test_tokens_scale_bytes_by_sampled_ratio(self, tree):
+        c = _mod.census(str(tree), engine="bpe")
+        python = c["languages"]["Python"]
+        assert python["sampled"] == 2
+        for f in c["files"]:
+            ratio = c["languages"][f["language"]]["ratio"]
+            assert f["tokens"] == pytest.approx(f["bytes"] * ratio, abs=1)
+        assert [f["tokens"] for f in c["files"]] == sorted((f["tokens"] for f in c["files"]), reverse=True)
+
+    def test_samples_are_capped_per_language(self, tmp_path, monkeypatch):
+        for i in range(12):
+            (tmp_path / f"m{i:02}.py").write_text("x = 1\n" * (i + 1))
+        seen = []
+        real = _mod.estimate_tokens
+        monkeypatch.setattr(_mod, "estimate_tokens", lambda text, engine: seen.append(text) or real(text, engine))
+        c = _mod.census(str(tmp_path))
+        assert len(seen) == _mod.CENSUS_SAMPLES_PER_LANGUAGE == c["languages"]["Python"]["sampled"]
+        assert c["total"]["files"] == 12
+
+    def test_unknown_engine_raises(self, tmp_path):
+        with pytest.raises(ValueError):
+            _mod.census(str(tmp_path), engine="nope")
+
+
+class TestStreamingCount:
+    _text = "# Glossary\n\n" + "".join(
+        f"- term{i}: définition 日本語 {'x' * (i % 7)}  \n   \n\tnext_{i}\r\n" for i in range(400)
+    )
+
+    @pytest.fixture(autouse=True)
+    def _fresh_count_cache(self, monkeypatch):
+        monkeypatch.setattr(_mod, "_COUNT_CACHE", {})
+
+    @pytest.mark.parametrize("chunk", [17, 64, 1000])
+    def test_stream_matches_whole_file(self, tmp_path, monkeypatch, chunk):
+        f = tmp_path / "glossary.md"
+        f.write_bytes(self._text.encode("utf-8"))
+        monkeypatch.setattr(_mod, "_MAX_FILE_BYTES", 0)
+        monkeypatch.setattr(_mod, "_STREAM_CHUNK_BYTES", chunk)
+        expected = _mod.load_bpe().count(self._text)
+        assert _mod.count_file_tokens(f, engine="bpe") == expected
+
+    @pytest.mark.parametrize("chunk", [17, 64, 1000])
+    def test_classes_stream_keeps_fence_state(self, tmp_path, monkeypatch, chunk):
+        text = "".join(
+            f"## Step {i}\nRun the tool, then check.\n```python\ndef f_{i}(x):\n    return x * {i}\n```\n"
+            for i in range(60)
+        )
+        f = tmp_path / "guide.md"
+        f.write_bytes(text.encode("utf-8"))
+        monkeypatch.setattr(_mod, "_MAX_FILE_BYTES", 0)
+        monkeypatch.setattr(_mod, "_STREAM_CHUNK_BYTES", chunk)
+        assert _mod.count_file_tokens(f, engine="classes") == estimate_tokens(text, engine="classes")
+
+    def test_large_file_streamed(self, tmp_path, monkeypatch):
+        f = tmp_path / "glossary.md"
+        f.write_bytes(self._text.encode("utf-8"))
+        monkeypatch.setattr(_mod, "_MAX_FILE_BYTES", 100)
+
+        def fail(*args, **kwargs):
+            raise AssertionError("large files must not be read whole")
+
+        monkeypatch.setattr(_mod, "estimate_tokens", fail)
+        assert check_file(f, engine="bpe")["tokens"] > 0
+
+    def test_split_point_starts_a_whitespace_run(self):
+        text = "alpha beta  \n  gamma\n"
+        assert text[_mod._split_point(text):] == "  \n  gamma\n"
+
+    def test_split_point_none_without_newline(self):
+        assert _mod._split_point("no newline here") == 0
+        assert _mod._split_point("trailing only\n  ") == 0
+
+
 class TestValidate:
     def test_empty_directory(self, tmp_repo):
         result = validate(str(tmp_repo))
@@ -151,6 +687,134 @@ class TestValidate:
         assert result["valid"] is True
 
 
+    def test_profile_off_by_default(self, claude_dir):
+        result = validate(str(claude_dir))
+        assert "profile" not in result
+        assert all("io" not in info for info in result["files"].values())
+
+    def test_profile_reports_per_file_io(self, claude_dir):
+        result = validate(str(claude_dir), engine="bpe", profile=True)
+        for name, info in result["files"].items():
+            path = claude_dir / (name if name == "CLAUDE.md" else f".claude/{name}")
+            assert info["io"]["bytes_read"] == path.stat().st_size
+            assert info["io"]["read_ms"] >= 0
+            assert info["io"]["cache"] is None
+        prof = result["profile"]
+        assert prof["files"] == len(result["files"])
+        assert prof["bytes_read"] == sum(info["io"]["bytes_read"] for info in result["files"].values())
+        assert prof["wall_ms"] >= 0 and prof["cache_hits"] == prof["cache_misses"] == 0
+
+    def test_bytes_engine_reads_nothing(self, claude_dir):
+        result = validate(str(claude_dir), profile=True)
+        assert result["profile"]["bytes_read"] == 0
+
+
+def _age(*files, seconds=3600):
+    """Push mtimes into the past so the manifest trusts them."""
+    for f in files:
+        past = os.stat(f).st_mtime - seconds
+        os.utime(f, (past, past))
+
+
+class TestTokenManifest:
+    @pytest.fixture
+    def repo(self, claude_dir, monkeypatch):
+        monkeypatch.setattr(_mod, "_COUNT_CACHE", {})
+        files = [claude_dir / "CLAUDE.md", *sorted((claude_dir / ".claude" / "memory").glob("*.md"))]
+        _age(*files)
+        return claude_dir
+
+    @pytest.fixture
+    def spy(self, monkeypatch):
+        calls = []
+        real = _mod.ENGINES["bpe"]
+
+        def count(text):
+            calls.append(text)
+            return real(text)
+
+        monkeypatch.setitem(_mod.ENGINES, "bpe", count)
+        return calls
+
+    def _manifest(self, root):
+        return json.loads((root / _mod.MANIFEST_PATH).read_text())
+
+    def test_disabled_by_default(self, repo):
+        validate(str(repo), engine="bpe")
+        assert not (repo / _mod.MANIFEST_PATH).exists()
+
+    def test_bytes_engine_skips_manifest(self, repo):
+        validate(str(repo), use_cache=True)
+        assert not (repo / _mod.MANIFEST_PATH).exists()
+
+    def test_manifest_records_files(self, repo):
+        result = validate(str(repo), engine="bpe", use_cache=True)
+        files = self._manifest(repo)["files"]
+        assert set(files) == {"CLAUDE.md", *(f".claude/{k}" for k in result["files"] if k.startswith("memory/"))}
+        entry = files["CLAUDE.md"]
+        assert entry["tokens"] == result["files"]["CLAUDE.md"]["tokens"]
+        assert entry["size"] == (repo / "CLAUDE.md").stat().st_size
+        assert len(entry["sha256"]) == 64
+
+    def test_unchanged_files_not_recounted(self, repo, spy):
+        first = validate(str(repo), engine="bpe", use_cache=True)
+        spy.clear()
+        _mod._COUNT_CACHE.clear()
+        second = validate(str(repo), engine="bpe", use_cache=True)
+        assert spy == []
+        assert second == first
+
+    def test_profile_counts_hits_and_misses(self, repo):
+        first = validate(str(repo), engine="bpe", use_cache=True, profile=True)["profile"]
+        assert first["cache_misses"] == first["files"] and first["cache_hits"] == 0
+        (repo / "CLAUDE.md").write_text("# Boot\nchanged\n")
+        _age(repo / "CLAUDE.md")
+        second = validate(str(repo), engine="bpe", use_cache=True, profile=True)
+        assert second["files"]["CLAUDE.md"]["io"]["cache"] == "miss"
+        assert second["profile"]["cache_hits"] == first["files"] - 1
+        assert second["profile"]["bytes_read"] == 2 * (repo / "CLAUDE.md").stat().st_size
+
+    def test_touched_file_reused_by_hash(self, repo, spy):
+        validate(str(repo), engine="bpe", use_cache=True)
+        spy.clear()
+        _mod._COUNT_CACHE.clear()
+        os.utime(repo / "CLAUDE.md")
+        validate(str(repo), engine="bpe", use_cache=True)
+        assert spy == []
+        assert self._manifest(repo)["files"]["CLAUDE.md"]["mtime_ns"] is None
+
+    def test_edited_file_recounted(self, repo, spy):
+        validate(str(repo), engine="bpe", use_cache=True)
+        spy.clear()
+        (repo / "CLAUDE.md").write_text("# Changed\n" + "word " * 50)
+        result = validate(str(repo), engine="bpe", use_cache=True)
+        assert len(spy) == 1
+        assert self._manifest(repo)["files"]["CLAUDE.md"]["tokens"] == result["files"]["CLAUDE.md"]["tokens"]
+
+    def test_deleted_file_dropped(self, repo):
+        validate(str(repo), engine="bpe", use_cache=True)
+        (repo / ".claude" / "memory" / "conventions.md").unlink()
+        validate(str(repo), engine="bpe", use_cache=True)
+        assert ".claude/memory/conventions.md" not in self._manifest(repo)["files"]
+
+    def test_corrupt_manifest_ignored(self, repo):
+        manifest = repo / _mod.MANIFEST_PATH
+        manifest.parent.mkdir(parents=True)
+        manifest.write_text("{not json")
+        expected = validate(str(repo), engine="bpe")
+        assert validate(str(repo), engine="bpe", use_cache=True) == expected
+        assert self._manifest(repo)["version"] == _mod.MANIFEST_VERSION
+
+    def test_foreign_tokens_entry_ignored(self, repo):
+        validate(str(repo), engine="bpe", use_cache=True)
+        manifest = repo / _mod.MANIFEST_PATH
+        data = json.loads(manifest.read_text())
+        data["files"]["CLAUDE.md"]["tokens"] = "many"
+        manifest.write_text(json.dumps(data))
+        result = validate(str(repo), engine="bpe", use_cache=True)
+        assert isinstance(result["files"]["CLAUDE.md"]["tokens"], int)
+
+
 class TestCLI:
     _script = (
         pathlib.Path(__file__).resolve().parent.parent
@@ -179,6 +843,84 @@ class TestCLI:
         assert result.returncode == 0
         assert "Valid: True" in result.stdout
 
+    def test_engine_flag(self, tmp_repo):
+        (tmp_repo / "CLAUDE.md").write_text("# Boot\nStack: Python\n")
+        result = subprocess.run(
+            [sys.executable, str(self._script), "--engine", "bpe", str(tmp_repo)],
+            capture_output=True,
+            text=True,
+        )
+        assert result.returncode == 0
+        assert "Valid: True" in result.stdout
+
+    def test_no_cache_flag(self, tmp_repo):
+        (tmp_repo / "CLAUDE.md").write_text("# Boot\n")
+        for extra in ([], ["--no-cache"]):
+            subprocess.run(
+                [sys.executable, str(self._script), "--engine", "bpe", *extra, str(tmp_repo)],
+                capture_output=True,
+                text=True,
+            )
+            assert (tmp_repo / ".claude").exists() is not bool(extra)
+            shutil.rmtree(tmp_repo / ".claude", ignore_errors=True)
+
+    def test_sections_flag(self, tmp_repo):
+        (tmp_repo / "CLAUDE.md").write_text("# Boot\n\n## Notes\n" + "word " * 600)
+        result = subprocess.run(
+            [sys.executable, str(self._script), "--sections", str(tmp_repo)],
+            capture_output=True,
+            text=True,
+        )
+        assert result.returncode == 1
+        lines = result.stdout.splitlines()
+        notes = next(i for i, line in enumerate(lines) if "## Notes (line 3)" in line)
+        assert notes < next(i for i, line in enumerate(lines) if "# Boot (line 1)" in line)
+
+    def test_watch_flag(self, claude_dir):
+        proc = subprocess.Popen(
+            [sys.executable, str(self._script), "--watch", str(claude_dir)],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        guard = threading.Timer(30, proc.kill)  # never hang the suite on a missed event
+        guard.start()
+        try:
+            assert proc.stdout.readline().startswith("Valid: True")
+            (claude_dir / "CLAUDE.md").write_text("word " * 600)
+            lines = iter(proc.stdout.readline, "")
+            assert any(line.startswith("--- ") and "changed: CLAUDE.md" in line for line in lines)
+            assert next(lines).startswith("Valid: False")
+        finally:
+            guard.cancel()
+            proc.terminate()
+            proc.wait(10)
+
+    def test_census_flag(self, tmp_repo):
+        (tmp_repo / "pkg" / "sub").mkdir(parents=True)
+        (tmp_repo / "pkg" / "sub" / "mod.py").write_text("print('hi')\n" * 50)
+        result = subprocess.run(
+            [sys.executable, str(self._script), "--census", "--depth", "1", str(tmp_repo)],
+            capture_output=True,
+            text=True,
+        )
+        assert result.returncode == 0
+        assert "engine: classes" in result.stdout
+        assert "  Python: 1 files" in result.stdout
+        assert "    pkg/:" in result.stdout and "sub/:" not in result.stdout
+
+    def test_json_flag(self, claude_dir):
+        (claude_dir / "CLAUDE.md").write_text("word " * 600)
+        result = subprocess.run(
+            [sys.executable, str(self._script), "--json", "--engine", "bpe", str(claude_dir)],
+            capture_output=True,
+            text=True,
+        )
+        assert result.returncode == 1
+        data = json.loads(result.stdout)
+        assert data["valid"] is False and data["engine"] == "bpe"
+        assert data["files"]["CLAUDE.md"]["io"]["cache"] == "miss"
+        assert set(data["profile"]) == {"wall_ms", "read_ms", "bytes_read", "files", "cache_hits", "cache_misses"}
+
     def test_over_budget_exits_nonzero(self, tmp_repo):
         """Over budget → exit 1."""
         (tmp_repo / "CLAUDE.md").write_text("word " * 600)
@@ -0,0 +1,243 @@
+"""Tests for extract-manifests.py."""
+
+import json
+import pathlib
+import subprocess
+import sys
+
+import pytest
+from helpers import import_script
+
+_mod = import_script("extract-manifests")
+extract_manifests = _mod.extract_manifests
+Dependency = _mod.Dependency
+
+_SCRIPT_PATH = (
+    pathlib.Path(__file__).resolve().parent.parent
+    / "skills" / "repo-indexer" / "scripts" / "extract-manifests.py"
+)
+
+PYPROJECT = '''\
+[project]
+name = "svc"
+description = """
+Multi-line description # with a hash
+"""
+requires-python = ">=3.10"
+dependencies = [
+    "fastapi>=0.110,<1",  # web layer
+    "SQLAlchemy[asyncio]~=2.0.25",
+    "httpx; python_version >= '3.10'",
+]
+
+[project.optional-dependencies]
+dev = ["pytest>=8.0"]
+docs = ["mkdocs"]
+
+[tool.ruff]
+line-length = 120
+lint.select = ["E", "F"]
+'''
+
+CARGO = '''\
+[package]
+name = "engine"
+edition = "2021"
+rust-version = "1.74"
+
+[dependencies]
+serde = { version = "1.0.195", features = ["derive"] }
+tokio = { version = "1", features = ["full"] }
+anyhow = "1.0"
+
+[dev-dependencies]
+criterion = "0.5"
+
+[[bench]]
+name = "throughput"
+harness = false
+'''
+
+
+class TestParsers:
+    def test_pyproject(self, tmp_path):
+        (tmp_path / "pyproject.toml").write_text(PYPROJECT)
+        result = extract_manifests(str(tmp_path))
+        assert result["tech_stack"] == [
+            "Python 3.10", "FastAPI 0.110", "SQLAlchemy 2.0.25", "pytest 8.0", "httpx", "mkdocs",
+        ]
+        assert result["manifests"] == ["pyproject.toml"]
+
+    def test_poetry(self, tmp_path):
+        (tmp_path / "pyproject.toml").write_text(
+            '[tool.poetry.dependencies]\npython = "^3.11"\ndjango = "^5.0"\n'
+            '[tool.poetry.group.dev.dependencies]\nblack = "^24.1"\n'
+        )
+        assert extract_manifests(str(tmp_path))["tech_stack"] == ["Python 3.11", "Django 5.0", "black 24.1"]
+
+    def test_setup_cfg_and_requirements(self, tmp_path):
+        (tmp_path / "setup.cfg").write_text(
+            "[options]\npython_requires = >=3.9\ninstall_requires =\n    flask>=3.0\n    requests\n"
+        )
+        (tmp_path / "requirements.txt").write_text("# pinned\ncelery==5.3.6\n-r base.txt\ngit+https://x/y.git\n")
+        (tmp_path / "requirements-dev.txt").write_text("ruff==0.4.0\n")
+        result = extract_manifests(str(tmp_path))
+        assert result["manifests"] == ["setup.cfg", "requirements-dev.txt", "requirements.txt"]
+        assert result["tech_stack"] == ["Python 3.9", "Flask 3.0", "Celery 5.3.6", "requests", "ruff 0.4.0"]
+
+    def test_dev_names_match_whole_tokens(self, tmp_path):
+        (tmp_path / "pyproject.toml").write_text(
+            '[project]\ndependencies = []\n[project.optional-dependencies]\n'
+            'test-utils = ["aaa-dev"]\ndocker = ["gunicorn"]\ndecimal = ["cdecimal"]\n'
+        )
+        (tmp_path / "requirements-ci.txt").write_text("zzz-ci\n")
+        (tmp_path / "requirements.docker.txt").write_text("yyy\n")
+        assert extract_manifests(str(tmp_path))["tech_stack"] == [
+            "Python", "gunicorn", "cdecimal", "yyy", "aaa-dev", "zzz-ci",
+        ]
+
+    def test_package_json_typescript(self, tmp_path):
+        (tmp_path / "package.json").write_text(json.dumps({
+            "engines": {"node": ">=20"},
+            "dependencies": {"left-pad": "1.3.0", "react": "^18.2.0", "next": "14.1.0"},
+            "devDependencies": {"typescript": "~5.3.3", "vitest": "^1.2.0"},
+        }))
+        assert extract_manifests(str(tmp_path))["tech_stack"] == [
+            "TypeScript 5.3.3", "Node.js 20", "React 18.2.0", "Next.js 14.1.0", "Vitest 1.2.0", "left-pad 1.3.0",
+        ]
+
+    def test_tsconfig_implies_typescript(self, tmp_path):
+        (tmp_path / "package.json").write_text("{}")
+        (tmp_path / "tsconfig.json").write_text("{}")
+        assert extract_manifests(str(tmp_path))["tech_stack"] == ["TypeScript", "Node.js"]
+
+    def test_cargo(self, tmp_path):
+        (tmp_path / "Cargo.toml").write_text(CARGO)
+        assert extract_manifests(str(tmp_path))["tech_stack"] == [
+            "Rust 1.74", "Serde 1.0.195", "Tokio 1", "anyhow 1.0", "criterion 0.5",
+        ]
+
+    def test_go_mod(self, tmp_path):
+        (tmp_path / "go.mod").write_text(
+            "module example.com/api\n\ngo 1.22\n\nrequire github.com/spf13/cobra v1.8.0\n\nrequire (\n"
+            "\tgithub.com/gin-gonic/gin v1.9.1\n"
+            "\tgolang.org/x/sys v0.16.0 // indirect\n"
+            "\tgithub.com/google/uuid v1.6.0\n)\n"
+        )
+        assert extract_manifests(str(tmp_path))["tech_stack"] == [
+            "Go 1.22", "Cobra 1.8.0", "Gin 1.9.1", "github.com/google/uuid 1.6.0",
+        ]
+
+    @pytest.mark.parametrize("text", [
+        'tool = { poetry = "yes" }\n',
+        '[project]\ndependencies = { requests = "*" }\noptional-dependencies = ["pytest"]\n',
+        '[tool.poetry]\ndependencies = ["django"]\ngroup = "dev"\n',
+    ])
+    def test_unexpected_pyproject_types_ignored(self, tmp_path, text):
+        (tmp_path / "pyproject.toml").write_text(text)
+        assert extract_manifests(str(tmp_path))["tech_stack"] == ["Python"]
+
+    def test_malformed_manifest_skipped_with_warning(self, tmp_path, capsys):
+        (tmp_path / "package.json").write_text("{not json")
+        (tmp_path / "go.mod").write_text("go 1.21\n")
+        assert extract_manifests(str(tmp_path))["tech_stack"] == ["Go 1.21"]
+        assert "WARNING: Could not parse" in capsys.readouterr().err
+
+    def test_stack_is_capped(self, tmp_path):
+        deps = {f"pkg{i}": "1.0" for i in range(30)}
+        (tmp_path / "package.json").write_text(json.dumps({"dependencies": deps}))
+        assert len(extract_manifests(str(tmp_path))["tech_stack"]) == _mod.MAX_STACK
+
+
+class TestRankStack:
+    def test_duplicate_names_listed_once_at_best_rank(self):
+        deps = [
+            Dependency("Python", "", _mod._RANK_LANGUAGE),
+            Dependency("pytest", "8", _mod._RANK_FRAMEWORK, dev=True),
+            Dependency("Python", "3.12", _mod._RANK_LANGUAGE),
+            Dependency("pytest", "", _mod._RANK_FRAMEWORK),
+            None,
+        ]
+        assert _mod.rank_stack(deps) == ["Python 3.12", "pytest 8"]
+
+
+class TestTomlSubset:
+    @pytest.mark.parametrize("text", [
+        PYPROJECT,
+        CARGO,
+        '[a."b.c".d]\nx = [[1, 2], ["x"]]\ny = { z = { w = true } }\n',
+        "[[item]]\nname = 'one'\n[[item]]\nname = 'two'\n[item.sub]\nk = -1.5e3\n",
+        'key = "a # b" # trailing\nesc = "quote \\" and \\\\"\nwhen = 1979-05-27\n',
+    ])
+    def test_matches_tomllib(self, text):
+        tomllib = pytest.importorskip("tomllib")
+        expected = tomllib.loads(text)
+        if "when" in expected:
+            expected["when"] = str(expected["when"])
+        assert _mod.parse_toml_subset(text) == expected
+
+    @pytest.mark.parametrize("text", ["x = [1, 2\n", "just words\n", 's = """open\n', "k = 1 2\n"])
+    def test_rejects_malformed(self, text):
+        with pytest.raises(ValueError):
+            _mod.parse_toml_subset(text)
+
+    def test_used_without_tomllib(self, monkeypatch):
+        monkeypatch.setattr(_mod, "tomllib", None)
+        assert _mod.load_toml('[package]\nname = "x"\n') == {"package": {"name": "x"}}
+
+
+class TestFindModules:
+    def test_containers_expand_and_rank_by_size(self, tmp_path):
+        for rel in ("src/core/a.py", "src/core/b.py", "src/core/deep/c.py", "src/util/d.py", "src/main.py",
+                    "cmd/server/main.go", "tools/gen.py", "tests/test_a.py", "docs/conf.py",
+                    "node_modules/x/index.js", ".hidden/h.py", "generated/g.py", "assets/logo.svg"):
+            (tmp_path / rel).parent.mkdir(parents=True, exist_ok=True)
+            (tmp_path / rel).write_text("")
+        (tmp_path / ".gitignore").write_text("generated/\n")
+        assert _mod.find_modules(tmp_path) == ["src/core", "cmd/server", "src", "src/util", "tools"]
+
+    def test_malformed_gitignore_pattern_skipped(self, tmp_path):
+        (tmp_path / "core").mkdir()
+        (tmp_path / "core" / "a.py").write_text("")
+        (tmp_path / ".gitignore").write_text("[z-a]\n[]\n")
+        assert _mod.find_modules(tmp_path) == ["core"]
+
+    def test_nested_non_module_names_still_counted(self, tmp_path):
+        for rel in ("skills/indexer/scripts/a.py", "skills/indexer/scripts/b.py", "skills/indexer/docs/conf.py",
+                    "lib/core.py", "scripts/run.py"):
+            (tmp_path / rel).parent.mkdir(parents=True, exist_ok=True)
+            (tmp_path / rel).write_text("")
+        assert _mod.find_modules(tmp_path) == ["skills", "lib"]
+
+    def test_nested_gitignore_prunes_counted_dirs(self, tmp_path):
+        for rel in ("core/gen/a.py", "core/gen/b.py", "core/gen/c.py", "core/x.py", "api/a.py", "api/b.py"):
+            (tmp_path / rel).parent.mkdir(parents=True, exist_ok=True)
+            (tmp_path / rel).write_text("")
+        (tmp_path / "core" / ".gitignore").write_text("gen/\n")
+        assert _mod.find_modules(tmp_path) == ["api", "core"]
+
+    def test_limit(self, tmp_path):
+        for i in range(5):
+            (tmp_path / f"m{i}").mkdir()
+            (tmp_path / f"m{i}" / "x.rs").write_text("")
+        assert _mod.find_modules(tmp_path, limit=2) == ["m0", "m1"]
+
+
+class TestCLI:
+    def test_prints_json(self, tmp_path):
+        (tmp_path / "go.mod").write_text("module m\n\ngo 1.21\n")
+        (tmp_path / "internal" / "store").mkdir(parents=True)
+        (tmp_path / "internal" / "store" / "db.go").write_text("package store\n")
+        result = subprocess.run([sys.executable, str(_SCRIPT_PATH), str(tmp_path)], capture_output=True, text=True)
+        assert result.returncode == 0
+        data = json.loads(result.stdout)
+        assert data["tech_stack"] == ["Go 1.21"]
+        assert data["key_modules"] == ["internal/store"]
+        assert data["repo_name"] == tmp_path.name
+
+    def test_invalid_path_exits_nonzero(self):
+        result = subprocess.run(
+            [sys.executable, str(_SCRIPT_PATH), "/nonexistent/path/abc123"], capture_output=True, text=True
+        )
+        assert result.returncode == 1
+        assert "ERROR" in result.stderr
@@ -1,5 +1,7 @@
 """Tests for generate-memory-update.py."""
 
+import io
+import itertools
 import json
 import pathlib
 import subprocess
@@ -391,3 +393,315 @@ class TestEmptyInputs:
         )
         assert "patterns:" not in result
         assert "summary:" not in result
+
+
+class TestBatch:
+    """Tests for --batch JSONL mode."""
+
+    _good = {
+        "repo_name": "svc-a",
+        "repo_type": "single_app",
+        "tech_stack": ["Python"],
+        "key_modules": ["api"],
+        "patterns": ["REST"],
+    }
+
+    def _lines(self):
+        return [
+            json.dumps(self._good),
+            "not json",
+            "",
+            json.dumps({"repo_name": "x"}),
+            json.dumps(dict(self._good, repo_name="svc-b", extra=1)),
+        ]
+
+    def test_check_payload_matches_cli_messages(self):
+        assert _mod.check_payload(self._good) is None
+        assert _mod.check_payload([]) == "JSON input must be an object, not an array or primitive"
+        assert _mod.check_payload(dict(self._good, patterns=[1])) == "'patterns' elements must be strings"
+
+    def test_entries_mode_reports_errors_inline(self):
+        out = io.StringIO()
+        failed = _mod.run_batch(self._lines(), out, entries=True)
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert failed == 2
+        assert [r["line"] for r in records] == [1, 2, 4, 5]
+        assert records[0]["entries"][0] == "Repo: svc-a | Type: single_app | Stack: Python"
+        assert "Invalid JSON" in records[1]["error"]
+        assert records[2]["error"].startswith("Missing required keys")
+        assert records[3]["repo_name"] == "svc-b"
+
+    def test_text_mode_renders_every_good_record(self, capsys):
+        out = io.StringIO()
+        assert _mod.run_batch(self._lines(), out) == 2
+        assert out.getvalue().count("## Claude Memory Update") == 2
+        assert "extra" not in out.getvalue()
+        err = capsys.readouterr().err
+        assert "ERROR: line 2: Invalid JSON" in err and "ERROR: line 4: Missing" in err
+
+    def test_cli_batch_from_stdin(self):
+        result = subprocess.run(
+            [sys.executable, str(_SCRIPT_PATH), "--batch", "--entries"],
+            input="\n".join(self._lines()), capture_output=True, text=True,
+        )
+        assert result.returncode == 1
+        assert len(result.stdout.splitlines()) == 4
+
+    def test_cli_batch_from_file(self, tmp_path):
+        batch = tmp_path / "repos.jsonl"
+        batch.write_text(json.dumps(self._good) + "\n")
+        result = subprocess.run(
+            [sys.executable, str(_SCRIPT_PATH), "--batch", str(batch)],
+            capture_output=True, text=True,
+        )
+        assert result.returncode == 0
+        assert "svc-a" in result.stdout
+
+    def test_cli_batch_missing_file(self, tmp_path):
+        result = subprocess.run(
+            [sys.executable, str(_SCRIPT_PATH), "--batch", str(tmp_path / "none.jsonl")],
+            capture_output=True, text=True,
+        )
+        assert result.returncode == 1
+        assert "Could not read batch input" in result.stderr
+
+
+class TestL0Packing:
+    """Tests for token-budget packing of memory entries."""
+
+    _payload = {
+        "repo_name": "svc",
+        "repo_type": "library",
+        "tech_stack": ["Python", "FastAPI", "PostgreSQL", "Redis", "Celery", "Docker", "Kubernetes"],
+        "key_modules": ["api", "models", "workers", "auth", "billing"],
+        "patterns": ["Repository", "CQRS", "Event Sourcing"],
+        "summary": "Billing and invoicing service for the storefront",
+    }
+
+    def _tokens(self, entries):
+        return _mod.load_sibling("estimate-tokens").estimate_tokens("\n".join(entries), "bytes")
+
+    def test_fits_budget_and_reports_dropped(self):
+        packed = _mod.pack_memory_entries(**self._payload, budget=40)
+        assert packed["tokens"] == self._tokens(packed["entries"]) <= 40
+        assert packed["dropped"]
+        text = "\n".join(packed["entries"])
+        for item in packed["dropped"]:
+            assert f" {item}" not in text
+
+    def test_large_budget_keeps_everything(self):
+        packed = _mod.pack_memory_entries(**self._payload, budget=1000)
+        assert packed["dropped"] == []
+        assert "Kubernetes" in packed["entries"][0]
+        assert packed["entries"][3] == "svc summary: Billing and invoicing service for the storefront"
+
+    def test_matches_brute_force_optimum(self):
+        lines = [
+            ("Stack: ", [("Python", 3.0), ("Go", 2.5), ("TypeScript", 2.0), ("Rust", 1.0)], True),
+            ("patterns: ", [("Hexagonal Architecture", 1.5), ("CQRS", 1.2)], False),
+        ]
+        budget = 12
+        packed = _mod.pack_l0(lines, budget)
+        items = [(li, i) for li, (_, its, _) in enumerate(lines) for i in range(len(its))]
+        best = 0.0
+        for r in range(len(items) + 1):
+            for combo in itertools.combinations(items, r):
+                kept = [[i for li2, i in combo if li2 == li] for li in range(len(lines))]
+                if self._tokens(_mod._render(lines, kept)) <= budget:
+                    best = max(best, sum(lines[li][1][i][1] for li, i in combo))
+        kept_weight = sum(w for _, its, _ in lines for text, w in its if text not in packed["dropped"])
+        assert kept_weight == pytest.approx(best)
+
+    def test_empty_optional_line_omitted(self):
+        lines = [("Stack: ", [("Python", 1.0)], True), ("patterns: ", [("A very long pattern name", 0.1)], False)]
+        packed = _mod.pack_l0(lines, budget=3)
+        assert packed["entries"] == ["Stack: Python"]
+        assert packed["dropped"] == ["A very long pattern name"]
+
+    def test_required_prefixes_over_budget(self):
+        packed = _mod.pack_l0([("Repo: a-very-long-repository-name | Type: x | Stack: ", [("Go", 1.0)], True)], 2)
+        assert packed["over"] is True
+        assert packed["dropped"] == ["Go"]
+
+    def test_generate_lists_dropped_items(self):
+        result = generate_memory_update(**self._payload, budget=40)
+        assert "Left out to fit the 40-token memory budget:" in result
+
+    def test_cli_packs_by_default(self):
+        payload = json.dumps(dict(self._payload, tech_stack=["A", "B", "C", "D", "E", "F", "G"]))
+        packed = subprocess.run([sys.executable, str(_SCRIPT_PATH), payload], capture_output=True, text=True)
+        fixed = subprocess.run(
+            [sys.executable, str(_SCRIPT_PATH), payload, "--budget", "0"], capture_output=True, text=True
+        )
+        assert packed.returncode == fixed.returncode == 0
+        assert "Stack: A, B, C, D, E, F, G" in packed.stdout
+        assert "Stack: A, B, C, D, E\n" in fixed.stdout
+
+    def test_batch_entries_carry_tokens_and_dropped(self):
+        out = io.StringIO()
+        assert _mod.run_batch([json.dumps(self._payload)], out, entries=True, budget=40) == 0
+        record = json.loads(out.getvalue())
+        assert record["tokens"] <= 40 and record["dropped"]
+
+
+class TestFillFromRepo:
+    """Tests for deriving payload fields from a repository's manifests."""
+
+    @pytest.fixture
+    def repo(self, tmp_path):
+        root = tmp_path / "shop"
+        (root / "src" / "orders").mkdir(parents=True)
+        (root / "src" / "orders" / "views.py").write_text("")
+        (root / "requirements.txt").write_text("django==5.0.1\n")
+        return root
+
+    def test_fills_missing_keys(self, repo):
+        data = _mod.fill_from_repo({"repo_type": "single_app"}, str(repo))
+        assert data == {
+            "repo_name": "shop",
+            "repo_type": "single_app",
+            "tech_stack": ["Python", "Django 5.0.1"],
+            "key_modules": ["src/orders"],
+            "patterns": [],
+        }
+        assert _mod.check_payload(data) is None
+
+    def test_payload_keys_win(self, repo):
+        data = _mod.fill_from_repo({"repo_name": "storefront", "tech_stack": ["Go"]}, str(repo))
+        assert data["repo_name"] == "storefront" and data["tech_stack"] == ["Go"]
+        assert data["key_modules"] == ["src/orders"]
+
+    def test_cli_repo_flag(self, repo):
+        result = subprocess.run(
+            [sys.executable, str(_SCRIPT_PATH), "--repo", str(repo), '{"repo_type": "single_app"}'],
+            capture_output=True, text=True,
+        )
+        assert result.returncode == 0
+        assert "Repo: shop | Type: single_app | Stack: Python, Django 5.0.1" in result.stdout
+
+    def test_cli_repo_still_needs_type(self, repo):
+        result = subprocess.run(
+            [sys.executable, str(_SCRIPT_PATH), "--repo", str(repo)], capture_output=True, text=True,
+        )
+        assert result.returncode == 1
+        assert "Missing required keys: repo_type" in result.stderr
+
+
+class TestRoster:
+    """Tests for diffing against an existing memory roster."""
+
+    _payload = {
+        "repo_name": "svc",
+        "repo_type": "library",
+        "tech_stack": ["Go"],
+        "key_modules": ["api"],
+        "patterns": ["CQRS"],
+    }
+
+    def _entries(self, **changes):
+        return _mod.memory_entries(**dict(self._payload, **changes))
+
+    def test_entry_key(self):
+        assert _mod.entry_key("Repo: svc | Type: library | Stack: Go") == ("svc", "repo")
+        assert _mod.entry_key("my svc indexed 2024-01-02 | Key: api") == ("my svc", "indexed")
+        assert _mod.entry_key("svc patterns: CQRS") == ("svc", "patterns")
+        assert _mod.entry_key("User prefers tabs") is None
+
+    def test_key_uses_earliest_delimiter(self):
+        assert _mod.entry_key("api summary: Event-sourced; key patterns: CQRS") == ("api", "summary")
+        assert _mod.entry_key("api patterns: CQRS, see summary: below") == ("api", "patterns")
+        assert _mod.entry_key("Repo: api | Type: library | Stack: patterns: x") == ("api", "repo")
+
+    def test_changed_summary_mentioning_patterns_replaced(self, tmp_path):
+        roster = tmp_path / "memory.txt"
+        roster.write_text("api summary: Event-sourced; key patterns: CQRS\n")
+        ops = _mod.diff_roster(_mod.load_roster(roster), ["api summary: Event-sourced"])
+        assert [(op["op"], op["repo"], op["field"]) for op in ops] == [("replace", "api", "summary")]
+
+    def test_load_formats(self, tmp_path):
+        roster = tmp_path / "roster.jsonl"
+        roster.write_text("\n".join([
+            json.dumps({"repo": "a", "field": "repo", "entry": "Repo: a | Type: library | Stack: Go"}),
+            json.dumps({"line": 1, "repo_name": "b", "entries": ["Repo: b | Type: x | Stack: ", "b patterns: P"]}),
+            "c summary: plain exported line",
+            "User prefers tabs",
+            "{broken json",
+        ]))
+        assert set(_mod.load_roster(roster)) == {("a", "repo"), ("b", "repo"), ("b", "patterns"), ("c", "summary")}
+
+    def test_bulleted_export(self, tmp_path):
+        roster = tmp_path / "memory.md"
+        roster.write_text(
+            "- Repo: a | Type: library | Stack: Go\n"
+            "  * a patterns: CQRS\n"
+            "\u2022 b summary: bullet point\n"
+            "- User prefers tabs\n",
+            encoding="utf-8",
+        )
+        index = _mod.load_roster(roster)
+        assert set(index) == {("a", "repo"), ("a", "patterns"), ("b", "summary")}
+        assert index[("a", "repo")][1] == "Repo: a | Type: library | Stack: Go"
+
+    def test_missing_roster_is_empty(self, tmp_path):
+        assert _mod.load_roster(tmp_path / "none.jsonl") == {}
+
+    def test_unchanged_repo_needs_no_ops(self, tmp_path):
+        roster = tmp_path / "memory.txt"
+        roster.write_text("\n".join(self._entries(today="2020-01-01")))
+        assert _mod.diff_roster(_mod.load_roster(roster), self._entries()) == []
+
+    def test_minimal_ops(self, tmp_path):
+        roster = tmp_path / "memory.txt"
+        roster.write_text("\n".join(self._entries() + ["other patterns: untouched"]))
+        ops = _mod.diff_roster(
+            _mod.load_roster(roster), self._entries(tech_stack=["Go", "gRPC"], patterns=[], summary="New")
+        )
+        assert [(op["op"], op["field"]) for op in ops] == [
+            ("replace", "repo"), ("delete", "patterns"), ("add", "summary"),
+        ]
+        assert ops[0]["old"] == "Repo: svc | Type: library | Stack: Go"
+        assert ops[0]["entry"] == "Repo: svc | Type: library | Stack: Go, gRPC"
+        assert all(op["repo"] == "svc" for op in ops)
+
+    def test_apply_and_save_round_trip(self, tmp_path):
+        roster = {}
+        _mod.apply_roster_ops(roster, _mod.diff_roster(roster, self._entries()))
+        path = tmp_path / "sub" / "roster.jsonl"
+        _mod.save_roster(path, roster)
+        assert _mod.load_roster(path) == roster
+        assert [json.loads(line)["field"] for line in path.read_text().splitlines()] == ["repo", "indexed", "patterns"]
+
+    def test_generate_shows_only_changes(self):
+        roster = {}
+        _mod.apply_roster_ops(roster, _mod.diff_roster(roster, self._entries()))
+        assert "nothing to change" in generate_memory_update(**self._payload, roster=roster)
+        result = generate_memory_update(**dict(self._payload, patterns=["CQRS", "DDD"]), roster=roster)
+        assert "- svc patterns: CQRS\n+ svc patterns: CQRS, DDD" in result
+        assert "Repo: svc" not in result
+
+    def test_batch_applies_ops_as_it_goes(self):
+        out = io.StringIO()
+        roster = {}
+        _mod.run_batch([json.dumps(self._payload)] * 2, out, entries=True, roster=roster)
+        first, second = (json.loads(line) for line in out.getvalue().splitlines())
+        assert [op["op"] for op in first["ops"]] == ["add"] * 3
+        assert second["ops"] == []
+        assert len(roster) == 3
+
+    def test_cli_update_roster(self, tmp_path):
+        roster = tmp_path / "roster.jsonl"
+        cmd = [sys.executable, str(_SCRIPT_PATH), "--roster", str(roster), "--update-roster", json.dumps(self._payload)]
+        first = subprocess.run(cmd, capture_output=True, text=True)
+        assert first.returncode == 0 and "+ Repo: svc" in first.stdout
+        assert len(roster.read_text().splitlines()) == 3
+        second = subprocess.run(cmd, capture_output=True, text=True)
+        assert "nothing to change" in second.stdout
+
+    def test_cli_update_roster_needs_jsonl(self, tmp_path):
+        result = subprocess.run(
+            [sys.executable, str(_SCRIPT_PATH), "--roster", str(tmp_path / "m.txt"), "--update-roster",
+             json.dumps(self._payload)],
+            capture_output=True, text=True,
+        )
+        assert result.returncode == 1
+        assert "needs a .jsonl roster" in result.stderr
@@ -0,0 +1,233 @@
+"""Tests for render-templates.py."""
+
+import json
+import marshal
+import pathlib
+import subprocess
+import sys
+
+import pytest
+from helpers import import_script
+
+_mod = import_script("render-templates")
+render = _mod.render
+load_templates = _mod.load_templates
+
+_SCRIPT_PATH = (
+    pathlib.Path(__file__).resolve().parent.parent
+    / "skills" / "repo-indexer" / "scripts" / "render-templates.py"
+)
+
+TEMPLATES = """\
+# Templates
+
+## CLAUDE.md (<500 tokens)
+
+````markdown
+# {repo-name}
+{One sentence: purpose}
+
+## Commands
+```bash
+# Install
+{install_cmd}
+```
+
+## Key Insights
+- {insight-1}
+- {insight-2}
+````
+
+## CLAUDE.md — Library variant
+
+```markdown
+# {repo-name}
+
+## Public API
+- `{module}.{function}()` - {description}
+- `{module}.{Class}` - {description}
+
+## Stack
+- Language: {lang}
+- Deps: {deps}
+```
+"""
+
+
+@pytest.fixture(autouse=True)
+def bundled_cache(tmp_path, monkeypatch):
+    """Compile the bundled templates into tmp_path, never into the source tree."""
+    monkeypatch.setattr(_mod, "_COMPILED", {})
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    load_templates(cache_dir=cache_dir)
+    return cache_dir
+
+
+@pytest.fixture
+def templates_md(tmp_path):
+    path = tmp_path / "templates.md"
+    path.write_text(TEMPLATES)
+    return path
+
+
+class TestCompile:
+    def test_bundled_templates(self, bundled_cache):
+        templates = load_templates()
+        assert (bundled_cache / "templates.marshal").is_file()
+        assert sorted(templates) == [
+            "CLAUDE.md", "CLAUDE.md:library", "CLAUDE.md:microservices", "CLAUDE.md:monorepo",
+            "architecture.md", "conventions.md", "glossary.md", "indexing-output-format",
+        ]
+        for template in templates.values():
+            assert template["lines"]
+
+    def test_nested_fences_and_sections(self, templates_md):
+        lines = load_templates(templates_md)["CLAUDE.md"]["lines"]
+        sections = {line[1][0] + "".join(line[1][1::2]): line[0] for line in lines}
+        assert sections["# Install"] == "commands"
+        assert sections["- insight-1\0insight-1"] == "key-insights"
+        assert lines[-1][1][-1] == ""
+
+    def test_placeholder_keys(self):
+        assert _mod._placeholder_key("install_cmd") == "install-cmd"
+        assert _mod._placeholder_key("One sentence: system purpose and users") == "summary"
+        assert _mod._placeholder_key("YYYY-MM-DD") == "date"
+        assert _mod._template_name("CLAUDE.md — Monorepo variant") == "CLAUDE.md:monorepo"
+
+
+class TestCache:
+    def test_written_next_to_source_and_reused(self, templates_md, monkeypatch):
+        monkeypatch.setattr(_mod, "_COMPILED", {})
+        compiled = load_templates(templates_md)
+        cache = templates_md.with_suffix(".marshal")
+        assert marshal.loads(cache.read_bytes())["templates"] == compiled  # noqa: S302
+
+        monkeypatch.setattr(_mod, "_COMPILED", {})
+        monkeypatch.setattr(_mod, "compile_templates", lambda text: pytest.fail("recompiled"))
+        assert load_templates(templates_md) == compiled
+
+    def test_rebuilt_when_source_changes(self, templates_md, monkeypatch):
+        monkeypatch.setattr(_mod, "_COMPILED", {})
+        load_templates(templates_md)
+        templates_md.write_text(TEMPLATES + "\n## glossary.md\n\n```markdown\n| {term} |\n```\n")
+        monkeypatch.setattr(_mod, "_COMPILED", {})
+        assert "glossary.md" in load_templates(templates_md)
+        cached = marshal.loads(templates_md.with_suffix(".marshal").read_bytes())  # noqa: S302
+        assert "glossary.md" in cached["templates"]
+
+    def test_corrupt_cache_ignored(self, templates_md, monkeypatch):
+        monkeypatch.setattr(_mod, "_COMPILED", {})
+        templates_md.with_suffix(".marshal").write_bytes(b"\x00garbage")
+        assert "CLAUDE.md" in load_templates(templates_md)
+
+    def test_cache_dir(self, templates_md, tmp_path, monkeypatch):
+        monkeypatch.setattr(_mod, "_COMPILED", {})
+        cache_dir = tmp_path / "elsewhere"
+        cache_dir.mkdir()
+        compiled = load_templates(templates_md, cache_dir=cache_dir)
+        assert marshal.loads((cache_dir / "templates.marshal").read_bytes())["templates"] == compiled  # noqa: S302
+        assert not templates_md.with_suffix(".marshal").exists()
+
+    def test_unwritable_cache_compiles_in_memory(self, templates_md, monkeypatch, capsys):
+        monkeypatch.setattr(_mod, "_COMPILED", {})
+        templates_md.with_suffix(".marshal").mkdir()
+        assert "CLAUDE.md" in load_templates(templates_md)
+        assert capsys.readouterr().err == ""
+        assert not templates_md.with_name("templates.marshal.tmp").exists()
+
+
+class TestRender:
+    def test_fills_and_reports_missing(self, templates_md):
+        result = render("CLAUDE.md", {"repo_name": "acme", "Install Cmd": "make"}, path=templates_md)
+        assert result["template"] == "CLAUDE.md"
+        assert result["text"].startswith("# acme\n{One sentence: purpose}\n")
+        assert "make" in result["text"]
+        assert result["missing"] == ["One sentence: purpose", "insight-1", "insight-2"]
+
+    @pytest.mark.parametrize("repo_type,expected", [
+        ("library", "CLAUDE.md:library"),
+        ("single_app", "CLAUDE.md"),
+        ("microservices", "CLAUDE.md"),
+        (None, "CLAUDE.md"),
+    ])
+    def test_variant_by_type(self, templates_md, repo_type, expected):
+        assert render("CLAUDE.md", {"type": repo_type}, path=templates_md)["template"] == expected
+
+    def test_dict_items_repeat_matching_rows(self, templates_md):
+        facts = {"type": "library", "public_api": [
+            {"module": "acme", "function": "run", "description": "Run it"},
+            {"module": "acme", "class": "Client", "description": "HTTP client"},
+        ]}
+        text = render("CLAUDE.md", facts, path=templates_md)["text"]
+        assert "- `acme.run()` - Run it\n- `acme.Client` - HTTP client\n" in text
+
+    def test_string_items_repeat_uniform_rows(self, templates_md):
+        result = render("CLAUDE.md", {"key_insights": ["a", "b", "c"]}, path=templates_md)
+        assert "- a\n- b\n- c\n" in result["text"]
+        assert "insight-1" not in result["missing"]
+
+    def test_labelled_rows_not_repeated(self, templates_md):
+        facts = {"type": "library", "stack": ["x", "y"], "lang": "Go", "deps": ["cobra", "viper"]}
+        text = render("CLAUDE.md", facts, path=templates_md)["text"]
+        assert "- Language: Go\n- Deps: cobra, viper\n" in text
+
+    def test_row_placeholders_not_aliased(self):
+        facts = {"repo_name": "acme", "type": "monorepo", "packages": [
+            {"kind": "packages", "name": "core", "description": "Shared code"},
+            {"kind": "apps", "name": "web", "description": "Frontend"},
+        ]}
+        text = render("CLAUDE.md", facts)["text"]
+        assert "- `packages/core` - Shared code\n- `apps/web` - Frontend\n" in text
+        assert "### REPO: acme" in render("indexing-output-format", facts)["text"]
+
+    def test_prose_placeholder_uses_section_fact(self):
+        result = render("indexing-output-format", {"architecture": "Layered.", "date": "2026-01-02"})
+        assert "### ARCHITECTURE\nLayered.\n" in result["text"]
+        assert "### INDEXED: 2026-01-02" in result["text"]
+
+    def test_unknown_template(self, templates_md):
+        with pytest.raises(KeyError):
+            render("nope.md", {}, path=templates_md)
+
+
+class TestCLI:
+    def test_renders_from_facts_file(self, tmp_path):
+        facts = tmp_path / "facts.json"
+        facts.write_text(json.dumps({"repo_name": "acme", "type": "microservices", "services": [
+            {"service_name": "api", "description": "Gateway", "port": 8080},
+        ]}))
+        result = subprocess.run(
+            [sys.executable, str(_SCRIPT_PATH), "--facts", str(facts)], capture_output=True, text=True
+        )
+        assert result.returncode == 0
+        assert result.stdout.startswith("# acme\n")
+        assert "| `api` | Gateway | 8080 |" in result.stdout
+        assert "WARNING:" in result.stderr
+
+    def test_repo_detects_type(self, tmp_path):
+        repo = tmp_path / "widgets"
+        repo.mkdir()
+        (repo / "pnpm-workspace.yaml").write_text("packages:\n  - packages/*\n")
+        result = subprocess.run(
+            [sys.executable, str(_SCRIPT_PATH), "--repo", str(repo)], capture_output=True, text=True
+        )
+        assert result.returncode == 0
+        assert result.stdout.startswith("# widgets\n")
+        assert "## Packages" in result.stdout
+
+    def test_list(self):
+        result = subprocess.run([sys.executable, str(_SCRIPT_PATH), "--list"], capture_output=True, text=True)
+        assert "CLAUDE.md:monorepo" in result.stdout.split()
+
+    def test_unknown_template_exits_nonzero(self):
+        result = subprocess.run([sys.executable, str(_SCRIPT_PATH), "nope.md"], capture_output=True, text=True)
+        assert result.returncode == 1
+        assert "ERROR" in result.stderr
+
+    def test_non_object_facts_rejected(self, tmp_path):
+        result = subprocess.run(
+            [sys.executable, str(_SCRIPT_PATH), "--facts", "-"], input="[1]", capture_output=True, text=True
+        )
+        assert result.returncode == 1
+        assert "ERROR" in result.stderr
@@ -0,0 +1,22 @@
+"""Tests for _siblings.py."""
+
+import sys
+
+import pytest
+from _siblings import call_sibling, load_sibling
+
+
+class TestLoadSibling:
+    def test_loaded_once_and_registered(self):
+        module = load_sibling("estimate-tokens")
+        assert load_sibling("estimate-tokens") is module
+        assert sys.modules["estimate_tokens"] is module
+        assert hasattr(module, "estimate_tokens")
+
+    def test_missing_script_not_registered(self):
+        with pytest.raises(FileNotFoundError):
+            load_sibling("no-such-script")
+        assert "no_such_script" not in sys.modules
+
+    def test_call_sibling(self):
+        assert call_sibling("estimate-tokens", "estimate_tokens", "abcdefgh") == 2